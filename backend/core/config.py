@@ -17,10 +17,49 @@ class Settings(BaseSettings):
 
     OPENAI_API_KEY: str | None = Field(default=None)
     GEMINI_API_KEY: str | None = Field(default=None)
-    LLM_PROVIDER: str = Field(default="mock")  # mock | openai
+    LLM_PROVIDER: str = Field(default="mock")  # mock | openai | http
+    LLM_PROMPT_VERSION: str = Field(default="v1", description="Part of every LLM cache key; bump when the prompt changes")
+    LLM_CACHE_ENABLED: bool = Field(default=True, description="Cache explanations of remote LLM providers")
+    LLM_CACHE_SIZE: int = Field(default=10_000, description="Explanations kept in the in-process LRU")
+    LLM_CACHE_TTL_SECONDS: int = Field(default=7 * 24 * 3600, description="Age after which cached explanations are regenerated")
+    LLM_CACHE_CLAIM_FIELDS: str = Field(default="", description="Comma-separated claim fields added to the cache key")
+    LLM_HTTP_URL: str = Field(default="http://localhost:8100/v1/explain", description="Batch explanation endpoint used by the http provider")
+    LLM_HTTP_API_KEY: str = Field(default="", description="Bearer token sent to LLM_HTTP_URL")
+    LLM_HTTP_MODEL: str = Field(default="", description="Model name forwarded to LLM_HTTP_URL")
+    LLM_BATCH_SIZE: int = Field(default=20, description="Claims packed into one LLM request")
+    LLM_MAX_CONCURRENCY: int = Field(default=8, description="LLM requests in flight at once")
+    LLM_TOKENS_PER_MINUTE: int = Field(default=0, description="Estimated prompt tokens sent per minute; 0 disables the limit")
+    LLM_MAX_RETRIES: int = Field(default=4, description="Retries of a failed LLM request")
+    LLM_BACKOFF_SECONDS: float = Field(default=0.5, description="Initial retry delay, doubled per attempt")
+    LLM_TIMEOUT_SECONDS: float = Field(default=60.0, description="Timeout of one LLM request")
+    LLM_DEFER_EXPLANATIONS: bool = Field(default=False, description="Store matched rule ids only; explain claims when first read")
 
     DEFAULT_TENANT_ID: str = Field(default="HUMAEIN")
 
+    INGEST_STREAMING: bool = Field(default=True, description="Read claims files in chunks instead of all at once")
+    INGEST_CHUNK_SIZE: int = Field(default=50_000, description="Rows per chunk when streaming claims files")
+    INGEST_MAX_WORKERS: int | None = Field(default=None, description="Process pool size for batch uploads (default: CPU count)")
+    INGEST_BATCH_MAX_FILES: int = Field(default=500, description="Claims files a batch ZIP may hold")
+    INGEST_BATCH_MAX_BYTES: int = Field(default=2 * 1024**3, description="Uncompressed bytes a batch ZIP may expand to")
+    BULK_INSERT_BATCH_SIZE: int = Field(default=10_000, description="Rows per COPY/executemany batch")
+    VALIDATION_ENGINE: str = Field(default="vectorized", description="Rule evaluation strategy: vectorized | row")
+    VALIDATION_WORKERS: int = Field(default=1, description="Processes validating id-range shards of a job (1 = in-process)")
+    VALIDATION_SHARD_MIN_CLAIMS: int = Field(default=100_000, description="Smallest job that is split into shards")
+    VALIDATION_BATCH_SIZE: int = Field(default=50_000, description="Claims streamed, validated and committed per batch")
+    VALIDATION_RESUME_ON_STARTUP: bool = Field(default=False, description="On startup, resume running jobs whose runner stopped heartbeating")
+    VALIDATION_HEARTBEAT_SECONDS: float = Field(default=30.0, description="How often a running job's runner records that it is alive")
+    VALIDATION_HEARTBEAT_TIMEOUT_SECONDS: float = Field(default=300.0, description="Heartbeat age after which a running job counts as interrupted")
+    JOB_BACKEND: str = Field(default="inline", description="Where validation runs: inline (API background tasks) | queue (backend.worker processes)")
+    JOB_QUEUE_MAX_ATTEMPTS: int = Field(default=3, description="Attempts per queued job before it fails")
+    JOB_QUEUE_BACKOFF_SECONDS: float = Field(default=30.0, description="Delay before the first retry, doubled per attempt")
+    JOB_QUEUE_VISIBILITY_TIMEOUT_SECONDS: int = Field(default=300, description="Lease a worker holds on a job; renewed while it runs")
+    JOB_QUEUE_POLL_SECONDS: float = Field(default=1.0, description="Worker sleep when the queue is empty")
+    JOB_MAX_CONCURRENT: int = Field(default=0, description="Queued jobs running at once across all tenants (0 = bounded by workers only)")
+    JOB_TENANT_MAX_CONCURRENT: int = Field(default=2, description="Queued jobs one tenant may run at once (0 = unlimited)")
+    JOB_TENANT_WEIGHTS: str = Field(default="", description="Comma-separated tenant=weight shares for fair scheduling; others weigh 1")
+    RULE_CACHE_SIZE: int = Field(default=128, description="Tenants' compiled rule sets kept in the in-process LRU cache")
+    EVAL_MEMO_SIZE: int = Field(default=100_000, description="Claim signatures memoized per cached rule set (0 disables reuse across jobs)")
+
     class Config:
         env_file = os.getenv("ENV_FILE", ".env")
 
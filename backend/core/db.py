@@ -1,7 +1,10 @@
+import io
 from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List
 from urllib.parse import urlparse, urlunparse
 from sqlmodel import SQLModel, create_engine, Session
-from sqlalchemy import text
+from sqlalchemy import inspect, literal, text
 from .config import settings
 
 
@@ -50,11 +53,55 @@ def init_db() -> None:
     _ensure_database_exists()
     # Import models here to ensure they are registered with SQLModel metadata
     try:
-        from ..models import users, rules, ingestions, claims, metrics  # noqa: F401
+        from ..models import users, rules, ingestions, claims, metrics, facilities, llm_cache, job_queue  # noqa: F401
     except Exception:  # pragma: no cover
         # Models may not exist yet during initial scaffold
         pass
     SQLModel.metadata.create_all(engine)
+    _add_missing_columns()
+
+
+def _add_missing_columns() -> None:
+    # create_all never alters existing tables; add columns and indexes introduced since they were created.
+    # New columns are nullable; those with a scalar model default get it as a server default,
+    # so existing rows read as the model would have written them rather than NULL.
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {col["name"]: col for col in inspector.get_columns(table.name)}
+            indexed = {index["name"] for index in inspector.get_indexes(table.name)}
+            table_sql = preparer.format_table(table)
+            added = set()
+            for column in table.columns:
+                default = column.default.arg if column.default is not None and column.default.is_scalar else None
+                column_sql = preparer.quote(column.name)
+                if column.name not in existing:
+                    col_type = column.type.compile(dialect=engine.dialect)
+                    ddl = f"ALTER TABLE {table_sql} ADD COLUMN {column_sql} {col_type}"
+                    if default is not None:
+                        ddl += f" DEFAULT {_sql_literal(column, default)}"
+                    conn.execute(text(ddl))
+                    added.add(column.name)
+                elif default is not None and existing[column.name]["nullable"] and not column.nullable:
+                    # Added without a default by earlier releases: backfill the NULLs
+                    conn.execute(table.update().where(column.is_(None)).values({column.name: default}))
+                    if engine.dialect.name == "postgresql":
+                        conn.execute(
+                            text(
+                                f"ALTER TABLE {table_sql} ALTER COLUMN {column_sql} SET DEFAULT {_sql_literal(column, default)}, "
+                                f"ALTER COLUMN {column_sql} SET NOT NULL"
+                            )
+                        )
+            for index in table.indexes:
+                if index.name not in indexed or added.intersection(col.name for col in index.columns):
+                    index.create(conn, checkfirst=True)
+
+
+def _sql_literal(column, value: Any) -> str:
+    return str(literal(value, type_=column.type).compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
 
 
 @contextmanager
@@ -70,3 +117,77 @@ def get_session() -> Session:
         session.close()
 
 
+
+
+def _copy_csv_field(value: Any) -> str:
+    # Unquoted empty is NULL in COPY csv format; everything else is quoted
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _insert_columns(model) -> List[str]:
+    return [c.name for c in model.__table__.columns if not c.primary_key]
+
+
+def _column_defaults(model, columns: List[str]) -> Dict[str, Any]:
+    defaults: Dict[str, Any] = {}
+    for name in columns:
+        field = model.model_fields.get(name)
+        defaults[name] = field.get_default(call_default_factory=True) if field is not None else None
+    return defaults
+
+
+def _copy_rows(session, model, columns: List[str], rows: List[Dict[str, Any]]) -> None:
+    preparer = session.get_bind().dialect.identifier_preparer
+    table_name = preparer.format_table(model.__table__)
+    column_sql = ", ".join(preparer.quote(name) for name in columns)
+    buf = io.StringIO()
+    for row in rows:
+        buf.write(",".join(_copy_csv_field(row[name]) for name in columns))
+        buf.write("\n")
+    buf.seek(0)
+    dbapi_conn = session.connection().connection
+    cursor = dbapi_conn.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table_name} ({column_sql}) FROM STDIN WITH (FORMAT csv)", buf)
+    finally:
+        cursor.close()
+
+
+def bulk_insert(session, model, rows: Iterable[Dict[str, Any]], batch_size: int | None = None) -> int:
+    """Insert plain dict rows for ``model`` bypassing the ORM unit of work.
+
+    Uses PostgreSQL ``COPY FROM STDIN`` when running on psycopg2 and falls back to a
+    Core ``executemany`` insert on other dialects. Columns missing from a row get the
+    model's field default. Runs inside the session's current transaction.
+    """
+    batch_size = batch_size or settings.BULK_INSERT_BATCH_SIZE
+    dialect = session.get_bind().dialect
+    use_copy = dialect.name == "postgresql" and dialect.driver == "psycopg2"
+    columns = _insert_columns(model)
+    defaults = _column_defaults(model, columns)
+
+    total = 0
+    batch: List[Dict[str, Any]] = []
+
+    def _flush_batch() -> None:
+        if use_copy:
+            _copy_rows(session, model, columns, batch)
+        else:
+            session.execute(model.__table__.insert(), batch)
+
+    for row in rows:
+        batch.append({name: row.get(name, defaults[name]) for name in columns})
+        if len(batch) >= batch_size:
+            _flush_batch()
+            total += len(batch)
+            batch = []
+    if batch:
+        _flush_batch()
+        total += len(batch)
+    return total
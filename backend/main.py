@@ -8,7 +8,7 @@ from .models.users import User
 from .routes.auth import router as auth_router
 from .routes.rules import router as rules_router
 from .routes.ingestion import router as ingestion_router
-from .routes.jobs import router as jobs_router
+from .routes.jobs import resume_interrupted_jobs, router as jobs_router
 from .routes.claims import router as claims_router
 from .routes.metrics import router as metrics_router
 
@@ -52,6 +52,9 @@ def create_app() -> FastAPI:
                     is_active=True,
                 )
                 session.add(user)
+        # Queued jobs need no help: a worker reclaims them once the dead worker's lease expires
+        if settings.VALIDATION_RESUME_ON_STARTUP and settings.JOB_BACKEND == "inline":
+            resume_interrupted_jobs()
 
     return app
 
@@ -3,6 +3,9 @@ from .rules import RuleSet
 from .ingestions import Ingestion
 from .claims import MasterClaim, RefinedClaim
 from .metrics import Metrics
+from .facilities import FacilityProfile
+from .llm_cache import LLMExplanation
+from .job_queue import JobQueueItem
 
 __all__ = [
     "User",
@@ -11,6 +14,9 @@ __all__ = [
     "MasterClaim",
     "RefinedClaim",
     "Metrics",
+    "FacilityProfile",
+    "LLMExplanation",
+    "JobQueueItem",
 ]
 
 
@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import Optional
 
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field
 
 
@@ -21,6 +22,7 @@ class MasterClaim(SQLModel, table=True):
     service_code: str
     paid_amount_aed: float
     approval_number: str | None = None
+    row_hash: str | None = Field(default=None, index=True)  # hash of the normalized row, for resubmission diffs
 
     status: str | None = None
     error_type: str | None = None
@@ -33,6 +35,8 @@ class MasterClaim(SQLModel, table=True):
 
 class RefinedClaim(SQLModel, table=True):
     __tablename__ = "refined_claims"
+    # Keyset pages of one job's results: WHERE tenant_id, job_id AND id > cursor ORDER BY id
+    __table_args__ = (Index("ix_refined_claims_tenant_job_id", "tenant_id", "job_id", "id"),)
 
     id: Optional[int] = Field(default=None, primary_key=True)
     tenant_id: str = Field(index=True)
@@ -52,6 +56,10 @@ class RefinedClaim(SQLModel, table=True):
     diagnosis_codes: str | None = None
     approval_number: str | None = None
 
+    master_claim_id: int | None = Field(default=None, index=True)  # MasterClaim the result was evaluated from
+    carried_forward: bool = Field(default=False)  # copied unchanged from the base job of a resubmission
+    matched_rule_ids: str | None = None  # json list of the rule ids that fired, for incremental revalidation
+
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
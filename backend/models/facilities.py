@@ -0,0 +1,18 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import UniqueConstraint
+from sqlmodel import SQLModel, Field
+
+
+class FacilityProfile(SQLModel, table=True):
+    __tablename__ = "facility_profiles"
+    __table_args__ = (UniqueConstraint("tenant_id", "facility_id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    tenant_id: str = Field(index=True)
+    facility_id: str = Field(index=True)
+    services_json: str = "[]"  # json sorted list of every service code billed by the facility
+    facility_type: str | None = None  # inferred from services_json against the facility allow-lists
+    rule_map_digest: str | None = None  # digest of the allow-lists facility_type was inferred with
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -15,5 +15,20 @@ class Ingestion(SQLModel, table=True):
     started_at: datetime = Field(default_factory=datetime.utcnow)
     finished_at: datetime | None = None
     error: str | None = None
+    content_sha256: str | None = Field(default=None, index=True)  # hash of the uploaded file
+    parent_job_id: str | None = Field(default=None, index=True)  # set on child jobs of a batch upload
+    source_name: str | None = None  # uploaded file name, or archive member / sheet for batch children
+    base_job_id: str | None = None  # prior job a resubmission was diffed against
+    rule_fingerprints: str | None = None  # json rule id -> content hash of the rules the results reflect
+    facility_types_json: str | None = None  # json facility id -> inferred type the results were evaluated with
+
+    # Validation progress; results up to checkpoint_claim_id are committed, so a restart resumes after it
+    checkpoint_claim_id: int | None = None
+    processed_claims: int | None = None
+    total_claims: int | None = None
+    progress_started_at: datetime | None = None  # start of the current (possibly resumed) run
+    progress_base_claims: int | None = None  # claims already processed when the current run started
+    runner_id: str | None = None  # host:pid:run of the process validating the job
+    heartbeat_at: datetime | None = None  # last sign of life from that runner; stale means interrupted
 
 
@@ -0,0 +1,28 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlmodel import SQLModel, Field
+
+
+class JobQueueItem(SQLModel, table=True):
+    __tablename__ = "job_queue"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    tenant_id: str = Field(index=True)
+    job_id: str = Field(index=True)
+    kind: str = "validate"  # validate|revalidate
+    priority: int = 0  # higher runs first
+    status: str = Field(default="queued", index=True)  # queued|running|done|failed
+    attempts: int = 0
+    max_attempts: int = 3
+    run_after: datetime = Field(default_factory=datetime.utcnow, index=True)  # not claimed before this (retry backoff)
+    locked_by: str | None = None  # worker holding the lease
+    locked_until: datetime | None = None  # lease expiry; a running item past it is claimed again
+    last_error: str | None = None
+    # Weighted fair queuing: cost is the job's claim count; tags are in per-weight cost units
+    cost: int = 1
+    virtual_start: float = 0.0
+    virtual_finish: float = Field(default=0.0, index=True)
+    started_at: datetime | None = None  # first claim, for queue wait times
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,14 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlmodel import SQLModel, Field
+
+
+class LLMExplanation(SQLModel, table=True):
+    __tablename__ = "llm_explanations"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    cache_key: str = Field(index=True, unique=True)  # sha256 of tenant, prompt version, matched rules and key fields
+    prompt_version: str = Field(index=True)
+    payload_json: str  # llm.explain() result
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)  # expired rows are purged on write
@@ -12,6 +12,8 @@ class RuleSet(SQLModel, table=True):
     name: str
     kind: str = Field(index=True)  # technical | medical
     rules_json: str  # stored as JSON string
+    # Bumped on every upload; part of the rule cache key so stale cached rules are never served
+    version: Optional[int] = Field(default=1)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
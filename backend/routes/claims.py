@@ -1,48 +1,110 @@
+import base64
+import binascii
 import csv
 import io
-from typing import List, Optional
+import json
+import os
+import tempfile
+import zlib
+from typing import Iterator, List, Optional
 
-from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
-from sqlmodel import select
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy import func
+from sqlmodel import Session, select
+from starlette.background import BackgroundTask
 
+from ..core.config import settings
 from ..core.db import get_session
 from ..models.claims import RefinedClaim
+from ..models.ingestions import Ingestion
+from ..models.metrics import Metrics
+from ..services.validation import fill_explanations
 from .auth import get_current_user
 
 
 router = APIRouter(prefix="/api", tags=["claims"])
 
 
+def _encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"after": last_id}).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> int:
+    try:
+        after = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))["after"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(after, int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return after
+
+
+def _listing_total(session, tenant_id: str, job_id: str, status: Optional[str], error_type: Optional[str], filters) -> int:
+    # A completed job's per-error-type counts are kept in Metrics; status follows from error_type.
+    # Batch parents are excluded: their Metrics sum the children's claims.
+    job = session.exec(select(Ingestion).where(Ingestion.tenant_id == tenant_id, Ingestion.job_id == job_id)).first()
+    metrics = None
+    if job and job.status == "completed" and status in (None, "Validated", "Not Validated"):
+        is_parent = session.exec(
+            select(Ingestion.id).where(Ingestion.tenant_id == tenant_id, Ingestion.parent_job_id == job_id).limit(1)
+        ).first()
+        if is_parent is None:
+            metrics = session.exec(
+                select(Metrics).where(Metrics.tenant_id == tenant_id, Metrics.job_id == job_id).order_by(Metrics.id.desc())
+            ).first()
+    if metrics is not None:
+        counts = {key: value for key, value in json.loads(metrics.claims_by_error_type).items() if value}
+        if status == "Validated":
+            counts = {key: value for key, value in counts.items() if key == "no_error"}
+        elif status == "Not Validated":
+            counts = {key: value for key, value in counts.items() if key != "no_error"}
+        if error_type:
+            counts = {key: value for key, value in counts.items() if key == error_type}
+        return sum(counts.values())
+    return session.exec(select(func.count()).select_from(RefinedClaim).where(*filters)).one()
+
+
 @router.get("/claims")
 def list_claims(
     job_id: str = Query(...),
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page; replaces page"),
     status: Optional[str] = None,
     error_type: Optional[str] = None,
     x_tenant_id: str = Header(..., alias="X-Tenant-ID"),
     user=Depends(get_current_user),
 ):
     with get_session() as session:
-        stmt = select(RefinedClaim).where(RefinedClaim.tenant_id == x_tenant_id, RefinedClaim.job_id == job_id).order_by(RefinedClaim.id.asc())
+        filters = [RefinedClaim.tenant_id == x_tenant_id, RefinedClaim.job_id == job_id]
         if status:
-            stmt = stmt.where(RefinedClaim.status == status)
+            filters.append(RefinedClaim.status == status)
         if error_type:
-            stmt = stmt.where(RefinedClaim.error_type == error_type)
-        total = len(session.exec(stmt).all())
-        items = session.exec(
-            stmt.offset((page - 1) * page_size).limit(page_size)
-        ).all()
+            filters.append(RefinedClaim.error_type == error_type)
+        total = _listing_total(session, x_tenant_id, job_id, status, error_type, filters)
+        stmt = select(RefinedClaim).where(*filters).order_by(RefinedClaim.id.asc())
+        if cursor:
+            # Keyset paging: cost does not grow with depth, unlike OFFSET
+            stmt = stmt.where(RefinedClaim.id > _decode_cursor(cursor))
+        else:
+            stmt = stmt.offset((page - 1) * page_size)
+        # One extra row tells whether another page follows
+        items = session.exec(stmt.limit(page_size + 1)).all()
+        more = len(items) > page_size
+        items = items[:page_size]
         return {
-            "page": page,
+            "page": None if cursor else page,
             "page_size": page_size,
             "total": total,
+            "next_cursor": _encode_cursor(items[-1].id) if more else None,
             "items": [
                 {
                     "claim_id": i.claim_id,
                     "status": i.status,
                     "error_type": i.error_type,
                     "explanation": i.error_explanation or "",
+                    "explanation_pending": i.error_explanation is None and i.matched_rule_ids is not None,
                     "recommended_action": i.recommended_action or "-",
                     "encounter_type": i.encounter_type,
                     "service_code": i.service_code,
@@ -71,43 +133,147 @@ def claim_detail(
         ).first()
         if not rc:
             raise HTTPException(status_code=404, detail="Claim not found")
+        fill_explanations(session, x_tenant_id, [rc])
         return rc.dict()
 
 
-@router.get("/export/{job_id}.csv")
-def export_csv(job_id: str, x_tenant_id: str = Header(..., alias="X-Tenant-ID"), user=Depends(get_current_user)):
+PARQUET_EXPORT_COLUMNS = [
+    ("claim_id", "string"),
+    ("encounter_type", "string"),
+    ("service_date", "string"),
+    ("service_code", "string"),
+    ("facility_id", "string"),
+    ("paid_amount_aed", "float64"),
+    ("diagnosis_codes", "string"),
+    ("approval_number", "string"),
+    ("error_type", "string"),
+    ("status", "string"),
+    ("error_explanation", "string"),
+    ("recommended_action", "string"),
+]
+
+
+def _iter_refined_batches(session, tenant_id: str, job_id: str, batch_size: int) -> Iterator[List[RefinedClaim]]:
+    # Memory stays at one batch; the caller may commit ``session`` between batches
+    stmt = select(RefinedClaim).where(RefinedClaim.tenant_id == tenant_id, RefinedClaim.job_id == job_id).order_by(RefinedClaim.id.asc())
+    bind = session.get_bind()
+    if bind.dialect.supports_server_side_cursors:
+        # One query on a server-side cursor, read on its own connection
+        with Session(bind) as reader:
+            for rows in reader.exec(stmt.execution_options(yield_per=batch_size)).partitions():
+                yield rows
+                reader.expunge_all()
+        return
+    # Keyset pagination on id keeps each batch query cheap where cursors are not available
+    last_id = 0
+    while True:
+        rows = session.exec(stmt.where(RefinedClaim.id > last_id).limit(batch_size)).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+        session.expunge_all()
+
+
+CSV_EXPORT_COLUMNS = {
+    "claim_id": "claim_id",
+    "encounter_type": "encounter_type",
+    "service_date": "service_date",
+    "service_code": "service_code",
+    "facility_id": "facility_id",
+    "paid_amount_aed": "paid_amount_aed",
+    "diagnosis_codes": "diagnosis_codes",
+    "approval_number": "approval_number",
+    "error_type": "error_type",
+    "status": "status",
+    "explanation": "error_explanation",
+    "recommended_action": "recommended_action",
+}
+CSV_DEFAULT_COLUMNS = [
+    "claim_id",
+    "encounter_type",
+    "service_code",
+    "facility_id",
+    "paid_amount_aed",
+    "diagnosis_codes",
+    "error_type",
+    "status",
+    "explanation",
+    "recommended_action",
+]
+
+
+def _csv_chunks(tenant_id: str, job_id: str, columns: List[str], compress: bool) -> Iterator[bytes]:
+    attributes = [CSV_EXPORT_COLUMNS[name] for name in columns]
+    # gzip container (wbits 31), flushed once at the end so blocks compress well
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+
+    def _take() -> bytes:
+        data = buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+        return compressor.compress(data) if compressor else data
+
+    writer.writerow(columns)
+    yield _take()
     with get_session() as session:
-        rows: List[RefinedClaim] = session.exec(
-            select(RefinedClaim).where(RefinedClaim.tenant_id == x_tenant_id, RefinedClaim.job_id == job_id)
-        ).all()
-        buf = io.StringIO()
-        writer = csv.writer(buf)
-        writer.writerow([
-            "claim_id",
-            "encounter_type",
-            "service_code",
-            "facility_id",
-            "paid_amount_aed",
-            "diagnosis_codes",
-            "error_type",
-            "status",
-            "explanation",
-            "recommended_action",
-        ])
-        for r in rows:
-            writer.writerow([
-                r.claim_id,
-                r.encounter_type,
-                r.service_code,
-                r.facility_id,
-                r.paid_amount_aed,
-                r.diagnosis_codes,
-                r.error_type,
-                r.status,
-                r.error_explanation,
-                r.recommended_action,
-            ])
-        data = buf.getvalue()
-        return Response(content=data, media_type="text/csv", headers={"Content-Disposition": f"attachment; filename=export_{job_id}.csv"})
+        for rows in _iter_refined_batches(session, tenant_id, job_id, settings.BULK_INSERT_BATCH_SIZE):
+            if "error_explanation" in attributes:
+                fill_explanations(session, tenant_id, rows)
+            writer.writerows([getattr(r, attr) for attr in attributes] for r in rows)
+            # Keep generated explanations even if the client disconnects mid-download
+            session.commit()
+            chunk = _take()
+            if chunk:
+                yield chunk
+    if compressor:
+        yield compressor.flush()
+
+
+@router.get("/export/{job_id}.csv")
+def export_csv(
+    job_id: str,
+    columns: Optional[str] = Query(None, description="Comma-separated columns to export, in order"),
+    use_gzip: bool = Query(False, alias="gzip", description="Send the CSV with gzip content encoding"),
+    x_tenant_id: str = Header(..., alias="X-Tenant-ID"),
+    user=Depends(get_current_user),
+):
+    selected = [name.strip() for name in columns.split(",") if name.strip()] if columns else CSV_DEFAULT_COLUMNS
+    unknown = [name for name in selected if name not in CSV_EXPORT_COLUMNS]
+    if unknown or not selected:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown export columns: {', '.join(unknown)}" if unknown else "No export columns selected",
+        )
+    headers = {"Content-Disposition": f"attachment; filename=export_{job_id}.csv"}
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+    # Rows are read and sent batch by batch, so the first bytes go out at once and memory stays flat
+    return StreamingResponse(_csv_chunks(x_tenant_id, job_id, selected, use_gzip), media_type="text/csv", headers=headers)
+
 
+@router.get("/export/{job_id}.parquet")
+def export_parquet(job_id: str, x_tenant_id: str = Header(..., alias="X-Tenant-ID"), user=Depends(get_current_user)):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
 
+    schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in PARQUET_EXPORT_COLUMNS])
+    fd, path = tempfile.mkstemp(suffix=".parquet")
+    os.close(fd)
+    try:
+        with get_session() as session, pq.ParquetWriter(path, schema, compression="zstd") as writer:
+            for rows in _iter_refined_batches(session, x_tenant_id, job_id, settings.BULK_INSERT_BATCH_SIZE):
+                fill_explanations(session, x_tenant_id, rows)
+                columns = {name: [getattr(r, name) for r in rows] for name, _ in PARQUET_EXPORT_COLUMNS}
+                writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=schema))
+    except Exception:
+        os.remove(path)
+        raise
+    return FileResponse(
+        path,
+        media_type="application/vnd.apache.parquet",
+        filename=f"export_{job_id}.parquet",
+        background=BackgroundTask(os.remove, path),
+    )
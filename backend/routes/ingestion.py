@@ -1,8 +1,15 @@
-from fastapi import APIRouter, BackgroundTasks, Depends, File, Header, HTTPException, UploadFile
+from fastapi import APIRouter, BackgroundTasks, Depends, File, Header, HTTPException, Query, UploadFile
 
 from ..core.db import get_session
-from ..services.ingestion import ingest_claims_file
-from ..routes.jobs import _run_job_task
+from ..services.ingestion import (
+    HashingReader,
+    find_duplicate_ingestion,
+    hash_upload,
+    ingest_claims_batch,
+    ingest_claims_file,
+    ingest_claims_resubmission,
+)
+from ..routes.jobs import schedule_job
 from .auth import get_current_user
 
 
@@ -12,15 +19,49 @@ router = APIRouter(prefix="/api/upload", tags=["ingestion"])
 @router.post("/claims")
 def upload_claims(
     file: UploadFile = File(...),
+    dedupe: bool = Query(True, description="Reuse the existing job when identical content was already uploaded"),
+    base_job_id: str | None = Query(None, description="Resubmission of this job: only new or changed rows are validated"),
+    priority: int = Query(0, description="Higher runs first when JOB_BACKEND is queue"),
     x_tenant_id: str = Header(..., alias="X-Tenant-ID"),
     user=Depends(get_current_user),
     background_tasks: BackgroundTasks = None,
 ):
-    content = file.file.read()
+    # UploadFile.file is a SpooledTemporaryFile (rolled to disk past 1 MB); parse it in place
+    content_sha256 = None
+    upload = file.file
     with get_session() as session:
-        job_id, count = ingest_claims_file(session, x_tenant_id, content, file.filename)
-        if background_tasks is not None:
-            background_tasks.add_task(_run_job_task, x_tenant_id, job_id)
-        return {"status": "ok", "job_id": job_id, "rows": count}
+        if dedupe:
+            # One sequential read, so an identical re-upload is answered before any parsing
+            content_sha256 = hash_upload(upload)
+            duplicate = find_duplicate_ingestion(session, x_tenant_id, content_sha256)
+            if duplicate:
+                existing, rows = duplicate
+                return {"status": "ok", "job_id": existing.job_id, "rows": rows, "deduplicated": True}
+        else:
+            # Nothing to look up: hash the upload in the parse pass instead of reading it twice
+            upload = HashingReader(upload)
+        if base_job_id:
+            job_id, delta = ingest_claims_resubmission(session, x_tenant_id, upload, file.filename, base_job_id, content_sha256=content_sha256)
+            result = {"status": "ok", "job_id": job_id, "base_job_id": base_job_id, **delta}
+        else:
+            job_id, count = ingest_claims_file(session, x_tenant_id, upload, file.filename, content_sha256=content_sha256)
+            result = {"status": "ok", "job_id": job_id, "rows": count}
+        schedule_job(session, background_tasks, x_tenant_id, job_id, priority=priority)
+        return result
 
 
+@router.post("/claims/batch")
+def upload_claims_batch(
+    file: UploadFile = File(...),
+    priority: int = Query(0, description="Higher runs first when JOB_BACKEND is queue"),
+    x_tenant_id: str = Header(..., alias="X-Tenant-ID"),
+    user=Depends(get_current_user),
+    background_tasks: BackgroundTasks = None,
+):
+    # ZIP of CSV/XLSX files or a multi-sheet workbook; every member becomes a child job
+    with get_session() as session:
+        parent_job_id, children = ingest_claims_batch(session, x_tenant_id, file.file, file.filename or "")
+        for child in children:
+            if child["status"] == "pending":
+                schedule_job(session, background_tasks, x_tenant_id, child["job_id"], priority=priority)
+        return {"status": "ok", "job_id": parent_job_id, "rows": sum(c["rows"] for c in children), "children": children}
@@ -1,15 +1,41 @@
-from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException
+import threading
+from datetime import datetime
+
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query
 from sqlmodel import select
 
+from ..core.config import settings
 from ..core.db import get_session
 from ..models.ingestions import Ingestion
 from .auth import get_current_user
-from ..services.validation import run_validation_job
+from ..services.job_queue import enqueue, queue_stats
+from ..services.validation import JobTakenOver, fail_validation_job, heartbeat_expired, revalidate_job, run_validation_job
 
 
 router = APIRouter(prefix="/api/jobs", tags=["jobs"])
 
 
+@router.get("/queue/stats")
+def job_queue_stats(x_tenant_id: str = Header(..., alias="X-Tenant-ID"), user=Depends(get_current_user)):
+    # The caller's own queue in detail; other tenants only as totals
+    with get_session() as session:
+        mine = queue_stats(session, x_tenant_id)[x_tenant_id]
+        tenants = queue_stats(session)
+    return {
+        "backend": settings.JOB_BACKEND,
+        "tenant": {"tenant_id": x_tenant_id, **mine},
+        "total": {
+            "queued": sum(entry["queued"] for entry in tenants.values()),
+            "running": sum(entry["running"] for entry in tenants.values()),
+            "tenants_waiting": sum(1 for entry in tenants.values() if entry["queued"]),
+        },
+        "limits": {
+            "max_concurrent": settings.JOB_MAX_CONCURRENT,
+            "tenant_max_concurrent": settings.JOB_TENANT_MAX_CONCURRENT,
+        },
+    }
+
+
 @router.get("/{job_id}")
 def job_status(job_id: str, x_tenant_id: str = Header(..., alias="X-Tenant-ID"), user=Depends(get_current_user)):
     with get_session() as session:
@@ -18,26 +44,148 @@ def job_status(job_id: str, x_tenant_id: str = Header(..., alias="X-Tenant-ID"),
         ).first()
         if not job:
             raise HTTPException(status_code=404, detail="Job not found")
-        return {"job_id": job_id, "status": job.status, "counts": job.counts_json}
+        result = {"job_id": job_id, "status": job.status, "counts": job.counts_json}
+        if job.error:
+            result["error"] = job.error
+        if job.total_claims is not None:
+            result["progress"] = _progress(job)
+        children = session.exec(
+            select(Ingestion).where(Ingestion.tenant_id == x_tenant_id, Ingestion.parent_job_id == job_id).order_by(Ingestion.id.asc())
+        ).all()
+        if children:
+            result["children"] = [
+                {"job_id": c.job_id, "source": c.source_name, "status": c.status, "counts": c.counts_json, "error": c.error}
+                for c in children
+            ]
+        return result
+
+
+def _progress(job: Ingestion) -> dict:
+    processed = job.processed_claims or 0
+    total = job.total_claims or 0
+    # The rate covers the current run only, so a resumed job does not count earlier work
+    end = job.finished_at or datetime.utcnow()
+    elapsed = (end - job.progress_started_at).total_seconds() if job.progress_started_at else 0.0
+    done_now = processed - (job.progress_base_claims or 0)
+    return {
+        "processed": processed,
+        "total": total,
+        "percent": round(100.0 * processed / total, 1) if total else 100.0,
+        "rows_per_second": round(done_now / elapsed, 1) if elapsed > 0 else None,
+        "checkpoint_claim_id": job.checkpoint_claim_id,
+    }
+
+
+def schedule_job(
+    session,
+    background_tasks: BackgroundTasks | None,
+    tenant_id: str,
+    job_id: str,
+    kind: str = "validate",
+    priority: int = 0,
+    interrupted: bool = False,
+) -> None:
+    """Hand work on a job to the worker queue or to this process's background tasks, per JOB_BACKEND.
+
+    Queue items are added in ``session``'s transaction, so they commit together with the job.
+    ``interrupted`` lets an inline run take over a job a stopped process left running.
+    """
+    if settings.JOB_BACKEND == "queue":
+        enqueue(session, tenant_id, job_id, kind, priority)
+    elif background_tasks is not None:
+        if kind == "revalidate":
+            background_tasks.add_task(_revalidate_job_task, tenant_id, job_id)
+        else:
+            background_tasks.add_task(_run_job_task, tenant_id, job_id, interrupted)
 
 
 @router.post("/{job_id}/run")
 def run_job(
     job_id: str,
     background_tasks: BackgroundTasks,
+    priority: int = Query(0, description="Higher runs first when JOB_BACKEND is queue"),
+    resume: bool = Query(False, description="Take over a running job whose runner stopped heartbeating, from its checkpoint"),
     x_tenant_id: str = Header(..., alias="X-Tenant-ID"),
     user=Depends(get_current_user),
 ):
     # Schedule validation job
-    background_tasks.add_task(_run_job_task, x_tenant_id, job_id)
+    with get_session() as session:
+        job = session.exec(
+            select(Ingestion).where(Ingestion.tenant_id == x_tenant_id, Ingestion.job_id == job_id)
+        ).first()
+        if job and job.status == "running" and not (resume and heartbeat_expired(job)):
+            raise HTTPException(status_code=409, detail="Job is already running")
+        schedule_job(session, background_tasks, x_tenant_id, job_id, priority=priority, interrupted=resume)
+    return {"status": "scheduled", "job_id": job_id}
+
+
+@router.post("/{job_id}/revalidate")
+def revalidate(
+    job_id: str,
+    background_tasks: BackgroundTasks,
+    priority: int = Query(0, description="Higher runs first when JOB_BACKEND is queue"),
+    x_tenant_id: str = Header(..., alias="X-Tenant-ID"),
+    user=Depends(get_current_user),
+):
+    # Re-evaluate only the rules that changed since the job was validated
+    with get_session() as session:
+        job = session.exec(
+            select(Ingestion).where(Ingestion.tenant_id == x_tenant_id, Ingestion.job_id == job_id)
+        ).first()
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        if job.status != "completed":
+            raise HTTPException(status_code=409, detail="Job has not finished validation")
+        schedule_job(session, background_tasks, x_tenant_id, job_id, kind="revalidate", priority=priority)
     return {"status": "scheduled", "job_id": job_id}
 
 
-def _run_job_task(tenant_id: str, job_id: str) -> None:
+def _revalidate_job_task(tenant_id: str, job_id: str) -> None:
+    from ..core.db import get_session as _get_session
+
+    try:
+        with _get_session() as session:
+            revalidate_job(session, tenant_id, job_id)
+    except Exception as exc:
+        # The previous results are untouched; surface the error without failing the job
+        with _get_session() as session:
+            job = session.exec(
+                select(Ingestion).where(Ingestion.tenant_id == tenant_id, Ingestion.job_id == job_id)
+            ).first()
+            if job:
+                job.error = str(exc)
+        raise
+
+
+def _run_job_task(tenant_id: str, job_id: str, interrupted: bool = False) -> None:
     # New session context per background task
     from ..core.db import get_session as _get_session
 
-    with _get_session() as session:
-        run_validation_job(session, tenant_id, job_id)
+    try:
+        with _get_session() as session:
+            run_validation_job(session, tenant_id, job_id, interrupted=interrupted)
+    except JobTakenOver:
+        # Another runner owns the job now and will finish it
+        return
+    except Exception as exc:
+        # The validation transaction rolled back; record the failure so the job is not left pending
+        # (failed jobs are also skipped by upload de-duplication).
+        with _get_session() as session:
+            fail_validation_job(session, tenant_id, job_id, str(exc))
+        raise
 
 
+def resume_interrupted_jobs() -> list[tuple[str, str]]:
+    """Restart validation of running jobs whose runner stopped heartbeating; they continue from their checkpoint.
+
+    Jobs another live process is still validating keep heartbeating and are left alone, and
+    each run takes its job with a compare-and-set, so two processes never resume the same job.
+    """
+    with get_session() as session:
+        # Batch parents only aggregate their children, which resume on their own
+        parents = select(Ingestion.parent_job_id).where(Ingestion.parent_job_id.is_not(None))
+        running = session.exec(select(Ingestion).where(Ingestion.status == "running", Ingestion.job_id.not_in(parents))).all()
+        jobs = [(job.tenant_id, job.job_id) for job in running if heartbeat_expired(job)]
+    for tenant_id, job_id in jobs:
+        threading.Thread(target=_run_job_task, args=(tenant_id, job_id, True), daemon=True).start()
+    return jobs
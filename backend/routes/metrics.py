@@ -4,6 +4,7 @@ from sqlmodel import select
 
 from ..core.db import get_session
 from ..models.metrics import Metrics
+from ..services.llm_client import llm_cache_stats
 from .auth import get_current_user
 
 
@@ -24,3 +25,9 @@ def metrics_for_job(job_id: str, x_tenant_id: str = Header(..., alias="X-Tenant-
         }
 
 
+
+
+@router.get("/llm-cache")
+def llm_cache(user=Depends(get_current_user)):
+    # Counters of this worker process's explanation cache
+    return llm_cache_stats()
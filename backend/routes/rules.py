@@ -7,6 +7,7 @@ from sqlmodel import select
 from ..core.db import get_session
 from ..models.rules import RuleSet
 from ..services.pdf_rules_parser import parse_rules_pdf
+from ..services.rule_cache import rule_cache
 from .auth import get_current_user
 
 
@@ -20,16 +21,15 @@ def upload_rules(
     x_tenant_id: str = Header(..., alias="X-Tenant-ID"),
     user=Depends(get_current_user),
 ):
-    content = file.file.read()
-    # Accept JSON or PDF
+    # Accept JSON or PDF; both are parsed from the spooled upload handle
     if file.content_type in ("application/json", "text/json") or (file.filename and file.filename.lower().endswith('.json')):
         try:
-            rules_payload = json.loads(content)
+            rules_payload = json.load(file.file)
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid JSON")
     elif file.content_type == "application/pdf" or (file.filename and file.filename.lower().endswith('.pdf')):
         try:
-            rules_payload = parse_rules_pdf(content, kind)
+            rules_payload = parse_rules_pdf(file.file, kind)
         except Exception as exc:
             raise HTTPException(status_code=400, detail=f"Failed to parse PDF: {exc}")
     else:
@@ -44,9 +44,12 @@ def upload_rules(
         ).first()
         if existing:
             existing.rules_json = rules_json
+            existing.version = (existing.version or 0) + 1
         else:
             rs = RuleSet(tenant_id=x_tenant_id, name=name, kind=kind, rules_json=rules_json)
             session.add(rs)
-        return {"status": "ok", "kind": kind}
+    # The version bump already changes the cache key for every process; this just frees memory here
+    rule_cache.invalidate(x_tenant_id)
+    return {"status": "ok", "kind": kind}
 
 
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import argparse
+import time
+
+from backend.scripts.llm_stub_server import start_server
+from backend.services.llm_async import AsyncBatchLLMClient
+from backend.services.llm_client import BaseLLMClient
+
+
+class _SequentialHTTPClient(BaseLLMClient):
+    """One claim per request, one request at a time: the pre-batching behaviour."""
+
+    def __init__(self, url: str) -> None:
+        self.client = AsyncBatchLLMClient(url=url, batch_size=1, max_concurrency=1, claim_fields=[])
+
+    def explain(self, claim, matched_rules):
+        return self.client.explain_many([(claim, matched_rules)])[0]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare sequential and batched LLM explanation throughput")
+    parser.add_argument("--claims", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per LLM request")
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    server = start_server(latency=args.latency)
+    items = [
+        ({"claim_id": f"C{i}"}, [{"id": f"R{i % 7}", "description": "Rule", "recommendation": "Fix it", "type": "technical"}])
+        for i in range(args.claims)
+    ]
+    try:
+        started = time.perf_counter()
+        expected = _SequentialHTTPClient(server.url).explain_many(items)
+        sequential_seconds = time.perf_counter() - started
+
+        batched = AsyncBatchLLMClient(url=server.url, batch_size=args.batch_size, max_concurrency=args.concurrency, claim_fields=[])
+        started = time.perf_counter()
+        actual = batched.explain_many(items)
+        batched_seconds = time.perf_counter() - started
+    finally:
+        server.shutdown()
+
+    assert actual == expected, "batched results differ from sequential results"
+    print(
+        f"claims={args.claims} sequential={sequential_seconds:.2f}s batched={batched_seconds:.2f}s "
+        f"({batched.stats['requests']} requests) speedup={sequential_seconds / batched_seconds:.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
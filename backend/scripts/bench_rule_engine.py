@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+from backend.services.rule_engine import compile_rules
+from backend.services.vectorized_rules import claims_frame, evaluate_frame
+
+TECHNICAL = [
+    {"id": "T001", "condition": {"field": "service_code", "op": "in", "value": ["SRV1001", "SRV1002", "SRV2008"]}},
+    {"id": "T002", "condition": {"field": "diagnosis_codes", "op": "contains_any", "value": ["E11.9", "R07.9", "Z34.0"]}},
+    {"id": "T003", "condition": {"field": "paid_amount_aed", "op": ">", "value": 250}},
+    {"id": "T004", "condition": {"field": "unique_id", "op": "regex_not_match", "value": "^[A-Z0-9]{4}-[A-Z0-9]{4}-[A-Z0-9]{4}$"}},
+]
+MEDICAL = [
+    {"id": "M001", "condition": {"field": "service_code", "op": "in", "value": ["SRV1001"], "and": {"field": "encounter_type", "op": "equals", "value": "Inpatient"}}},
+    {"id": "M003", "condition": {"field": "facility_id", "op": "not_in_facility_map", "value": {"CARDIOLOGY_CENTER": ["SRV2001"], "GENERAL_HOSPITAL": ["SRV1001", "SRV1002"]}}},
+    {"id": "M004", "condition": {"field": "service_code", "op": "requires_diagnosis", "value": {"SRV1001": "R07.9", "SRV2001": "E11.9"}}},
+    {"id": "M005", "condition": {"field": "diagnosis_codes", "op": "contains_conflicting_pairs", "value": [["R73.03", "E11.9"]]}},
+]
+
+
+def synthetic_claims(n: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    services = ["SRV1001", "SRV1002", "SRV2001", "SRV2007", "SRV2008"]
+    diagnoses = ["E11.9", "R07.9", "R73.03", "J45.909", "Z34.0", "G43.9"]
+    return [
+        {
+            "claim_id": f"C{i}",
+            "service_code": rng.choice(services),
+            "diagnosis_codes": "`".join(rng.sample(diagnoses, rng.randint(1, 3))),
+            "paid_amount_aed": round(rng.uniform(10, 500), 2),
+            "unique_id": rng.choice(["ABCD-1234-EFGH", "abcd-1234-efgh"]),
+            "encounter_type": rng.choice(["Inpatient", "Outpatient"]),
+            "facility_id": f"F{rng.randint(1, 50)}",
+        }
+        for i in range(n)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare row-by-row and vectorized rule evaluation")
+    parser.add_argument("--claims", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    claims = synthetic_claims(args.claims)
+    context = {"facility_type_map": {f"F{i}": ("CARDIOLOGY_CENTER" if i % 2 else "GENERAL_HOSPITAL") for i in range(1, 51)}}
+    plan = compile_rules(TECHNICAL, MEDICAL)
+
+    started = time.perf_counter()
+    expected = [plan.evaluate(claim, context) for claim in claims]
+    row_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    actual = evaluate_frame(claims_frame(claims), plan, context)
+    vector_seconds = time.perf_counter() - started
+
+    assert actual == expected, "vectorized results differ from the row engine"
+    print(f"claims={args.claims} row={row_seconds:.2f}s vectorized={vector_seconds:.2f}s speedup={row_seconds / vector_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
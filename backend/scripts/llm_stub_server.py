@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from backend.services.llm_client import MockLLMClient
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    """Local stand-in for a batch explanation endpoint.
+
+    Answers like AsyncBatchLLMClient expects, with MockLLMClient payloads, after
+    ``latency`` seconds per request. The first ``fail_first`` requests get a 429 so
+    retries can be exercised. ``max_in_flight`` records the most requests served at once.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], latency: float = 0.0, fail_first: int = 0) -> None:
+        super().__init__(address, _Handler)
+        self.latency = latency
+        self.fail_first = fail_first
+        self.requests = 0
+        self.items = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1/explain"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: StubLLMServer
+
+    def do_POST(self) -> None:  # noqa: N802
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with self.server.lock:
+            self.server.requests += 1
+            rejected = self.server.requests <= self.server.fail_first
+            if not rejected:
+                self.server.items += len(body.get("items", []))
+        if rejected:
+            self._send(429, {"error": "rate limited"}, {"Retry-After": "0"})
+            return
+        with self.server.lock:
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+        time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.in_flight -= 1
+        mock = MockLLMClient()
+        results = [{"id": item["id"], **mock.explain(item.get("claim", {}), item.get("matched_rules", []))} for item in body.get("items", [])]
+        self._send(200, {"results": results, "usage": {"total_tokens": len(json.dumps(body)) // 4}})
+
+    def _send(self, status: int, payload: dict, headers: dict | None = None) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args) -> None:  # noqa: A002
+        pass
+
+
+def start_server(host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, fail_first: int = 0) -> StubLLMServer:
+    """Serve in a daemon thread; port 0 picks a free port (see ``server.url``)."""
+    server = StubLLMServer((host, port), latency=latency, fail_first=fail_first)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the batch LLM endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds spent per request")
+    args = parser.parse_args()
+    server = StubLLMServer((args.host, args.port), latency=args.latency)
+    print(f"serving {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
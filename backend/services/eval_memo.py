@@ -0,0 +1,150 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .rule_engine import RulePlan
+
+# (status, error_type, matched, explanation, recommendation)
+Outcome = Tuple[str, str, List[Dict[str, Any]], str, str]
+
+
+class SignatureMemo:
+    """Bounded LRU of validation outcomes keyed by a claim's rule-relevant signature.
+
+    The signature only contains what the plan's rules can observe: the value of fields
+    compared exactly (``equals``, ``in``, service code lookups), the set of codes in
+    fields read part by part, which side of each ``>`` threshold an amount falls on,
+    whether each regex matches, and the facility type when facility rules are active.
+    Claims with equal signatures get equal rule results, so one evaluation and one
+    explanation serve all of them. Fields the explanation itself reads (the LLM client's
+    claim fields) are passed to ``signatures`` as ``text_fields`` and compared exactly.
+    """
+
+    def __init__(self, plan: RulePlan, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Outcome]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        exact: set[Any] = set()
+        parts: set[Any] = set()
+        thresholds: Dict[Any, set[float]] = {}
+        patterns: Dict[Any, Dict[str, re.Pattern]] = {}
+        self.facility_names: set[str] | None = None
+        for _, rule, _, _ in plan.rules:
+            cond = rule.get("condition", {})
+            op = cond.get("op")
+            field = cond.get("field")
+            value = cond.get("value")
+            if op in ("equals", "in"):
+                exact.add(field)
+            elif op == "contains_any":
+                parts.add(field)
+            elif op == ">":
+                try:
+                    thresholds.setdefault(field, set()).add(float(value))
+                except Exception:
+                    pass
+            elif op == "regex_not_match":
+                patterns.setdefault(field, {})[value] = re.compile(value)
+            elif op == "requires_diagnosis":
+                exact.add("service_code")
+                parts.add("diagnosis_codes")
+            elif op == "contains_conflicting_pairs":
+                parts.add("diagnosis_codes")
+            elif op == "not_in_facility_map":
+                exact.add("service_code")
+                # A facility id only matters through its inferred type, or when it names a type itself
+                self.facility_names = (self.facility_names or set()) | {str(name) for name in value}
+            and_cond = cond.get("and")
+            if and_cond and and_cond.get("op") in ("equals", "in"):
+                exact.add(and_cond.get("field"))
+        # An exactly compared field already determines its parts, thresholds and regex results
+        self.exact_fields = sorted(exact, key=str)
+        self.part_fields = sorted(parts - exact, key=str)
+        self.thresholds = {field: sorted(values) for field, values in thresholds.items() if field not in exact}
+        self.patterns = {field: list(compiled.values()) for field, compiled in patterns.items() if field not in exact}
+
+    def _column(self, df: pd.DataFrame, field: Any) -> pd.Series:
+        if field in df.columns:
+            return df[field]
+        return pd.Series([None] * len(df), index=df.index, dtype=object)
+
+    def signatures(
+        self, df: pd.DataFrame, context: Dict[str, Any], text_fields: List[str] | None = None
+    ) -> Tuple[np.ndarray, List[Hashable], np.ndarray]:
+        """Signature code per row, the distinct signatures, and the first row holding each."""
+        columns: List[np.ndarray] = []
+        for field in text_fields or []:
+            # Tagged, so keys with and without explanation fields never collide
+            columns.append(np.full(len(df), f"text:{field}", dtype=object))
+            columns.append(self._column(df, field).astype(str).to_numpy(dtype=object))
+        for field in self.exact_fields:
+            col = self._column(df, field)
+            # str() is what the rules compare; None-ness and truthiness are the only other inputs
+            columns.append(col.astype(str).to_numpy(dtype=object))
+            columns.append(col.isna().to_numpy())
+            columns.append(col.astype(bool).to_numpy())
+        for field, values in self.thresholds.items():
+            amounts = np.array([_to_float(v) for v in self._column(df, field)], dtype="float64")
+            with np.errstate(invalid="ignore"):
+                columns.extend(amounts > threshold for threshold in values)
+        for field, compiled in self.patterns.items():
+            text = self._column(df, field).astype(str)
+            columns.extend(text.map(lambda s, p=pattern: p.match(s) is None).to_numpy(dtype=bool) for pattern in compiled)
+        for field in self.part_fields:
+            # Part-based ops only see the set of stripped, non-empty backtick-separated parts
+            codes, uniques = pd.factorize(self._column(df, field).astype(str))
+            canonical = np.array(["`".join(sorted({p.strip() for p in text.split("`")} - {""})) for text in uniques], dtype=object)
+            columns.append(canonical[codes])
+        if self.facility_names is not None:
+            facility = self._column(df, "facility_id")
+            fid = facility.where(facility.astype(bool), "").astype(str)
+            types = fid.map(context.get("facility_type_map", {})).astype(str)
+            columns.append(types.to_numpy(dtype=object))
+            columns.append(fid.where(fid.isin(self.facility_names), "").to_numpy(dtype=object))
+
+        n = len(df)
+        if not columns:
+            return np.zeros(n, dtype=np.int64), [()] if n else [], np.zeros(1 if n else 0, dtype=np.int64)
+        codes = np.zeros(n, dtype=np.int64)
+        for column in columns:
+            # Fold each column into the running group code
+            column_codes, uniques = pd.factorize(column, use_na_sentinel=False)
+            codes, _ = pd.factorize(codes * max(len(uniques), 1) + column_codes)
+        distinct = int(codes.max()) + 1 if n else 0
+        first_rows = np.full(distinct, n, dtype=np.int64)
+        np.minimum.at(first_rows, codes, np.arange(n))
+        keys = [tuple(column[row] for column in columns) for row in first_rows.tolist()]
+        return codes, keys, first_rows
+
+    def get(self, key: Hashable) -> Outcome | None:
+        with self._lock:
+            outcome = self._entries.get(key)
+            if outcome is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return outcome
+
+    def put(self, key: Hashable, outcome: Outcome) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = outcome
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+def _to_float(value: Any) -> float:
+    try:
+        return float(value)
+    except Exception:
+        return np.nan
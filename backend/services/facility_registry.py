@@ -0,0 +1,129 @@
+import json
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+
+from ..models.facilities import FacilityProfile
+
+# Facilities looked up per IN (...) query
+LOOKUP_BATCH_SIZE = 1_000
+
+
+class FacilityTypeInferer:
+    """Infers a facility's type from the services it bills.
+
+    A facility gets the smallest facility type whose allow-list contains every service it
+    billed; otherwise its own id if that is a type, otherwise GENERAL_HOSPITAL if defined.
+    Allow-lists are turned into sets once instead of once per facility.
+    """
+
+    def __init__(self, facility_rule_map: Dict[str, List[str]]) -> None:
+        self.facility_rule_map = facility_rule_map
+        self._allowed = [(name, {str(v) for v in values}) for name, values in facility_rule_map.items()]
+
+    def infer(self, fid: str, services: set[str]) -> str | None:
+        candidate = None
+        candidate_size = None
+        for name, allowed_set in self._allowed:
+            if services and services <= allowed_set:
+                size = len(allowed_set)
+                if candidate is None or size < candidate_size:
+                    candidate = name
+                    candidate_size = size
+        if candidate:
+            return candidate
+        if fid in self.facility_rule_map:
+            return fid
+        if "GENERAL_HOSPITAL" in self.facility_rule_map:
+            return "GENERAL_HOSPITAL"
+        return None
+
+
+def _load_profiles(session, tenant_id: str, facility_ids: List[str]) -> Dict[str, FacilityProfile]:
+    profiles: Dict[str, FacilityProfile] = {}
+    for start in range(0, len(facility_ids), LOOKUP_BATCH_SIZE):
+        batch = facility_ids[start:start + LOOKUP_BATCH_SIZE]
+        # Row locks keep concurrent jobs from dropping each other's newly seen services
+        for profile in session.exec(
+            select(FacilityProfile)
+            .where(FacilityProfile.tenant_id == tenant_id, FacilityProfile.facility_id.in_(batch))
+            .with_for_update()
+        ).all():
+            profiles[profile.facility_id] = profile
+    return profiles
+
+
+def _merge(profile: FacilityProfile, services: set[str], inferer: FacilityTypeInferer, digest: str) -> None:
+    known = set(json.loads(profile.services_json or "[]"))
+    merged = known | services
+    # Only facilities with new services or stale allow-lists are re-inferred
+    if merged == known and profile.rule_map_digest == digest:
+        return
+    profile.services_json = json.dumps(sorted(merged))
+    profile.facility_type = inferer.infer(profile.facility_id, merged)
+    profile.rule_map_digest = digest
+    profile.updated_at = datetime.utcnow()
+
+
+def _add_or_merge(
+    session,
+    tenant_id: str,
+    profile: FacilityProfile,
+    services: set[str],
+    inferer: FacilityTypeInferer,
+    digest: str,
+    profiles: Dict[str, FacilityProfile],
+) -> None:
+    fid = profile.facility_id
+    try:
+        with session.begin_nested():
+            session.add(profile)
+    except IntegrityError:
+        profile = _load_profiles(session, tenant_id, [fid])[fid]
+        _merge(profile, services, inferer, digest)
+    profiles[fid] = profile
+
+
+def sync_facility_types(
+    session,
+    tenant_id: str,
+    usage: Dict[str, set[str]],
+    facility_rule_map: Dict[str, List[str]],
+    digest: str,
+) -> Dict[str, str | None]:
+    """Record the services each facility billed and return their facility types.
+
+    ``usage`` maps facility id to the service codes seen in the current job; they are added
+    to the tenant's registry, so a facility's type reflects everything it has ever billed.
+    ``digest`` identifies ``facility_rule_map``; profiles inferred with other allow-lists
+    are re-inferred.
+    """
+    inferer = FacilityTypeInferer(facility_rule_map)
+    profiles = _load_profiles(session, tenant_id, sorted(usage))
+    new_profiles: List[FacilityProfile] = []
+    for fid, services in usage.items():
+        profile = profiles.get(fid)
+        if profile is not None:
+            _merge(profile, services, inferer, digest)
+            continue
+        new_profiles.append(
+            FacilityProfile(
+                tenant_id=tenant_id,
+                facility_id=fid,
+                services_json=json.dumps(sorted(services)),
+                facility_type=inferer.infer(fid, services),
+                rule_map_digest=digest,
+            )
+        )
+    if new_profiles:
+        try:
+            with session.begin_nested():
+                session.add_all(new_profiles)
+            profiles.update((profile.facility_id, profile) for profile in new_profiles)
+        except IntegrityError:
+            # A concurrent job registered some of these facilities first; merge one at a time
+            for profile in new_profiles:
+                _add_or_merge(session, tenant_id, profile, usage[profile.facility_id], inferer, digest, profiles)
+    return {fid: profiles[fid].facility_type for fid in usage}
@@ -1,13 +1,27 @@
+import hashlib
 import io
+import json
+import multiprocessing
+import os
 import re
+import tempfile
 import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import BinaryIO, Dict, Iterator, List, Tuple
 
 import pandas as pd
 from fastapi import HTTPException
+from pandas._libs.parsers import STR_NA_VALUES
+from pandas.tseries.api import guess_datetime_format
+from sqlalchemy import func, insert, literal
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import select
 
-from ..models.claims import MasterClaim
+from ..core.config import settings
+from ..core.db import bulk_insert
+from ..models.claims import MasterClaim, RefinedClaim
 from ..models.ingestions import Ingestion
 
 
@@ -26,6 +40,11 @@ REQUIRED_FIELDS = {
 }
 
 
+LEGACY_XLS_DETAIL = "Legacy .xls workbooks are not supported; save the file as .xlsx or CSV"
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+COLUMNAR_EXTENSIONS = PARQUET_EXTENSIONS + (".arrow", ".feather", ".ipc", ".arrows")
+
+
 def _normalize_header(name: str | None) -> str:
     if not name:
         return ""
@@ -44,9 +63,24 @@ def _detect_header_row(df: pd.DataFrame) -> int | None:
     return None
 
 
-def _load_claims_dataframe(file_bytes: bytes, filename: str) -> pd.DataFrame:
-    buffer = io.BytesIO(file_bytes)
-    if filename.lower().endswith((".xlsx", ".xls")):
+def _open_source(source: bytes | BinaryIO) -> BinaryIO:
+    # Uploads arrive as spooled temp files; parse straight from the handle instead of copying into memory
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    source.seek(0)
+    return source
+
+
+def _reject_legacy_xls(filename: str) -> None:
+    # openpyxl only reads the OOXML formats
+    if filename.lower().endswith(".xls"):
+        raise HTTPException(status_code=400, detail=LEGACY_XLS_DETAIL)
+
+
+def _load_claims_dataframe(source: bytes | BinaryIO, filename: str) -> pd.DataFrame:
+    _reject_legacy_xls(filename)
+    buffer = _open_source(source)
+    if filename.lower().endswith(".xlsx"):
         df_raw = pd.read_excel(buffer, header=None, dtype=str)
     else:
         df_raw = pd.read_csv(buffer, header=None, dtype=str)
@@ -63,6 +97,92 @@ def _load_claims_dataframe(file_bytes: bytes, filename: str) -> pd.DataFrame:
     return df
 
 
+def _xlsx_cell_to_str(value) -> str | None:
+    # Mirror pd.read_excel(dtype=str): integral floats lose the ".0", NA markers become missing
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = str(value)
+    if text in STR_NA_VALUES:
+        return None
+    return text
+
+
+def _iter_xlsx_chunks(buffer, chunk_size: int, sheet_name: str | None = None) -> Iterator[pd.DataFrame]:
+    import openpyxl
+
+    wb = openpyxl.load_workbook(buffer, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name] if sheet_name else wb.worksheets[0]
+        ws.reset_dimensions()
+        rows: List[List[str | None]] = []
+        pending_blank = 0
+        for raw in ws.iter_rows(values_only=True):
+            row = [_xlsx_cell_to_str(v) for v in raw]
+            while row and row[-1] is None:
+                row.pop()
+            if not row:
+                # Defer blank rows so trailing ones are never emitted
+                pending_blank += 1
+                continue
+            rows.extend([] for _ in range(pending_blank))
+            pending_blank = 0
+            rows.append(row)
+            if len(rows) >= chunk_size:
+                yield pd.DataFrame(rows, dtype=object)
+                rows = []
+        if rows:
+            yield pd.DataFrame(rows, dtype=object)
+    finally:
+        wb.close()
+
+
+def _iter_raw_chunks(source: bytes | BinaryIO, filename: str, chunk_size: int, sheet_name: str | None = None) -> Iterator[pd.DataFrame]:
+    _reject_legacy_xls(filename)
+    buffer = _open_source(source)
+    if filename.lower().endswith(".xlsx"):
+        yield from _iter_xlsx_chunks(buffer, chunk_size, sheet_name)
+    else:
+        yield from pd.read_csv(buffer, header=None, dtype=str, chunksize=chunk_size)
+
+
+def _iter_claims_chunks(source: bytes | BinaryIO, filename: str, chunk_size: int, sheet_name: str | None = None) -> Iterator[pd.DataFrame]:
+    """Yield header-labelled chunks of the claims file, locating the header in the first chunk."""
+    header_values: List[str] | None = None
+    for df_raw in _iter_raw_chunks(source, filename, max(chunk_size, 15), sheet_name):
+        df_raw = df_raw.reset_index(drop=True)
+        if header_values is None:
+            header_idx = _detect_header_row(df_raw)
+            if header_idx is None:
+                raise HTTPException(status_code=400, detail="Could not locate header row in claims file. Ensure the file contains standard column headings.")
+            header_values = df_raw.iloc[header_idx].fillna("").tolist()
+            df_raw = df_raw.iloc[header_idx + 1 :].reset_index(drop=True)
+        # Later chunks may be narrower or wider than the header row
+        df = df_raw.reindex(columns=range(len(header_values)))
+        df.columns = header_values
+        df = df.dropna(how="all")
+        if len(df):
+            yield df
+
+
+def _format_service_date(value) -> str:
+    try:
+        dt = pd.to_datetime(value, dayfirst=False, errors="coerce")
+        if pd.notnull(dt):
+            return dt.strftime("%Y-%m-%d")
+        return str(value)
+    except Exception:
+        return str(value)
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except Exception:
+        return 0.0
+
+
 def _normalize_row(row: dict) -> dict:
     # Uppercase relevant ids
     for key in ("national_id", "member_id", "facility_id", "unique_id"):
@@ -74,14 +194,7 @@ def _normalize_row(row: dict) -> dict:
     # Service date to yyyy-mm-dd
     value = row.get("service_date")
     if value:
-        try:
-            dt = pd.to_datetime(value, dayfirst=False, errors="coerce")
-            if pd.notnull(dt):
-                row["service_date"] = dt.strftime("%Y-%m-%d")
-            else:
-                row["service_date"] = str(value)
-        except Exception:
-            row["service_date"] = str(value)
+        row["service_date"] = _format_service_date(value)
     # Diagnosis codes: unify separators to backtick
     if row.get("diagnosis_codes"):
         raw = str(row["diagnosis_codes"])
@@ -93,30 +206,92 @@ def _normalize_row(row: dict) -> dict:
     # service_date: leave as string yyyy-mm-dd (expect file to conform)
     # paid_amount_aed: coerce to float
     if row.get("paid_amount_aed") is not None:
-        try:
-            row["paid_amount_aed"] = float(row["paid_amount_aed"])  # type: ignore[assignment]
-        except Exception:
-            row["paid_amount_aed"] = 0.0
+        row["paid_amount_aed"] = _to_float(row["paid_amount_aed"])  # type: ignore[assignment]
     return row
 
 
-def ingest_claims_file(session, tenant_id: str, file_bytes: bytes, filename: str) -> Tuple[str, int]:
-    job_id = str(uuid.uuid4())
+def _infer_date_format(sample: str) -> str | None:
+    fmt = guess_datetime_format(sample, dayfirst=False)
+    if not fmt:
+        return None
+    # Only keep formats whose strict parse agrees with the per-value dayfirst=False parse:
+    # day-before-month, two-digit years and offsets are resolved differently by dateutil.
+    if "%y" in fmt or "%z" in fmt or "%Z" in fmt:
+        return None
+    if "%d" in fmt and "%m" in fmt and fmt.index("%d") < fmt.index("%m"):
+        return None
+    return fmt
 
+
+def _normalize_service_dates(col: pd.Series, date_formats: Dict[str, str | None]) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(col):
+        # Typed columnar input: nothing to parse
+        return col.dt.strftime("%Y-%m-%d").fillna("")
+    present = col.astype(bool)
+    values = col[present].astype(str)
+    out = col.copy()
+    if values.empty:
+        return out
+    if "service_date" not in date_formats:
+        date_formats["service_date"] = _infer_date_format(values.iloc[0])
+    fmt = date_formats["service_date"]
+    if fmt:
+        parsed = pd.to_datetime(values, format=fmt, errors="coerce")
+    else:
+        parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    unparsed = parsed.isna()
+    out.loc[parsed.index[~unparsed]] = parsed[~unparsed].dt.strftime("%Y-%m-%d")
+    if unparsed.any():
+        leftovers = values[unparsed]
+        lookup = {value: _format_service_date(value) for value in leftovers.unique()}
+        out.loc[leftovers.index] = leftovers.map(lookup)
+    return out
+
+
+def _normalize_amounts(col: pd.Series) -> pd.Series:
+    if pd.api.types.is_numeric_dtype(col):
+        # Typed columnar input; nulls count as blanks
+        return col.astype("float64").fillna(0.0)
+    # float() semantics: blanks and junk become 0.0; astype(float) rounds exactly like float()
     try:
-        df = _load_claims_dataframe(file_bytes, filename)
-    except HTTPException:
-        raise
-    except Exception as exc:  # pragma: no cover - safety net
-        raise HTTPException(status_code=400, detail=f"Failed to parse file: {exc}")
+        return col.where(col != "", "0").astype("float64")
+    except (TypeError, ValueError):
+        lookup = {value: _to_float(value) for value in col.unique()}
+        return col.map(lookup).astype("float64")
+
 
+def _normalize_frame(df_subset: pd.DataFrame, date_formats: Dict[str, str | None] | None = None) -> pd.DataFrame:
+    """Column-wise equivalent of applying ``_normalize_row`` to every record.
+
+    ``date_formats`` caches the inferred ``service_date`` format; pass the same dict for
+    every chunk of a file so the format is guessed once.
+    """
+    if date_formats is None:
+        date_formats = {}
+    df = df_subset.copy()
+    for key in ("national_id", "member_id", "facility_id", "unique_id"):
+        df[key] = df[key].astype(str).str.upper()
+    df["service_code"] = df["service_code"].astype(str).str.strip().str.upper()
+    df["service_date"] = _normalize_service_dates(df["service_date"], date_formats)
+
+    diag = df["diagnosis_codes"].astype(str)
+    # Rows already using backticks keep other separators verbatim, like the row path
+    canonical = diag.where(diag.str.contains("`", regex=False), diag.str.replace(r"[\n,;|]+", "`", regex=True))
+    canonical = canonical.str.replace(r"\s*`[\s`]*", "`", regex=True)
+    df["diagnosis_codes"] = canonical.str.replace(r"^[\s`]+|[\s`]+$", "", regex=True)
+
+    df["paid_amount_aed"] = _normalize_amounts(df["paid_amount_aed"])
+    return df
+
+
+def _map_columns(columns) -> Dict[str, str | None]:
     normalized_lookup: Dict[str, str] = {}
-    for column in df.columns:
+    for column in columns:
         norm = _normalize_header(column)
         if norm:
             normalized_lookup.setdefault(norm, column)
 
-    field_to_column: Dict[str, str] = {}
+    field_to_column: Dict[str, str | None] = {}
     missing_fields: List[str] = []
     for field, variants in REQUIRED_FIELDS.items():
         matched_column = None
@@ -153,31 +328,502 @@ def ingest_claims_file(session, tenant_id: str, file_bytes: bytes, filename: str
     # Ensure claim_id column exists in mapping by generating if absent
     if "claim_id" not in field_to_column:
         field_to_column["claim_id"] = None
+    return field_to_column
 
-    df_subset = df[[col for col in field_to_column.values() if col]].copy()
-    if field_to_column.get("claim_id") is None:
-        df_subset["__generated_claim_id"] = [str(index + 1) for index in range(len(df_subset))]
-        field_to_column["claim_id"] = "__generated_claim_id"
 
-    df_subset.rename(columns={col: field for field, col in field_to_column.items() if col}, inplace=True)
+def _select_fields(df: pd.DataFrame, field_to_column: Dict[str, str | None], row_offset: int = 0) -> pd.DataFrame:
+    mapping = dict(field_to_column)
+    df_subset = df[[col for col in mapping.values() if col]].copy()
+    if mapping.get("claim_id") is None:
+        df_subset["__generated_claim_id"] = [str(row_offset + index + 1) for index in range(len(df_subset))]
+        mapping["claim_id"] = "__generated_claim_id"
+
+    df_subset.rename(columns={col: field for field, col in mapping.items() if col}, inplace=True)
     df_subset = df_subset.replace({pd.NA: None})
     df_subset = df_subset.fillna("")
+    return df_subset
+
+
+ROW_HASH_FIELDS = list(REQUIRED_FIELDS.keys())
+
+
+def _row_hashes(df_norm: pd.DataFrame) -> pd.Series:
+    # hash_pandas_object uses a fixed key, so hashes are stable across processes and runs
+    hashed = pd.util.hash_pandas_object(df_norm[ROW_HASH_FIELDS], index=False)
+    return hashed.map("{:016x}".format)
+
+
+def _claim_keys(df: pd.DataFrame) -> pd.Series:
+    return df["claim_id"].astype(str) + "\x1f" + df["unique_id"].astype(str)
+
+
+def _persist_claims(session, tenant_id: str, job_id: str, df_norm: pd.DataFrame) -> int:
+    df_norm = df_norm.assign(tenant_id=tenant_id, job_id=job_id, row_hash=_row_hashes(df_norm))
+    return bulk_insert(session, MasterClaim, df_norm.to_dict(orient="records"))
+
+
+def _is_columnar(filename: str) -> bool:
+    return filename.lower().endswith(COLUMNAR_EXTENSIONS)
+
+
+def _open_columnar(buffer: BinaryIO, filename: str):
+    """Return (column names, reader) where reader(columns, n) yields record batches of the projected columns."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if filename.lower().endswith(PARQUET_EXTENSIONS):
+        pf = pq.ParquetFile(buffer)
+        return pf.schema_arrow.names, lambda columns, n: pf.iter_batches(batch_size=n, columns=columns)
+
+    try:
+        reader = pa.ipc.open_file(buffer)
+        batches = lambda: (reader.get_batch(i) for i in range(reader.num_record_batches))  # noqa: E731
+    except pa.ArrowInvalid:
+        buffer.seek(0)
+        reader = pa.ipc.open_stream(buffer)
+        batches = lambda: iter(reader)  # noqa: E731
+
+    def _read(columns: List[str], n: int):
+        for batch in batches():
+            batch = batch.select(columns)
+            for offset in range(0, batch.num_rows, n):
+                yield batch.slice(offset, n)
+
+    return reader.schema.names, _read
+
+
+def _columnar_batch_to_frame(batch, field_to_column: Dict[str, str | None], row_offset: int) -> pd.DataFrame:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    data: Dict[str, pd.Series] = {}
+    for field, column in field_to_column.items():
+        if not column:
+            continue
+        arr = batch.column(batch.schema.get_field_index(column))
+        if field == "service_date" and (pa.types.is_temporal(arr.type) and not pa.types.is_time(arr.type)):
+            data[field] = pd.Series(arr.to_pandas(), dtype="datetime64[ns]") if pa.types.is_date(arr.type) else arr.to_pandas()
+        elif field == "paid_amount_aed" and (pa.types.is_integer(arr.type) or pa.types.is_floating(arr.type)):
+            data[field] = arr.to_pandas()
+        else:
+            # Everything else gets the same text representation the CSV path would see
+            try:
+                text_values = pc.fill_null(pc.cast(arr, pa.string()), "").to_pandas()
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                text_values = pd.Series([("" if v is None else str(v)) for v in arr.to_pylist()], dtype=object)
+            data[field] = text_values.astype(object)
+    df = pd.DataFrame(data)
+    if field_to_column.get("claim_id") is None:
+        df["claim_id"] = [str(row_offset + index + 1) for index in range(len(df))]
+    return df
+
 
+def _iter_columnar_chunks(source: bytes | BinaryIO, filename: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Yield field-named chunks of a Parquet/Arrow file, reading only the mapped columns."""
+    names, read = _open_columnar(_open_source(source), filename)
+    field_to_column = _map_columns(names)
+    columns = list(dict.fromkeys(col for col in field_to_column.values() if col))
+    row_count = 0
+    for batch in read(columns, chunk_size):
+        if batch.num_rows:
+            yield _columnar_batch_to_frame(batch, field_to_column, row_count)
+            row_count += batch.num_rows
+
+
+def _iter_normalized_chunks(source: bytes | BinaryIO, filename: str, sheet_name: str | None = None) -> Iterator[pd.DataFrame]:
+    if _is_columnar(filename):
+        date_formats_columnar: Dict[str, str | None] = {}
+        for df_subset in _iter_columnar_chunks(source, filename, settings.INGEST_CHUNK_SIZE):
+            yield _normalize_frame(df_subset, date_formats_columnar)
+        return
+    field_to_column: Dict[str, str | None] | None = None
+    date_formats: Dict[str, str | None] = {}
+    row_count = 0
+    for df in _iter_claims_chunks(source, filename, settings.INGEST_CHUNK_SIZE, sheet_name):
+        if field_to_column is None:
+            field_to_column = _map_columns(df.columns)
+        df_subset = _select_fields(df, field_to_column, row_offset=row_count)
+        row_count += len(df_subset)
+        yield _normalize_frame(df_subset, date_formats)
+    if field_to_column is None:
+        raise HTTPException(status_code=400, detail="Could not locate header row in claims file. Ensure the file contains standard column headings.")
+
+
+def _ingest_streaming(session, tenant_id: str, job_id: str, source: bytes | BinaryIO, filename: str) -> int:
     insert_count = 0
-    for record in df_subset.to_dict(orient="records"):
-        mapped = _normalize_row(record)
-        mc = MasterClaim(tenant_id=tenant_id, job_id=job_id, **mapped)
-        session.add(mc)
-        insert_count += 1
+    for df_norm in _iter_normalized_chunks(source, filename):
+        # Each chunk goes straight to the database, so memory stays flat
+        insert_count += _persist_claims(session, tenant_id, job_id, df_norm)
+    return insert_count
+
+
+class HashingReader(io.RawIOBase):
+    """Read-only file wrapper that hashes the upload while the parser reads it.
+
+    Sequential readers (CSV) hash the file in the same pass that parses it. Formats read
+    out of order (XLSX, Parquet) leave gaps; ``hexdigest`` reads the rest from where the
+    hashed prefix ends, so the digest always covers the whole file.
+    """
+
+    def __init__(self, raw: BinaryIO, block_size: int = 1024 * 1024) -> None:
+        self._raw = raw
+        self._block_size = block_size
+        self._digest = hashlib.sha256()
+        self._hashed = 0  # bytes [0, _hashed) are in the digest
+        raw.seek(0)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._raw.tell()
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._raw.seek(offset, whence)
+
+    def read(self, size: int = -1) -> bytes:
+        position = self._raw.tell()
+        data = self._raw.read(size)
+        self._update(position, data)
+        return data
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def _update(self, position: int, data: bytes) -> None:
+        if position <= self._hashed < position + len(data):
+            self._digest.update(data[self._hashed - position :])
+            self._hashed = position + len(data)
+
+    def hexdigest(self) -> str:
+        position = self._raw.tell()
+        self._raw.seek(self._hashed)
+        for block in iter(lambda: self._raw.read(self._block_size), b""):
+            self._update(self._hashed, block)
+        self._raw.seek(position)
+        return self._digest.hexdigest()
 
+
+def hash_upload(source: bytes | BinaryIO, block_size: int = 1024 * 1024) -> str:
+    """SHA-256 of the upload; a HashingReader only reads what parsing has not."""
+    if isinstance(source, (bytes, bytearray)):
+        return hashlib.sha256(source).hexdigest()
+    if isinstance(source, HashingReader):
+        return source.hexdigest()
+    digest = hashlib.sha256()
+    source.seek(0)
+    for block in iter(lambda: source.read(block_size), b""):
+        digest.update(block)
+    source.seek(0)
+    return digest.hexdigest()
+
+
+def find_duplicate_ingestion(session, tenant_id: str, content_sha256: str) -> Tuple[Ingestion, int] | None:
+    """Return the most recent non-failed ingestion of byte-identical content and its row count."""
+    stmt = select(Ingestion).where(
+        Ingestion.tenant_id == tenant_id,
+        Ingestion.content_sha256 == content_sha256,
+        Ingestion.status != "failed",
+    )
+    existing = session.exec(stmt.order_by(Ingestion.id.desc())).first()
+    if not existing:
+        return None
+    rows = session.exec(
+        select(func.count()).select_from(MasterClaim).where(MasterClaim.tenant_id == tenant_id, MasterClaim.job_id == existing.job_id)
+    ).one()
+    rows += session.exec(
+        select(func.count())
+        .select_from(RefinedClaim)
+        .where(RefinedClaim.tenant_id == tenant_id, RefinedClaim.job_id == existing.job_id, RefinedClaim.carried_forward == True)  # noqa: E712
+    ).one()
+    return existing, rows
+
+
+def ingest_claims_file(
+    session,
+    tenant_id: str,
+    source: bytes | BinaryIO,
+    filename: str,
+    streaming: bool | None = None,
+    content_sha256: str | None = None,
+) -> Tuple[str, int]:
+    job_id = str(uuid.uuid4())
+    if streaming is None:
+        streaming = settings.INGEST_STREAMING
+
+    try:
+        if streaming or _is_columnar(filename):
+            insert_count = _ingest_streaming(session, tenant_id, job_id, source, filename)
+        else:
+            df = _load_claims_dataframe(source, filename)
+            df_subset = _select_fields(df, _map_columns(df.columns))
+            insert_count = _persist_claims(session, tenant_id, job_id, _normalize_frame(df_subset))
+    except (HTTPException, SQLAlchemyError):
+        raise
+    except Exception as exc:  # pragma: no cover - safety net
+        raise HTTPException(status_code=400, detail=f"Failed to parse file: {exc}")
+
+    if content_sha256 is None and isinstance(source, HashingReader):
+        content_sha256 = source.hexdigest()
     ingestion = Ingestion(
         tenant_id=tenant_id,
         job_id=job_id,
         status="pending",
         counts_json=None,
+        content_sha256=content_sha256,
+        source_name=filename,
     )
     session.add(ingestion)
 
     return job_id, insert_count
 
 
+CLAIMS_FILE_EXTENSIONS = (".csv", ".xlsx") + COLUMNAR_EXTENSIONS
+
+
+def _parse_claims_member(path: str, filename: str, spill_prefix: str, sheet_name: str | None = None) -> Tuple[List[str], str | None]:
+    """Process-pool worker: normalize one batch member into pickled chunk files.
+
+    Returns (chunk file paths, error). Chunks go back through the filesystem one at a time,
+    so neither the worker nor the parent ever holds more than a chunk of the member.
+    """
+    paths: List[str] = []
+    try:
+        with open(path, "rb") as fh:
+            for index, df_norm in enumerate(_iter_normalized_chunks(fh, filename, sheet_name)):
+                chunk_path = f"{spill_prefix}.{index}.pkl"
+                df_norm.to_pickle(chunk_path)
+                paths.append(chunk_path)
+        return paths, None
+    except HTTPException as exc:
+        error = str(exc.detail)
+    except Exception as exc:
+        error = f"Failed to parse file: {exc}"
+    for chunk_path in paths:
+        os.remove(chunk_path)
+    return [], error
+
+
+def _copy_member(src: BinaryIO, path: str, budget: int) -> int:
+    """Copy an archive member to ``path``; returns bytes written, failing past ``budget``."""
+    written = 0
+    with open(path, "wb") as dst:
+        for block in iter(lambda: src.read(1024 * 1024), b""):
+            written += len(block)
+            # Declared sizes can lie; count what is actually inflated
+            if written > budget:
+                raise HTTPException(status_code=400, detail=f"Archive expands beyond the {settings.INGEST_BATCH_MAX_BYTES} byte limit")
+            dst.write(block)
+    return written
+
+
+def _extract_batch_members(source: bytes | BinaryIO, filename: str, workdir: str) -> List[Tuple[str, str, str, str | None]]:
+    """Spill batch members to ``workdir`` as (label, path, filename, sheet_name) tuples.
+
+    ZIP archives are limited to INGEST_BATCH_MAX_FILES claims files and
+    INGEST_BATCH_MAX_BYTES uncompressed bytes, so a small archive cannot fill the disk.
+    """
+    buffer = _open_source(source)
+    members: List[Tuple[str, str, str, str | None]] = []
+    lower = filename.lower()
+    if lower.endswith(".zip"):
+        try:
+            archive = zipfile.ZipFile(buffer)
+        except zipfile.BadZipFile:
+            raise HTTPException(status_code=400, detail="Invalid ZIP archive")
+        with archive:
+            selected = []
+            for index, info in enumerate(archive.infolist()):
+                name = info.filename
+                base = os.path.basename(name)
+                if info.is_dir() or not base or base.startswith(".") or name.startswith("__MACOSX/"):
+                    continue
+                if not base.lower().endswith(CLAIMS_FILE_EXTENSIONS):
+                    continue
+                selected.append((index, info, base))
+            if len(selected) > settings.INGEST_BATCH_MAX_FILES:
+                raise HTTPException(status_code=400, detail=f"Archive holds more than {settings.INGEST_BATCH_MAX_FILES} claims files")
+            if sum(info.file_size for _, info, _ in selected) > settings.INGEST_BATCH_MAX_BYTES:
+                raise HTTPException(status_code=400, detail=f"Archive expands beyond the {settings.INGEST_BATCH_MAX_BYTES} byte limit")
+            budget = settings.INGEST_BATCH_MAX_BYTES
+            for index, info, base in selected:
+                # Never trust member paths; write each one under a generated name
+                path = os.path.join(workdir, f"{index}_{uuid.uuid4().hex}{os.path.splitext(base)[1]}")
+                with archive.open(info) as src:
+                    budget -= _copy_member(src, path, budget)
+                members.append((info.filename, path, base, None))
+    elif lower.endswith(".xlsx"):
+        import openpyxl
+
+        path = os.path.join(workdir, "workbook.xlsx")
+        with open(path, "wb") as dst:
+            for block in iter(lambda: buffer.read(1024 * 1024), b""):
+                dst.write(block)
+        wb = openpyxl.load_workbook(path, read_only=True)
+        try:
+            sheet_names = list(wb.sheetnames)
+        finally:
+            wb.close()
+        members.extend((f"{filename}:{sheet}", path, filename, sheet) for sheet in sheet_names)
+    elif lower.endswith(".xls"):
+        raise HTTPException(status_code=400, detail=LEGACY_XLS_DETAIL)
+    else:
+        raise HTTPException(status_code=400, detail="Expecting a ZIP archive or an XLSX workbook")
+    if not members:
+        raise HTTPException(status_code=400, detail="Archive contains no CSV/XLSX claims files")
+    return members
+
+
+def ingest_claims_batch(session, tenant_id: str, source: bytes | BinaryIO, filename: str) -> Tuple[str, List[Dict[str, object]]]:
+    """Ingest every member of a ZIP archive or every sheet of a workbook as its own child job.
+
+    Members are parsed and normalized in a process pool, then bulk-loaded chunk by chunk.
+    Returns the parent job id and one summary dict per child.
+    """
+    parent_job_id = str(uuid.uuid4())
+    children: List[Dict[str, object]] = []
+    with tempfile.TemporaryDirectory(prefix="claims-batch-") as workdir:
+        members = _extract_batch_members(source, filename, workdir)
+        workers = min(len(members), settings.INGEST_MAX_WORKERS or os.cpu_count() or 1)
+        # Spawned, not forked: a child of the multi-threaded API process could inherit a held lock
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [
+                pool.submit(_parse_claims_member, path, member_file, os.path.join(workdir, f"member{index}"), sheet)
+                for index, (_, path, member_file, sheet) in enumerate(members)
+            ]
+            for (label, _, _, _), future in zip(members, futures):
+                chunk_paths, error = future.result()
+                job_id = str(uuid.uuid4())
+                rows = 0
+                for chunk_path in chunk_paths:
+                    rows += _persist_claims(session, tenant_id, job_id, pd.read_pickle(chunk_path))
+                    os.remove(chunk_path)
+                status = "failed" if error else "pending"
+                session.add(
+                    Ingestion(
+                        tenant_id=tenant_id,
+                        job_id=job_id,
+                        status=status,
+                        parent_job_id=parent_job_id,
+                        source_name=label,
+                        error=error,
+                        finished_at=datetime.utcnow() if error else None,
+                    )
+                )
+                children.append({"job_id": job_id, "source": label, "rows": rows, "status": status, "error": error})
+
+    any_pending = any(c["status"] == "pending" for c in children)
+    session.add(
+        Ingestion(
+            tenant_id=tenant_id,
+            job_id=parent_job_id,
+            status="pending" if any_pending else "failed",
+            source_name=filename,
+            counts_json=json.dumps({"children": len(children), "rows": sum(int(c["rows"]) for c in children)}),
+        )
+    )
+    return parent_job_id, children
+
+
+# Claim ids per prior-result lookup query
+PRIOR_LOOKUP_BATCH_SIZE = 1_000
+
+
+def _lookup_prior_results(session, tenant_id: str, base_job_id: str, df_norm: pd.DataFrame) -> Dict[str, Tuple[str | None, int]]:
+    """Map claim key -> (row hash, RefinedClaim id) of the base job's results for the claims in ``df_norm``.
+
+    Looked up per chunk, in id order, so memory follows the chunk size rather than the base job.
+    """
+    claim_ids = sorted(set(df_norm["claim_id"].astype(str)))
+    prior: Dict[str, Tuple[str | None, int]] = {}
+    for start in range(0, len(claim_ids), PRIOR_LOOKUP_BATCH_SIZE):
+        stmt = (
+            select(MasterClaim.claim_id, MasterClaim.unique_id, MasterClaim.row_hash, RefinedClaim.id)
+            .join(RefinedClaim, RefinedClaim.master_claim_id == MasterClaim.id)
+            .where(
+                RefinedClaim.tenant_id == tenant_id,
+                RefinedClaim.job_id == base_job_id,
+                RefinedClaim.claim_id.in_(claim_ids[start:start + PRIOR_LOOKUP_BATCH_SIZE]),
+            )
+            .order_by(RefinedClaim.id)
+        )
+        for claim_id, unique_id, row_hash, refined_id in session.exec(stmt):
+            # Results carried into the base job count too; the first result of a key wins
+            prior.setdefault(f"{claim_id}\x1f{unique_id}", (row_hash, refined_id))
+    return prior
+
+
+def _carry_forward_results(session, job_id: str, refined_ids: List[int]) -> int:
+    """Server-side copy of unchanged results into the resubmission job."""
+    table = RefinedClaim.__table__
+    columns = [c for c in table.columns if not c.primary_key]
+    overrides = {"job_id": literal(job_id), "carried_forward": literal(True), "created_at": literal(datetime.utcnow())}
+    source = select(*[overrides.get(c.name, c) for c in columns]).where(table.c.id.in_(refined_ids)).order_by(table.c.id)
+    session.execute(insert(table).from_select([c.name for c in columns], source))
+    return len(refined_ids)
+
+
+def ingest_claims_resubmission(
+    session,
+    tenant_id: str,
+    source: bytes | BinaryIO,
+    filename: str,
+    base_job_id: str,
+    content_sha256: str | None = None,
+) -> Tuple[str, Dict[str, int]]:
+    """Ingest a corrected file against a validated prior job.
+
+    Rows are keyed on claim_id + unique_id. Rows whose normalized content hash matches the
+    base job keep their RefinedClaim result (copied server-side); only new or changed rows
+    become MasterClaims of the new job, so validation only evaluates the delta.
+    """
+    base = session.exec(
+        select(Ingestion).where(Ingestion.tenant_id == tenant_id, Ingestion.job_id == base_job_id)
+    ).first()
+    if not base:
+        raise HTTPException(status_code=404, detail="Base job not found")
+    if base.status != "completed":
+        raise HTTPException(status_code=409, detail="Base job has not finished validation")
+
+    job_id = str(uuid.uuid4())
+    carried_ids: set[int] = set()
+    inserted = 0
+    carried = 0
+    try:
+        for df_norm in _iter_normalized_chunks(source, filename):
+            prior = _lookup_prior_results(session, tenant_id, base_job_id, df_norm)
+            hashes = _row_hashes(df_norm)
+            unchanged = []
+            for position, (key, row_hash) in enumerate(zip(_claim_keys(df_norm), hashes)):
+                hit = prior.get(key)
+                if hit and hit[0] == row_hash and hit[1] not in carried_ids:
+                    carried_ids.add(hit[1])
+                    unchanged.append((position, hit[1]))
+            if unchanged:
+                carried += _carry_forward_results(session, job_id, [refined_id for _, refined_id in unchanged])
+                df_norm = df_norm.drop(df_norm.index[[position for position, _ in unchanged]])
+            if len(df_norm):
+                inserted += _persist_claims(session, tenant_id, job_id, df_norm)
+    except (HTTPException, SQLAlchemyError):
+        raise
+    except Exception as exc:  # pragma: no cover - safety net
+        raise HTTPException(status_code=400, detail=f"Failed to parse file: {exc}")
+
+    if content_sha256 is None and isinstance(source, HashingReader):
+        content_sha256 = source.hexdigest()
+    session.add(
+        Ingestion(
+            tenant_id=tenant_id,
+            job_id=job_id,
+            status="pending",
+            content_sha256=content_sha256,
+            source_name=filename,
+            base_job_id=base_job_id,
+        )
+    )
+    return job_id, {"rows": inserted + carried, "changed": inserted, "carried_forward": carried}
@@ -0,0 +1,302 @@
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict
+
+from sqlalchemy import and_, func, or_, text, update
+from sqlmodel import select
+
+from ..core.config import settings
+from ..core.db import get_session
+from ..models.claims import MasterClaim, RefinedClaim
+from ..models.ingestions import Ingestion
+from ..models.job_queue import JobQueueItem
+from .validation import JobTakenOver, fail_validation_job, revalidate_job, run_validation_job
+
+KINDS = ("validate", "revalidate")
+# Serialises claims on PostgreSQL so concurrency caps are counted exactly
+_CLAIM_LOCK_KEY = 0x6A6F6271
+
+
+def tenant_weights() -> Dict[str, float]:
+    weights: Dict[str, float] = {}
+    for part in settings.JOB_TENANT_WEIGHTS.split(","):
+        tenant, sep, weight = part.partition("=")
+        if sep and tenant.strip():
+            weights[tenant.strip()] = max(float(weight), 0.01)
+    return weights
+
+
+def _job_cost(session, tenant_id: str, job_id: str, kind: str) -> int:
+    model = RefinedClaim if kind == "revalidate" else MasterClaim
+    count = session.exec(
+        select(func.count()).select_from(model).where(model.tenant_id == tenant_id, model.job_id == job_id)
+    ).one()
+    return max(int(count or 0), 1)
+
+
+def _virtual_time(session) -> float:
+    # Start tag of the oldest backlog; a tenant with nothing queued joins here instead of
+    # at zero, so idle time does not bank credit
+    start = session.exec(select(func.min(JobQueueItem.virtual_start)).where(JobQueueItem.status == "queued")).one()
+    if start is None:
+        start = session.exec(select(func.max(JobQueueItem.virtual_start)).where(JobQueueItem.status == "running")).one()
+    return float(start or 0.0)
+
+
+def enqueue(
+    session, tenant_id: str, job_id: str, kind: str = "validate", priority: int = 0, cost: int | None = None
+) -> JobQueueItem:
+    """Queue work on ``job_id`` for a worker, in the caller's transaction.
+
+    A request for a job that already has an item waiting reuses it, raising its priority
+    and cancelling any retry delay, so repeated clicks do not run a job twice.
+
+    Items get weighted-fair-queuing tags: a tenant's jobs are laid end to end in virtual
+    time, each taking ``cost / weight`` (cost defaults to the job's claim count). Workers
+    serve the smallest finish tag, so a small job from a quiet tenant overtakes a large
+    backlog from a busy one.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    now = datetime.utcnow()
+    item = session.exec(
+        select(JobQueueItem).where(
+            JobQueueItem.tenant_id == tenant_id,
+            JobQueueItem.job_id == job_id,
+            JobQueueItem.kind == kind,
+            JobQueueItem.status == "queued",
+        )
+    ).first()
+    if item is not None:
+        item.priority = max(item.priority, priority)
+        item.run_after = min(item.run_after, now)
+        item.updated_at = now
+        return item
+    if cost is None:
+        cost = _job_cost(session, tenant_id, job_id, kind)
+    backlog = session.exec(
+        select(func.max(JobQueueItem.virtual_finish)).where(
+            JobQueueItem.tenant_id == tenant_id, JobQueueItem.status.in_(("queued", "running"))
+        )
+    ).one()
+    start = max(_virtual_time(session), float(backlog or 0.0))
+    weight = tenant_weights().get(tenant_id, 1.0)
+    item = JobQueueItem(
+        tenant_id=tenant_id,
+        job_id=job_id,
+        kind=kind,
+        priority=priority,
+        max_attempts=settings.JOB_QUEUE_MAX_ATTEMPTS,
+        cost=cost,
+        virtual_start=start,
+        virtual_finish=start + cost / weight,
+    )
+    session.add(item)
+    return item
+
+
+def claim_next(session, worker_id: str) -> JobQueueItem | None:
+    """Lease the next runnable item to ``worker_id`` and commit the lease.
+
+    The tenant is chosen by fair queuing: among tenants under JOB_TENANT_MAX_CONCURRENT,
+    the one whose next runnable item has the smallest finish tag. Within that tenant,
+    items go by priority, then tag, so priority cannot jump other tenants' work. Nothing is
+    claimed while JOB_MAX_CONCURRENT items are running.
+
+    ``FOR UPDATE SKIP LOCKED`` lets concurrent workers pass over rows another worker is
+    claiming instead of waiting on them. Running items whose lease expired (their worker
+    died) are claimed again.
+    """
+    while True:
+        now = datetime.utcnow()
+        if session.get_bind().dialect.name == "postgresql":
+            session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _CLAIM_LOCK_KEY})
+        running = dict(
+            session.exec(
+                select(JobQueueItem.tenant_id, func.count())
+                .where(JobQueueItem.status == "running", JobQueueItem.locked_until >= now)
+                .group_by(JobQueueItem.tenant_id)
+            ).all()
+        )
+        if settings.JOB_MAX_CONCURRENT and sum(running.values()) >= settings.JOB_MAX_CONCURRENT:
+            session.commit()
+            return None
+        runnable = or_(
+            and_(JobQueueItem.status == "queued", JobQueueItem.run_after <= now),
+            and_(JobQueueItem.status == "running", JobQueueItem.locked_until < now),
+        )
+        eligible = [runnable]
+        if settings.JOB_TENANT_MAX_CONCURRENT:
+            full = [tenant for tenant, count in running.items() if count >= settings.JOB_TENANT_MAX_CONCURRENT]
+            if full:
+                eligible.append(JobQueueItem.tenant_id.not_in(full))
+        tenant_id = session.exec(
+            select(JobQueueItem.tenant_id)
+            .where(*eligible)
+            .order_by(JobQueueItem.virtual_finish.asc(), JobQueueItem.id.asc())
+            .limit(1)
+        ).first()
+        item = None
+        if tenant_id is not None:
+            item = session.exec(
+                select(JobQueueItem)
+                .where(runnable, JobQueueItem.tenant_id == tenant_id)
+                .order_by(JobQueueItem.priority.desc(), JobQueueItem.virtual_finish.asc(), JobQueueItem.id.asc())
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            ).first()
+        if item is None:
+            session.commit()
+            return None
+        if item.status == "running" and item.attempts >= item.max_attempts:
+            # The worker on the last attempt died or hung past its lease
+            _give_up(session, item, item.last_error or "Worker lease expired")
+            session.commit()
+            continue
+        # Compare-and-set on the row version as seen, for databases that ignore row locks (SQLite)
+        claimed = session.execute(
+            update(JobQueueItem)
+            .where(JobQueueItem.id == item.id, JobQueueItem.status == item.status, JobQueueItem.updated_at == item.updated_at)
+            .values(
+                status="running",
+                attempts=JobQueueItem.attempts + 1,
+                locked_by=worker_id,
+                locked_until=now + timedelta(seconds=settings.JOB_QUEUE_VISIBILITY_TIMEOUT_SECONDS),
+                started_at=func.coalesce(JobQueueItem.started_at, now),
+                updated_at=now,
+            )
+        ).rowcount
+        session.commit()
+        if claimed:
+            return item
+
+
+def heartbeat(session, item_id: int, worker_id: str) -> bool:
+    """Extend ``worker_id``'s lease on a running item; False if the lease was lost."""
+    now = datetime.utcnow()
+    result = session.execute(
+        update(JobQueueItem)
+        .where(JobQueueItem.id == item_id, JobQueueItem.locked_by == worker_id, JobQueueItem.status == "running")
+        .values(locked_until=now + timedelta(seconds=settings.JOB_QUEUE_VISIBILITY_TIMEOUT_SECONDS), updated_at=now)
+    )
+    return result.rowcount == 1
+
+
+def complete(session, item_id: int, worker_id: str) -> None:
+    session.execute(
+        update(JobQueueItem)
+        .where(JobQueueItem.id == item_id, JobQueueItem.locked_by == worker_id)
+        .values(status="done", locked_by=None, locked_until=None, updated_at=datetime.utcnow())
+    )
+
+
+def fail(session, item_id: int, worker_id: str, error: str) -> bool:
+    """Record a failed attempt; returns True if the item was queued for a retry."""
+    item = session.get(JobQueueItem, item_id)
+    if item is None or item.locked_by != worker_id or item.status != "running":
+        # Another worker took over after our lease expired; its outcome wins
+        return False
+    now = datetime.utcnow()
+    item.last_error = error
+    item.locked_by = None
+    item.locked_until = None
+    item.updated_at = now
+    if item.attempts >= item.max_attempts:
+        _give_up(session, item, error)
+        return False
+    item.status = "queued"
+    item.run_after = now + timedelta(seconds=settings.JOB_QUEUE_BACKOFF_SECONDS * 2 ** (item.attempts - 1))
+    job = session.exec(select(Ingestion).where(Ingestion.tenant_id == item.tenant_id, Ingestion.job_id == item.job_id)).first()
+    if job:
+        job.error = f"{error} (attempt {item.attempts} of {item.max_attempts}, retrying)"
+    return True
+
+
+def _give_up(session, item: JobQueueItem, error: str) -> None:
+    item.status = "failed"
+    item.last_error = error
+    item.locked_by = None
+    item.locked_until = None
+    item.updated_at = datetime.utcnow()
+    if item.kind == "validate":
+        fail_validation_job(session, item.tenant_id, item.job_id, error)
+        return
+    # A failed revalidation leaves the previous results in place
+    job = session.exec(select(Ingestion).where(Ingestion.tenant_id == item.tenant_id, Ingestion.job_id == item.job_id)).first()
+    if job:
+        job.error = error
+
+
+def queue_stats(session, tenant_id: str | None = None, window_seconds: int = 3600) -> Dict[str, Any]:
+    """Queue depth and wait times per tenant (only, and always, ``tenant_id`` if given).
+
+    Wait is enqueue to first claim: ``oldest_wait_seconds`` for items still queued, and the
+    average / maximum over items first claimed within ``window_seconds``.
+    """
+    now = datetime.utcnow()
+    scope = [JobQueueItem.tenant_id == tenant_id] if tenant_id else []
+    weights = tenant_weights()
+    tenants: Dict[str, Dict[str, Any]] = {}
+
+    def _entry(tenant: str) -> Dict[str, Any]:
+        return tenants.setdefault(
+            tenant,
+            {
+                "queued": 0,
+                "running": 0,
+                "oldest_wait_seconds": None,
+                "dispatched": 0,
+                "avg_wait_seconds": None,
+                "max_wait_seconds": None,
+                "weight": weights.get(tenant, 1.0),
+            },
+        )
+
+    if tenant_id:
+        _entry(tenant_id)
+    depth = session.exec(
+        select(JobQueueItem.tenant_id, JobQueueItem.status, func.count(), func.min(JobQueueItem.created_at))
+        .where(JobQueueItem.status.in_(("queued", "running")), *scope)
+        .group_by(JobQueueItem.tenant_id, JobQueueItem.status)
+    ).all()
+    for tenant, status, count, oldest in depth:
+        entry = _entry(tenant)
+        entry[status] = count
+        if status == "queued" and oldest is not None:
+            entry["oldest_wait_seconds"] = round((now - oldest).total_seconds(), 3)
+
+    waits: Dict[str, list] = {}
+    dispatched = session.exec(
+        select(JobQueueItem.tenant_id, JobQueueItem.created_at, JobQueueItem.started_at).where(
+            JobQueueItem.started_at >= now - timedelta(seconds=window_seconds), *scope
+        )
+    ).all()
+    for tenant, created_at, started_at in dispatched:
+        waits.setdefault(tenant, []).append((started_at - created_at).total_seconds())
+    for tenant, values in waits.items():
+        entry = _entry(tenant)
+        entry["dispatched"] = len(values)
+        entry["avg_wait_seconds"] = round(sum(values) / len(values), 3)
+        entry["max_wait_seconds"] = round(max(values), 3)
+    return tenants
+
+
+def execute(kind: str, tenant_id: str, job_id: str, abort: threading.Event | None = None) -> None:
+    """Run one queue item's work in its own session.
+
+    ``abort`` is set when the item's lease is lost; the work then stops without committing
+    further, since the worker that reclaims the item redoes it.
+    """
+    try:
+        with get_session() as session:
+            if kind == "revalidate":
+                revalidate_job(session, tenant_id, job_id)
+                if abort is not None and abort.is_set():
+                    # Another worker is revalidating too; its metrics adjustment must be the only one
+                    raise JobTakenOver(job_id)
+            else:
+                # The lease outranks whoever ran the job before it expired
+                run_validation_job(session, tenant_id, job_id, lease=True, abort=abort)
+    except JobTakenOver:
+        # Another runner owns the job now and will finish it
+        return
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+from ..core.config import settings
+from .llm_client import BaseLLMClient, ExplainItem
+
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def estimate_tokens(payload: Any) -> int:
+    # Roughly four characters per token; only used to pace requests under the limit
+    return max(1, len(json.dumps(payload, default=str)) // 4)
+
+
+class TokenBucket:
+    """Tokens-per-minute limiter shared by every call, thread and event loop; 0 disables it.
+
+    Callers reserve tokens up front and are told how long to wait for them, so the lock is
+    never held while sleeping and no event loop is tied to the bucket.
+    """
+
+    def __init__(self, tokens_per_minute: int) -> None:
+        self.capacity = float(tokens_per_minute)
+        self.available = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> float:
+        """Take ``tokens`` from the budget; returns the seconds to wait before using them."""
+        if self.capacity <= 0:
+            return 0.0
+        # A request larger than the whole budget waits for a full bucket rather than forever
+        tokens = min(float(tokens), self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+            self.updated = now
+            # The balance may go negative: later callers queue behind earlier reservations
+            self.available -= tokens
+            return max(0.0, -self.available / self.rate)
+
+    async def acquire(self, tokens: int) -> None:
+        delay = self.reserve(tokens)
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class ConcurrencyLimit:
+    """At most ``limit`` holders at once across threads and event loops."""
+
+    def __init__(self, limit: int, poll_seconds: float = 0.01) -> None:
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._poll_seconds = poll_seconds
+
+    async def __aenter__(self) -> None:
+        # Polled rather than blocking, so a waiting request never stalls its event loop
+        while not self._semaphore.acquire(blocking=False):
+            await asyncio.sleep(self._poll_seconds)
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._semaphore.release()
+
+
+class AsyncBatchLLMClient(BaseLLMClient):
+    """Explains claims through an HTTP endpoint, several claims per request.
+
+    The endpoint receives ``{"model", "prompt_version", "items": [{"id", "claim",
+    "matched_rules"}]}`` and answers ``{"results": [{"id", "explanations",
+    "recommendations", "summary_status"}], "usage": {"total_tokens"}}``. Requests run
+    concurrently up to ``max_concurrency``, are paced by a tokens-per-minute budget and
+    are retried with exponential backoff on transport errors, 429 and 5xx responses. Both
+    limits belong to the client, so they hold across calls, jobs and threads sharing it.
+    """
+
+    def __init__(
+        self,
+        url: str | None = None,
+        api_key: str | None = None,
+        batch_size: int | None = None,
+        max_concurrency: int | None = None,
+        tokens_per_minute: int | None = None,
+        max_retries: int | None = None,
+        backoff_seconds: float | None = None,
+        timeout_seconds: float | None = None,
+        claim_fields: List[str] | None = None,
+    ) -> None:
+        self.url = url or settings.LLM_HTTP_URL
+        self.api_key = api_key if api_key is not None else settings.LLM_HTTP_API_KEY
+        self.batch_size = max(1, batch_size or settings.LLM_BATCH_SIZE)
+        self.max_concurrency = max(1, max_concurrency or settings.LLM_MAX_CONCURRENCY)
+        self.tokens_per_minute = settings.LLM_TOKENS_PER_MINUTE if tokens_per_minute is None else tokens_per_minute
+        self.max_retries = settings.LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_seconds = settings.LLM_BACKOFF_SECONDS if backoff_seconds is None else backoff_seconds
+        self.timeout_seconds = timeout_seconds or settings.LLM_TIMEOUT_SECONDS
+        if claim_fields is None:
+            # Only fields that are part of the cache key may reach the prompt
+            claim_fields = [f.strip() for f in settings.LLM_CACHE_CLAIM_FIELDS.split(",") if f.strip()]
+        self.claim_fields = claim_fields
+        self.stats = {"requests": 0, "retries": 0, "tokens": 0}
+        self._concurrency = ConcurrencyLimit(self.max_concurrency)
+        self._bucket = TokenBucket(self.tokens_per_minute)
+
+    def explain(self, claim: Dict[str, Any], matched_rules: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return self.explain_many([(claim, matched_rules)])[0]
+
+    def explain_many(self, items: List[ExplainItem]) -> List[Dict[str, Any]]:
+        if not items:
+            return []
+        # Validation runs in worker threads without an event loop of their own
+        return asyncio.run(self.aexplain_many(items))
+
+    def _item(self, position: int, claim: Dict[str, Any], matched_rules: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "id": position,
+            "claim": {field: claim.get(field) for field in self.claim_fields},
+            "matched_rules": [
+                {key: rule.get(key) for key in ("id", "type", "description", "recommendation")} for rule in matched_rules
+            ],
+        }
+
+    async def aexplain_many(self, items: List[ExplainItem]) -> List[Dict[str, Any]]:
+        payload_items = [self._item(position, claim, matched) for position, (claim, matched) in enumerate(items)]
+        batches = [payload_items[i:i + self.batch_size] for i in range(0, len(payload_items), self.batch_size)]
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        limits = httpx.Limits(max_connections=self.max_concurrency)
+        async with httpx.AsyncClient(timeout=self.timeout_seconds, headers=headers, limits=limits) as client:
+
+            async def _run(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+                async with self._concurrency:
+                    return await self._send(client, batch)
+
+            responses = await asyncio.gather(*(_run(batch) for batch in batches))
+
+        results: List[Dict[str, Any] | None] = [None] * len(items)
+        for batch_results in responses:
+            for result in batch_results:
+                position = result.pop("id")
+                results[position] = result
+        missing = [position for position, result in enumerate(results) if result is None]
+        if missing:
+            raise ValueError(f"LLM response is missing {len(missing)} of {len(items)} items")
+        return results
+
+    async def _send(self, client: httpx.AsyncClient, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        body = {"model": settings.LLM_HTTP_MODEL, "prompt_version": settings.LLM_PROMPT_VERSION, "items": batch}
+        await self._bucket.acquire(estimate_tokens(body))
+        attempt = 0
+        while True:
+            self.stats["requests"] += 1
+            try:
+                response = await client.post(self.url, json=body)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    data = response.json()
+                    self.stats["tokens"] += int((data.get("usage") or {}).get("total_tokens", 0))
+                    return data["results"]
+                retry_after = response.headers.get("Retry-After")
+            except httpx.TransportError:
+                if attempt >= self.max_retries:
+                    raise
+                retry_after = None
+            else:
+                if attempt >= self.max_retries:
+                    response.raise_for_status()
+            attempt += 1
+            self.stats["retries"] += 1
+            delay = self.backoff_seconds * (2 ** (attempt - 1)) * (1 + random.random())
+            if retry_after:
+                try:
+                    delay = max(delay, float(retry_after))
+                except ValueError:
+                    pass
+            await asyncio.sleep(delay)
@@ -1,13 +1,34 @@
+import hashlib
 import json
-from typing import Any, Dict, List
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, ContextManager, Dict, List, Tuple
+
+from sqlalchemy import delete
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import select
 
 from ..core.config import settings
+from ..core.db import get_session
+from ..models.llm_cache import LLMExplanation
+
+
+# (claim, matched rules) pairs passed to explain_many
+ExplainItem = Tuple[Dict[str, Any], List[Dict[str, Any]]]
 
 
 class BaseLLMClient:
     def explain(self, claim: Dict[str, Any], matched_rules: List[Dict[str, Any]]) -> Dict[str, Any]:
         raise NotImplementedError
 
+    def explain_many(self, items: List[ExplainItem]) -> List[Dict[str, Any]]:
+        """Explain several claims at once; results are in ``items`` order.
+
+        Clients that can batch or parallelize provider calls override this.
+        """
+        return [self.explain(claim, matched_rules) for claim, matched_rules in items]
+
 
 class MockLLMClient(BaseLLMClient):
     def explain(self, claim: Dict[str, Any], matched_rules: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -36,10 +57,190 @@ class OpenAILLMClient(BaseLLMClient):
         return MockLLMClient().explain(claim, matched_rules)
 
 
+class CachedLLMClient(BaseLLMClient):
+    """Wraps another client with an in-process LRU backed by the llm_explanations table.
+
+    Keys hash the tenant, the prompt version, the matched rules' ids and text and any
+    configured claim fields, so editing a rule's wording or bumping the prompt version
+    never serves an old explanation. Entries older than the TTL are regenerated, and
+    stored ones are deleted whenever new explanations are written. The database is best
+    effort: if it is unavailable the in-memory cache still works.
+    """
+
+    def __init__(
+        self,
+        inner: BaseLLMClient,
+        session_factory: Callable[[], ContextManager[Any]] | None = None,
+        maxsize: int | None = None,
+        ttl_seconds: int | None = None,
+        prompt_version: str | None = None,
+        claim_fields: List[str] | None = None,
+    ) -> None:
+        self.inner = inner
+        self.session_factory = session_factory
+        self.maxsize = settings.LLM_CACHE_SIZE if maxsize is None else maxsize
+        self.ttl = timedelta(seconds=settings.LLM_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds)
+        self.prompt_version = prompt_version or settings.LLM_PROMPT_VERSION
+        if claim_fields is None:
+            claim_fields = [f.strip() for f in settings.LLM_CACHE_CLAIM_FIELDS.split(",") if f.strip()]
+        self.claim_fields = claim_fields
+        self.stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "db_errors": 0}
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], datetime]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cache_key(self, claim: Dict[str, Any], matched_rules: List[Dict[str, Any]]) -> str:
+        rules = sorted(
+            [str(r.get("id")), str(r.get("type")), str(r.get("description")), str(r.get("recommendation"))] for r in matched_rules
+        )
+        fields = {field: str(claim.get(field)) for field in self.claim_fields}
+        payload = [str(claim.get("tenant_id")), self.prompt_version, rules, fields]
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _fresh(self, created_at: datetime) -> bool:
+        return datetime.utcnow() - created_at < self.ttl
+
+    def _memory_get(self, key: str) -> Dict[str, Any] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if not self._fresh(entry[1]):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def _memory_put(self, key: str, payload: Dict[str, Any], created_at: datetime) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (payload, created_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _db_get_many(self, keys: List[str]) -> Dict[str, Tuple[Dict[str, Any], datetime]]:
+        if self.session_factory is None or not keys:
+            return {}
+        try:
+            with self.session_factory() as session:
+                rows = session.exec(select(LLMExplanation).where(LLMExplanation.cache_key.in_(keys))).all()
+                return {row.cache_key: (json.loads(row.payload_json), row.created_at) for row in rows if self._fresh(row.created_at)}
+        except SQLAlchemyError:
+            self.stats["db_errors"] += 1
+            return {}
+
+    def _db_put_many(self, entries: Dict[str, Dict[str, Any]], created_at: datetime) -> None:
+        if self.session_factory is None or not entries:
+            return
+        try:
+            with self.session_factory() as session:
+                rows = {
+                    row.cache_key: row
+                    for row in session.exec(select(LLMExplanation).where(LLMExplanation.cache_key.in_(list(entries)))).all()
+                }
+                for key, payload in entries.items():
+                    row = rows.get(key)
+                    if row is None:
+                        row = LLMExplanation(cache_key=key, prompt_version=self.prompt_version, payload_json="")
+                        session.add(row)
+                    row.payload_json = json.dumps(payload)
+                    row.created_at = created_at
+                # Expired entries are never served again; drop them so the table stays bounded
+                session.execute(delete(LLMExplanation).where(LLMExplanation.created_at < created_at - self.ttl))
+        except SQLAlchemyError:
+            # Includes losing an insert race to another worker, whose rows are just as good
+            self.stats["db_errors"] += 1
+
+    def explain(self, claim: Dict[str, Any], matched_rules: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return self.explain_many([(claim, matched_rules)])[0]
+
+    def explain_many(self, items: List[ExplainItem]) -> List[Dict[str, Any]]:
+        keys = [self.cache_key(claim, matched_rules) for claim, matched_rules in items]
+        results: List[Dict[str, Any] | None] = [self._memory_get(key) for key in keys]
+        self.stats["memory_hits"] += sum(payload is not None for payload in results)
+        # One query for everything the LRU lacked, then one provider call per distinct key
+        stored = self._db_get_many(list({key for key, payload in zip(keys, results) if payload is None}))
+        for key, entry in stored.items():
+            self._memory_put(key, *entry)
+        pending: Dict[str, List[int]] = {}
+        for position, key in enumerate(keys):
+            if results[position] is not None:
+                continue
+            if key in stored:
+                self.stats["db_hits"] += 1
+                results[position] = stored[key][0]
+            else:
+                pending.setdefault(key, []).append(position)
+        self.stats["misses"] += len(pending)
+        if pending:
+            generated = self.inner.explain_many([items[positions[0]] for positions in pending.values()])
+            created_at = datetime.utcnow()
+            for (key, positions), payload in zip(pending.items(), generated):
+                self._memory_put(key, payload, created_at)
+                for position in positions:
+                    results[position] = payload
+            self._db_put_many(dict(zip(pending, generated)), created_at)
+        return results
+
+    def invalidate(self, older_than: datetime | None = None) -> None:
+        """Drop cached explanations, all of them or those created before ``older_than``."""
+        with self._lock:
+            if older_than is None:
+                self._entries.clear()
+            else:
+                for key in [k for k, (_, created_at) in self._entries.items() if created_at < older_than]:
+                    del self._entries[key]
+        if self.session_factory is None:
+            return
+        stmt = delete(LLMExplanation)
+        if older_than is not None:
+            stmt = stmt.where(LLMExplanation.created_at < older_than)
+        with self.session_factory() as session:
+            session.execute(stmt)
+
+
+_cached_client: CachedLLMClient | None = None
+_cached_client_lock = threading.Lock()
+_remote_clients: Dict[str, BaseLLMClient] = {}
+
+
+def _remote_client(provider: str) -> BaseLLMClient:
+    # One client per provider and process: its rate and concurrency limits span every job.
+    # Callers hold _cached_client_lock.
+    if provider not in _remote_clients:
+        if provider == "http":
+            from .llm_async import AsyncBatchLLMClient
+
+            _remote_clients[provider] = AsyncBatchLLMClient()
+        else:
+            _remote_clients[provider] = OpenAILLMClient()
+    return _remote_clients[provider]
+
+
 def get_llm_client() -> BaseLLMClient:
     provider = (settings.LLM_PROVIDER or "mock").lower()
-    if provider == "openai":
-        return OpenAILLMClient()
+    if provider in ("openai", "http"):
+        global _cached_client
+        with _cached_client_lock:
+            if not settings.LLM_CACHE_ENABLED:
+                return _remote_client(provider)
+            # One cache per process so hits and counters carry across jobs
+            if _cached_client is None:
+                _cached_client = CachedLLMClient(_remote_client(provider), session_factory=get_session)
+            return _cached_client
+    # The mock is local and deterministic; caching it would only add database round trips
     return MockLLMClient()
 
 
+def llm_cache_stats() -> Dict[str, Any]:
+    if _cached_client is None:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        "prompt_version": _cached_client.prompt_version,
+        "entries": len(_cached_client._entries),
+        **_cached_client.stats,
+    }
+
+
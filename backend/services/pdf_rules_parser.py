@@ -1,7 +1,7 @@
 import io
 import json
 import re
-from typing import Any, Dict, List
+from typing import Any, BinaryIO, Dict, List
 
 from pdfminer.high_level import extract_text
 
@@ -200,10 +200,14 @@ def _build_medical_rules_from_text(text: str) -> List[Dict[str, Any]]:
     return rules
 
 
-def parse_rules_pdf(file_bytes: bytes, kind: str | None = None) -> Dict[str, Any]:
+def parse_rules_pdf(source: bytes | BinaryIO, kind: str | None = None) -> Dict[str, Any]:
     # Extract plain text from PDF
-    # pdfminer expects a file-like object or a file path; wrap bytes in BytesIO
-    text = extract_text(io.BytesIO(file_bytes))
+    # pdfminer expects a seekable file-like object or a file path; wrap raw bytes in BytesIO
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    else:
+        source.seek(0)
+    text = extract_text(source)
     data = _extract_json_block(text)
     if not data:
         # Fallback: attempt to parse minimal rule lines (very heuristic)
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from sqlmodel import select
+
+from ..core.config import settings
+from ..models.rules import RuleSet
+from .eval_memo import SignatureMemo
+from .rule_engine import RulePlan, compile_rules
+
+# (tenant_id, technical stamp, medical stamp); a stamp is the (id, version) of every RuleSet of that kind
+CacheKey = Tuple[str, Tuple[Tuple[int, int], ...], Tuple[Tuple[int, int], ...]]
+
+
+class CompiledRules:
+    """A tenant's parsed rules, its facility allow-lists and the compiled plan."""
+
+    def __init__(self, technical_rules: List[Dict[str, Any]], medical_rules: List[Dict[str, Any]]) -> None:
+        self.technical_rules = technical_rules
+        self.medical_rules = medical_rules
+        self.facility_rule_map: Dict[str, List[str]] = {}
+        for rule in medical_rules:
+            cond = rule.get("condition", {})
+            if cond.get("op") == "not_in_facility_map":
+                self.facility_rule_map = cond.get("value", {}) or {}
+                break
+        self.plan: RulePlan = compile_rules(technical_rules, medical_rules)
+        # Lives as long as the cached rule set, so outcomes are reused across the tenant's jobs
+        self.memo = SignatureMemo(self.plan, settings.EVAL_MEMO_SIZE)
+        self.facility_map_digest = _digest(self.facility_rule_map)
+        self.fingerprints = rule_fingerprints(technical_rules, medical_rules, self.facility_rule_map)
+
+
+def _digest(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def rule_fingerprints(
+    technical_rules: List[Dict[str, Any]], medical_rules: List[Dict[str, Any]], facility_rule_map: Dict[str, List[str]]
+) -> Dict[str, Any] | None:
+    """Content hash per rule id, used to diff rule sets for incremental revalidation.
+
+    Returns None when rule ids are not unique, since such rule sets can't be diffed by id.
+    """
+    rules: Dict[str, str] = {}
+    for kind, kind_rules in (("technical", technical_rules), ("medical", medical_rules)):
+        for rule in kind_rules:
+            rule_id = str(rule.get("id"))
+            if rule_id in rules:
+                return None
+            rules[rule_id] = _digest([kind, rule])
+    # Facility types are inferred from the allow-lists, so they affect every facility rule
+    return {"rules": rules, "facility_rule_map": _digest(facility_rule_map)}
+
+
+class RuleCache:
+    """Thread-safe LRU of CompiledRules keyed by tenant and RuleSet version stamps."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[CacheKey, CompiledRules]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: CacheKey) -> CompiledRules | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: CacheKey, entry: CompiledRules) -> None:
+        with self._lock:
+            # Older stamps of the same tenant can never be requested again
+            for stale in [k for k in self._entries if k[0] == key[0] and k != key]:
+                del self._entries[stale]
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, tenant_id: str | None = None) -> None:
+        with self._lock:
+            if tenant_id is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k[0] == tenant_id]:
+                del self._entries[key]
+
+
+rule_cache = RuleCache(settings.RULE_CACHE_SIZE)
+
+
+def _parse_rules(rule_sets: List[RuleSet]) -> List[Dict[str, Any]]:
+    rules: List[Dict[str, Any]] = []
+    for rs in rule_sets:
+        try:
+            payload = json.loads(rs.rules_json)
+            rules.extend(payload.get("rules", []))
+        except Exception:
+            pass
+    return rules
+
+
+def load_compiled_rules(session, tenant_id: str) -> CompiledRules:
+    """Return the tenant's compiled rules, reusing the cached copy while no RuleSet changed.
+
+    Only ids and versions are read to build the key; ``rules_json`` is loaded and parsed on
+    a miss. Because the key comes from the database, a version bump made by any process
+    is seen by every other process on its next lookup.
+    """
+    stamps = session.exec(
+        select(RuleSet.kind, RuleSet.id, RuleSet.version).where(RuleSet.tenant_id == tenant_id).order_by(RuleSet.id)
+    ).all()
+    technical_stamp = tuple((rs_id, version or 0) for kind, rs_id, version in stamps if kind == "technical")
+    medical_stamp = tuple((rs_id, version or 0) for kind, rs_id, version in stamps if kind == "medical")
+    key: CacheKey = (tenant_id, technical_stamp, medical_stamp)
+    cached = rule_cache.get(key)
+    if cached is not None:
+        return cached
+
+    tech = session.exec(
+        select(RuleSet).where(RuleSet.tenant_id == tenant_id, RuleSet.kind == "technical").order_by(RuleSet.id)
+    ).all()
+    med = session.exec(
+        select(RuleSet).where(RuleSet.tenant_id == tenant_id, RuleSet.kind == "medical").order_by(RuleSet.id)
+    ).all()
+    # A concurrent upload between the two reads only costs one extra miss: the key keeps
+    # the older stamp and the next lookup sees the new version
+    compiled = CompiledRules(_parse_rules(tech), _parse_rules(med))
+    rule_cache.put(key, compiled)
+    return compiled
+
+
+def bump_rule_versions(session, tenant_id: str, kind: str | None = None) -> None:
+    """Force every process to reload a tenant's rules, e.g. after editing rule_sets by hand."""
+    stmt = select(RuleSet).where(RuleSet.tenant_id == tenant_id)
+    if kind:
+        stmt = stmt.where(RuleSet.kind == kind)
+    for rs in session.exec(stmt).all():
+        rs.version = (rs.version or 0) + 1
+    rule_cache.invalidate(tenant_id)
@@ -1,6 +1,6 @@
 import json
 import re
-from typing import Any, Dict, List, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Tuple
 
 
 def _op_equals(value: Any, expected: Any) -> bool:
@@ -48,87 +48,223 @@ def _op_contains_conflicting_pairs(diagnosis_codes: str, pairs: List[List[str]])
     return False
 
 
-def evaluate_rules(
-    claim: Dict[str, Any],
-    technical_rules: List[Dict[str, Any]],
-    medical_rules: List[Dict[str, Any]],
-    context: Dict[str, Any] | None = None,
-) -> Tuple[str, str, List[Dict[str, Any]]]:
-    matched: List[Dict[str, Any]] = []
-    tech_hit = False
-    med_hit = False
+FACILITY_FALLBACK = "GENERAL_HOSPITAL"
+
+Check = Callable[[Dict[str, Any], Dict[str, Any]], bool]
+
+
+def _never(claim: Dict[str, Any], context: Dict[str, Any]) -> bool:
+    return False
+
+
+def _compile_simple_op(field: Any, op: Any, value: Any) -> Check | None:
+    """Compile the field ops that may also appear in an ``and`` clause."""
+    if op == "equals":
+        if value is None:
+            return _never
+        expected = str(value).upper()
+
+        def _equals(claim: Dict[str, Any], context: Dict[str, Any]) -> bool:
+            claim_value = claim.get(field)
+            # Case-insensitive string equality to tolerate variations like INPATIENT vs Inpatient
+            return claim_value is not None and str(claim_value).upper() == expected
 
-    context = context or {}
-    facility_type_map: Dict[str, str | None] = context.get("facility_type_map", {})
-    facility_rule_map: Dict[str, List[str]] = context.get("facility_rule_map", {})
+        return _equals
+    if op == "in":
+        options = frozenset(str(v) for v in value)
+        return lambda claim, context: str(claim.get(field)) in options
+    return None
 
-    def _facility_allows_service(facility_id: str | None, fmap: Dict[str, List[str]], service_code: str | None) -> bool:
+
+def _compile_facility_check(fmap: Dict[str, List[str]]) -> Check:
+    allowed_sets = {name: frozenset(str(v) for v in (values or [])) for name, values in fmap.items()}
+    fallback = allowed_sets.get(FACILITY_FALLBACK)
+
+    def _not_in_facility_map(claim: Dict[str, Any], context: Dict[str, Any]) -> bool:
+        service_code = claim.get("service_code")
         if not service_code:
-            return True
-        fid = str(facility_id or "")
-        facility_type = facility_type_map.get(fid)
-        if facility_type and facility_type in fmap:
-            allowed = {str(v) for v in fmap.get(facility_type, [])}
-            return str(service_code) in allowed
-        if fid in fmap:
-            allowed = {str(v) for v in fmap.get(fid, [])}
-            return str(service_code) in allowed
-        # fallback: use GENERAL_HOSPITAL if available
-        if "GENERAL_HOSPITAL" in fmap:
-            allowed = {str(v) for v in fmap.get("GENERAL_HOSPITAL", [])}
-            return str(service_code) in allowed
-        return True
-
-    def _check(rule: Dict[str, Any]) -> bool:
-        cond = rule.get("condition", {})
-        field = cond.get("field")
-        op = cond.get("op")
-        value = cond.get("value")
-        and_cond = cond.get("and")
-
-        claim_value = claim.get(field)
-        rule_id = rule.get("id")
-
-        result = False
-        if op == "equals":
-            result = _op_equals(claim_value, value)
-        elif op == "in":
-            result = _op_in(claim_value, value)
-        elif op == "contains_any":
-            result = _op_contains_any(claim_value, value)
-        elif op == ">":
-            result = _op_numeric_gt(claim_value, value)
-        elif op == "regex_not_match":
-            result = _op_regex_not_match(claim_value, value)
-        elif op == "requires_diagnosis":
-            result = _op_requires_diagnosis(claim.get("service_code"), value, claim.get("diagnosis_codes", ""))
-        elif op == "not_in_facility_map":
-            allows = _facility_allows_service(claim.get("facility_id"), value, claim.get("service_code"))
-            result = not allows
-        elif op == "contains_conflicting_pairs":
-            result = _op_contains_conflicting_pairs(claim.get("diagnosis_codes", ""), value)
-
-        if and_cond:
-            and_field = and_cond.get("field")
-            and_op = and_cond.get("op")
-            and_value = and_cond.get("value")
-            and_claim_value = claim.get(and_field)
-            if and_op == "equals":
-                result = result and _op_equals(and_claim_value, and_value)
-            elif and_op == "in":
-                result = result and _op_in(and_claim_value, and_value)
-
-        return result
-
-    for r in technical_rules:
-        if _check(r):
-            tech_hit = True
-            matched.append({"id": r.get("id"), "type": "technical", "description": r.get("description"), "recommendation": r.get("recommendation")})
-    for r in medical_rules:
-        if _check(r):
-            med_hit = True
-            matched.append({"id": r.get("id"), "type": "medical", "description": r.get("description"), "recommendation": r.get("recommendation")})
+            return False
+        fid = str(claim.get("facility_id") or "")
+        facility_type = context.get("facility_type_map", {}).get(fid)
+        if facility_type and facility_type in allowed_sets:
+            allowed = allowed_sets[facility_type]
+        elif fid in allowed_sets:
+            allowed = allowed_sets[fid]
+        elif fallback is not None:
+            allowed = fallback
+        else:
+            return False
+        return str(service_code) not in allowed
+
+    return _not_in_facility_map
+
+
+def _compile_condition(cond: Dict[str, Any]) -> Check:
+    field = cond.get("field")
+    op = cond.get("op")
+    value = cond.get("value")
+
+    check = _compile_simple_op(field, op, value)
+    if check is not None:
+        return check
+    if op == "contains_any":
+        options = frozenset(str(v) for v in value)
+
+        def _contains_any(claim: Dict[str, Any], context: Dict[str, Any]) -> bool:
+            return any(p.strip() in options for p in str(claim.get(field)).split("`") if p.strip())
+
+        return _contains_any
+    if op == ">":
+        try:
+            threshold = float(value)
+        except Exception:
+            return _never
+
+        def _numeric_gt(claim: Dict[str, Any], context: Dict[str, Any]) -> bool:
+            try:
+                return float(claim.get(field)) > threshold
+            except Exception:
+                return False
+
+        return _numeric_gt
+    if op == "regex_not_match":
+        pattern = re.compile(value)
+        return lambda claim, context: pattern.match(str(claim.get(field))) is None
+    if op == "requires_diagnosis":
+        mapping = value
+        return lambda claim, context: _op_requires_diagnosis(claim.get("service_code"), mapping, claim.get("diagnosis_codes", ""))
+    if op == "not_in_facility_map":
+        return _compile_facility_check(value)
+    if op == "contains_conflicting_pairs":
+        pairs = tuple((a, b) for a, b in value)
+
+        def _conflicting(claim: Dict[str, Any], context: Dict[str, Any]) -> bool:
+            parts = {p.strip() for p in str(claim.get("diagnosis_codes", "")).split("`") if p.strip()}
+            return any(a in parts and b in parts for a, b in pairs)
+
+        return _conflicting
+    return _never
 
+
+def _compile_rule(rule: Dict[str, Any]) -> Check:
+    cond = rule.get("condition", {})
+    check = _compile_condition(cond)
+    and_cond = cond.get("and")
+    if not and_cond:
+        return check
+    and_check = _compile_simple_op(and_cond.get("field"), and_cond.get("op"), and_cond.get("value"))
+    if and_check is None:
+        # Unsupported ops in an "and" clause leave the primary result untouched
+        return check
+    return lambda claim, context: check(claim, context) and and_check(claim, context)
+
+
+# Index lookups are keyed by (field, default) exactly as the predicates read the claim
+IndexKey = Tuple[Any, Any]
+
+
+def _index_keys(cond: Dict[str, Any]) -> Tuple[str, IndexKey, List[str]] | None:
+    """Codes that a claim must carry for ``cond`` to fire, or None if it can't be indexed.
+
+    Returns ``("value", key, codes)`` when the whole ``str(claim.get(...))`` value must be
+    one of ``codes`` and ``("part", key, codes)`` when one backtick-separated part must be.
+    """
+    field = cond.get("field")
+    op = cond.get("op")
+    value = cond.get("value")
+    if op == "in" and field == "service_code":
+        return "value", (field, None), [str(v) for v in value]
+    if op == "requires_diagnosis" and isinstance(value, dict):
+        return "value", ("service_code", None), [k for k, needed in value.items() if needed and isinstance(k, str)]
+    if op == "contains_any" and field == "diagnosis_codes":
+        return "part", (field, None), [str(v) for v in value]
+    if op == "contains_conflicting_pairs":
+        # Both codes of a pair must be present, so the first one is enough to index on
+        return "part", ("diagnosis_codes", ""), [a for a, _ in value]
+    return None
+
+
+class RulePlan:
+    """Technical and medical rules compiled into bound predicates.
+
+    Option lists become frozensets, regexes are compiled and facility allow-lists are
+    resolved up front, so a plan is built once per job and reused for every claim.
+    Rules that can only fire for specific service or ICD codes are also indexed by those
+    codes, so each claim only runs its candidate rules plus the ones that can't be indexed.
+    """
+
+    def __init__(self, technical_rules: List[Dict[str, Any]], medical_rules: List[Dict[str, Any]]) -> None:
+        self.technical_rules = technical_rules
+        self.medical_rules = medical_rules
+        # (kind, raw rule, matched entry, predicate) in evaluation order
+        self.rules: List[Tuple[str, Dict[str, Any], Dict[str, Any], Check]] = []
+        for kind, rules in (("technical", technical_rules), ("medical", medical_rules)):
+            for r in rules:
+                entry = {"id": r.get("id"), "type": kind, "description": r.get("description"), "recommendation": r.get("recommendation")}
+                self.rules.append((kind, r, entry, _compile_rule(r)))
+
+        self._unindexed: List[int] = []
+        self._value_index: Dict[IndexKey, Dict[str, List[int]]] = {}
+        self._part_index: Dict[IndexKey, Dict[str, List[int]]] = {}
+        for position, (_, r, _, _) in enumerate(self.rules):
+            keys = _index_keys(r.get("condition", {}))
+            if keys is None:
+                self._unindexed.append(position)
+                continue
+            kind, key, codes = keys
+            index = (self._value_index if kind == "value" else self._part_index).setdefault(key, {})
+            for code in set(codes):
+                index.setdefault(code, []).append(position)
+
+    @property
+    def index_keys(self) -> Tuple[List[IndexKey], List[IndexKey]]:
+        """``(field, default)`` keys read by the value index and by the part index."""
+        return list(self._value_index), list(self._part_index)
+
+    def candidates(self, claim: Dict[str, Any]) -> List[int]:
+        """Positions in ``self.rules`` that could fire for ``claim``, in evaluation order."""
+        positions = set(self._unindexed)
+        for (field, default), index in self._value_index.items():
+            positions.update(index.get(str(claim.get(field, default)), ()))
+        for (field, default), index in self._part_index.items():
+            for part in str(claim.get(field, default)).split("`"):
+                part = part.strip()
+                if part:
+                    positions.update(index.get(part, ()))
+        return sorted(positions)
+
+    def candidates_among(self, values: Dict[IndexKey, Iterable[str]], parts: Dict[IndexKey, Iterable[str]]) -> List[int]:
+        """Positions that could fire for any claim of a batch, given its distinct values and parts."""
+        positions = set(self._unindexed)
+        for key, index in self._value_index.items():
+            for value in values.get(key, ()):
+                positions.update(index.get(value, ()))
+        for key, index in self._part_index.items():
+            for part in parts.get(key, ()):
+                positions.update(index.get(part, ()))
+        return sorted(positions)
+
+    def evaluate(self, claim: Dict[str, Any], context: Dict[str, Any] | None = None) -> Tuple[str, str, List[Dict[str, Any]]]:
+        context = context or {}
+        matched: List[Dict[str, Any]] = []
+        tech_hit = False
+        med_hit = False
+        for position in self.candidates(claim):
+            kind, _, entry, check = self.rules[position]
+            if check(claim, context):
+                if kind == "technical":
+                    tech_hit = True
+                else:
+                    med_hit = True
+                matched.append(dict(entry))
+        return _classify(tech_hit, med_hit, matched)
+
+
+def compile_rules(technical_rules: List[Dict[str, Any]], medical_rules: List[Dict[str, Any]]) -> RulePlan:
+    return RulePlan(technical_rules, medical_rules)
+
+
+def _classify(tech_hit: bool, med_hit: bool, matched: List[Dict[str, Any]]) -> Tuple[str, str, List[Dict[str, Any]]]:
     if tech_hit and med_hit:
         error_type = "both"
     elif tech_hit:
@@ -142,3 +278,14 @@ def evaluate_rules(
     return status, error_type, matched
 
 
+def evaluate_rules(
+    claim: Dict[str, Any],
+    technical_rules: List[Dict[str, Any]],
+    medical_rules: List[Dict[str, Any]],
+    context: Dict[str, Any] | None = None,
+    plan: RulePlan | None = None,
+) -> Tuple[str, str, List[Dict[str, Any]]]:
+    """Evaluate one claim. Pass a ``plan`` from ``compile_rules`` to avoid recompiling per claim."""
+    if plan is None:
+        plan = compile_rules(technical_rules, medical_rules)
+    return plan.evaluate(claim, context)
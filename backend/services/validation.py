@@ -1,15 +1,37 @@
 import json
-from typing import Dict, List, Any
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List
 
-from sqlmodel import select
+import numpy as np
+from sqlalchemy import delete, func, or_, update
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import Session, select
 
+from ..core.config import settings
+from ..core.db import bulk_insert
 from ..models.claims import MasterClaim, RefinedClaim
-from ..models.rules import RuleSet
 from ..models.ingestions import Ingestion
 from ..models.metrics import Metrics
-from .rule_engine import evaluate_rules
+from .eval_memo import Outcome
+from .facility_registry import sync_facility_types
+from .rule_cache import CompiledRules, load_compiled_rules
+from .rule_engine import RulePlan, _classify, compile_rules, evaluate_rules
+from .vectorized_rules import claims_frame, evaluate_frame
 from .llm_client import get_llm_client
 
+logger = logging.getLogger(__name__)
+
+
+class JobTakenOver(RuntimeError):
+    """Raised in a runner whose job was taken over, or whose queue lease was lost; it must stop writing."""
+
 
 def _format_from_llm(llm_payload: Dict[str, Any], matched: List[Dict[str, Any]]) -> tuple[str, str]:
     explanation_text = ""
@@ -41,111 +63,694 @@ def _format_plain_text(matched: List[Dict[str, Any]]) -> tuple[str, str]:
     return explanation_text, recommendation_text
 
 
-def run_validation_job(session, tenant_id: str, job_id: str) -> None:
-    ingestion = session.exec(
-        select(Ingestion).where(Ingestion.tenant_id == tenant_id, Ingestion.job_id == job_id)
-    ).first()
-    if not ingestion:
+def _explain_many(llm, items: List[tuple[Dict[str, Any], List[Dict[str, Any]]]]) -> List[tuple[str, str]]:
+    # One call per batch so batching clients can pack and parallelize provider requests
+    try:
+        llm_outs = llm.explain_many(items) if items else []
+    except Exception:  # pragma: no cover
+        llm_outs = [{}] * len(items)
+    texts = []
+    for (_, matched), llm_out in zip(items, llm_outs):
+        if llm_out:
+            texts.append(_format_from_llm(llm_out, matched))
+        else:
+            texts.append(_format_plain_text(matched))
+    return texts
+
+
+def _explanation_texts(llm, items: List[tuple[Dict[str, Any], List[Dict[str, Any]]]]) -> List[tuple[str | None, str | None]]:
+    if not settings.LLM_DEFER_EXPLANATIONS:
+        return _explain_many(llm, items)
+    # Claims without hits always read the same; flagged ones wait until someone opens them
+    return [_format_plain_text(matched) if not matched else (None, None) for _, matched in items]
+
+
+def fill_explanations(session, tenant_id: str, rows: List[RefinedClaim]) -> None:
+    """Generate and store the explanations deferred validation left empty in ``rows``."""
+    pending = [rc for rc in rows if rc.error_explanation is None and rc.matched_rule_ids is not None]
+    if not pending:
         return
-    ingestion.status = "running"
+    entries = {str(entry.get("id")): entry for _, _, entry, _ in load_compiled_rules(session, tenant_id).plan.rules}
+    master_ids = [rc.master_claim_id for rc in pending if rc.master_claim_id is not None]
+    masters = {mc.id: mc for mc in session.exec(select(MasterClaim).where(MasterClaim.id.in_(master_ids))).all()} if master_ids else {}
+    items = []
+    for rc in pending:
+        # Rules removed since validation are still named by id
+        matched = [
+            dict(entries.get(rule_id, {"id": rule_id, "description": "Rule no longer defined"})) for rule_id in json.loads(rc.matched_rule_ids)
+        ]
+        items.append(((masters.get(rc.master_claim_id) or rc).dict(), matched))
+    texts = _explain_many(get_llm_client(), items)
+    session.execute(
+        update(RefinedClaim),
+        [{"id": rc.id, "error_explanation": explanation, "recommended_action": recommendation} for rc, (explanation, recommendation) in zip(pending, texts)],
+    )
+    for rc, (explanation, recommendation) in zip(pending, texts):
+        set_committed_value(rc, "error_explanation", explanation)
+        set_committed_value(rc, "recommended_action", recommendation)
 
-    # Load rules
-    tech = session.exec(
-        select(RuleSet).where(RuleSet.tenant_id == tenant_id, RuleSet.kind == "technical")
-    ).all()
-    med = session.exec(
-        select(RuleSet).where(RuleSet.tenant_id == tenant_id, RuleSet.kind == "medical")
-    ).all()
-    technical_rules: List[Dict] = []
-    medical_rules: List[Dict] = []
-    for rs in tech:
-        try:
-            payload = json.loads(rs.rules_json)
-            technical_rules.extend(payload.get("rules", []))
-        except Exception:
-            pass
-    for rs in med:
-        try:
-            payload = json.loads(rs.rules_json)
-            medical_rules.extend(payload.get("rules", []))
-        except Exception:
-            pass
 
-    facility_rule_map: Dict[str, List[str]] = {}
-    for rule in medical_rules:
-        cond = rule.get("condition", {})
-        if cond.get("op") == "not_in_facility_map":
-            facility_rule_map = cond.get("value", {}) or {}
-            break
+def _matched_ids(matched: List[Dict[str, Any]]) -> str:
+    return json.dumps([str(rule.get("id")) for rule in matched])
 
-    llm = get_llm_client()
 
-    # Evaluate all master claims for tenant (prototype scope)
-    claims = session.exec(select(MasterClaim).where(MasterClaim.tenant_id == tenant_id, MasterClaim.job_id == job_id)).all()
+def _evaluate_claims(
+    claim_dicts: List[Dict[str, Any]], plan: RulePlan, context: Dict[str, Any]
+) -> List[tuple[str, str, List[Dict[str, Any]]]]:
+    # Whole-job masks by default; the row engine stays available as a reference path
+    if settings.VALIDATION_ENGINE == "vectorized" and claim_dicts:
+        return evaluate_frame(claims_frame(claim_dicts), plan, context)
+    return [evaluate_rules(claim, plan.technical_rules, plan.medical_rules, context, plan=plan) for claim in claim_dicts]
+
 
+def _build_rule_context(session, tenant_id: str, job_id: str, rules: CompiledRules, carried: List[Any]) -> Dict[str, Any]:
+    # Services billed in this job are added to the tenant's facility registry before types are
+    # looked up; the context is built once for the whole job even when claims run in shards
+    used = session.exec(
+        select(MasterClaim.facility_id, MasterClaim.service_code)
+        .where(MasterClaim.tenant_id == tenant_id, MasterClaim.job_id == job_id)
+        .distinct()
+    ).all()
     facility_usage: Dict[str, set[str]] = {}
-    for mc in claims:
+    for mc in list(used) + list(carried):
         fid = str(mc.facility_id or "")
         svc = str(mc.service_code or "")
         facility_usage.setdefault(fid, set()).add(svc)
 
-    def _infer_facility_type(fid: str) -> str | None:
-        services = facility_usage.get(fid, set())
-        candidate = None
-        candidate_size = None
-        for name, values in facility_rule_map.items():
-            allowed_set = {str(v) for v in values}
-            if services and all(s in allowed_set for s in services):
-                size = len(allowed_set)
-                if candidate is None or size < candidate_size:
-                    candidate = name
-                    candidate_size = size
-        if candidate:
-            return candidate
-        if fid in facility_rule_map:
-            return fid
-        if "GENERAL_HOSPITAL" in facility_rule_map:
-            return "GENERAL_HOSPITAL"
-        return None
+    facility_type_map = sync_facility_types(session, tenant_id, facility_usage, rules.facility_rule_map, rules.facility_map_digest)
+    return {"facility_type_map": facility_type_map, "facility_rule_map": rules.facility_rule_map}
 
-    facility_type_map = {fid: _infer_facility_type(fid) for fid in facility_usage.keys()}
 
+def _empty_metrics() -> tuple[Dict[str, int], Dict[str, float]]:
     counts = {"no_error": 0, "medical_error": 0, "technical_error": 0, "both": 0}
     paid_by_type = {"no_error": 0.0, "medical_error": 0.0, "technical_error": 0.0, "both": 0.0}
-    rule_context = {"facility_type_map": facility_type_map, "facility_rule_map": facility_rule_map}
+    return counts, paid_by_type
 
-    for idx, mc in enumerate(claims, start=1):
-        claim_dict = mc.dict()
-        status, error_type, matched = evaluate_rules(claim_dict, technical_rules, medical_rules, rule_context)
-        explanation_text, recommendation_text = _format_plain_text(matched)
-        try:
-            llm_out = llm.explain(claim_dict, matched)
-        except Exception:  # pragma: no cover
-            llm_out = {}
-        if llm_out:
-            explanation_text, recommendation_text = _format_from_llm(llm_out, matched)
-
-        rc = RefinedClaim(
-            tenant_id=tenant_id,
-            job_id=job_id,
-            claim_id=mc.claim_id,
-            status=status,
-            error_type=error_type,
-            error_explanation=explanation_text,
-            recommended_action=recommendation_text,
-            encounter_type=mc.encounter_type,
-            service_date=mc.service_date,
-            service_code=mc.service_code,
-            paid_amount_aed=mc.paid_amount_aed,
-            facility_id=mc.facility_id,
-            diagnosis_codes=mc.diagnosis_codes,
-            approval_number=mc.approval_number,
-        )
-        session.add(rc)
+
+def _memoized_outcomes(
+    claim_dicts: List[Dict[str, Any]], rules: CompiledRules, rule_context: Dict[str, Any], llm
+) -> tuple[np.ndarray, List[Outcome]]:
+    """Outcome per distinct rule signature of ``claim_dicts`` plus each claim's signature code.
+
+    Signatures already in the rule set's memo are reused; the rest are evaluated once each,
+    explained once each (unless explanations are deferred) and added to the memo. Claim
+    fields the LLM client puts in its prompt are part of the signature when explaining.
+    """
+    memo = rules.memo
+    text_fields = [] if settings.LLM_DEFER_EXPLANATIONS else list(getattr(llm, "claim_fields", None) or [])
+    codes, keys, first_rows = memo.signatures(claims_frame(claim_dicts), rule_context, text_fields)
+    outcomes: List[Outcome | None] = [memo.get(key) for key in keys]
+    # Outcomes memoized while explanations were deferred lack the text an eager run needs
+    missing = [
+        position
+        for position, outcome in enumerate(outcomes)
+        if outcome is None or (outcome[3] is None and not settings.LLM_DEFER_EXPLANATIONS)
+    ]
+    if missing:
+        representatives = [claim_dicts[first_rows[position]] for position in missing]
+        evaluated = _evaluate_claims(representatives, rules.plan, rule_context)
+        texts = _explanation_texts(llm, [(claim_dict, matched) for claim_dict, (_, _, matched) in zip(representatives, evaluated)])
+        for position, (status, error_type, matched), (explanation_text, recommendation_text) in zip(missing, evaluated, texts):
+            outcomes[position] = (status, error_type, matched, explanation_text, recommendation_text)
+            memo.put(keys[position], outcomes[position])
+    return codes, outcomes
+
+
+def _validate_claims(
+    session,
+    tenant_id: str,
+    job_id: str,
+    claims: List[MasterClaim],
+    rules: CompiledRules,
+    rule_context: Dict[str, Any],
+    counts: Dict[str, int],
+    paid_by_type: Dict[str, float],
+) -> None:
+    """Evaluate ``claims``, bulk insert their RefinedClaim rows and add them to the metrics."""
+    if not claims:
+        return
+    llm = get_llm_client()
+    codes, outcomes = _memoized_outcomes([mc.dict() for mc in claims], rules, rule_context, llm)
+    matched_ids = [_matched_ids(outcome[2]) for outcome in outcomes]
+
+    pending: List[Dict[str, Any]] = []
+    for mc, code in zip(claims, codes.tolist()):
+        status, error_type, _, explanation_text, recommendation_text = outcomes[code]
+        pending.append({
+            "tenant_id": tenant_id,
+            "job_id": job_id,
+            "claim_id": mc.claim_id,
+            "status": status,
+            "error_type": error_type,
+            "error_explanation": explanation_text,
+            "recommended_action": recommendation_text,
+            "encounter_type": mc.encounter_type,
+            "service_date": mc.service_date,
+            "service_code": mc.service_code,
+            "paid_amount_aed": mc.paid_amount_aed,
+            "facility_id": mc.facility_id,
+            "diagnosis_codes": mc.diagnosis_codes,
+            "approval_number": mc.approval_number,
+            "master_claim_id": mc.id,
+            "matched_rule_ids": matched_ids[code],
+        })
+        if len(pending) >= settings.BULK_INSERT_BATCH_SIZE:
+            bulk_insert(session, RefinedClaim, pending)
+            pending = []
 
         counts[error_type] = counts.get(error_type, 0) + 1
         paid_by_type[error_type] = paid_by_type.get(error_type, 0.0) + float(mc.paid_amount_aed or 0.0)
 
+    if pending:
+        bulk_insert(session, RefinedClaim, pending)
+
+
+def _iter_claim_batches(
+    session, tenant_id: str, job_id: str, batch_size: int, first_id: int | None = None, last_id: int | None = None
+) -> Iterator[List[MasterClaim]]:
+    """Yield the job's master claims in id order, ``batch_size`` at a time, without loading them all.
+
+    ``first_id`` and ``last_id`` optionally bound the ids (inclusive). The caller may commit
+    ``session`` between batches.
+    """
+    stmt = select(MasterClaim).where(MasterClaim.tenant_id == tenant_id, MasterClaim.job_id == job_id).order_by(MasterClaim.id)
+    if first_id is not None:
+        stmt = stmt.where(MasterClaim.id >= first_id)
+    if last_id is not None:
+        stmt = stmt.where(MasterClaim.id <= last_id)
+    bind = session.get_bind()
+    if bind.dialect.supports_server_side_cursors:
+        # A server-side cursor on its own connection outlives the caller's batch commits
+        with Session(bind) as reader:
+            for batch in reader.exec(stmt.execution_options(yield_per=batch_size)).partitions():
+                yield batch
+                reader.expunge_all()
+        return
+    # Without server-side cursors (SQLite) an open read would block those commits; page by id
+    after = 0
+    while True:
+        batch = session.exec(stmt.where(MasterClaim.id > after).limit(batch_size)).all()
+        if not batch:
+            return
+        after = batch[-1].id
+        yield batch
+        for mc in batch:
+            session.expunge(mc)
+
+
+def _validate_stream(
+    session,
+    tenant_id: str,
+    job_id: str,
+    rules: CompiledRules,
+    rule_context: Dict[str, Any],
+    counts: Dict[str, int],
+    paid_by_type: Dict[str, float],
+    first_id: int | None = None,
+    last_id: int | None = None,
+    ingestion_id: int | None = None,
+    checkpoint: bool = False,
+    runner_id: str | None = None,
+    abort: threading.Event | None = None,
+) -> int:
+    """Validate the job's claims batch by batch, committing after each; returns the claim count.
+
+    With ``ingestion_id`` each commit also advances the job's processed counter and, when
+    ``checkpoint`` is set, its checkpoint, so progress is saved atomically with the results.
+    With ``runner_id`` a batch is only committed while that runner still owns the job;
+    otherwise JobTakenOver is raised with the batch uncommitted. The same happens once
+    ``abort`` is set, checked before each batch.
+    """
+    rows = 0
+    for claims in _iter_claim_batches(session, tenant_id, job_id, settings.VALIDATION_BATCH_SIZE, first_id, last_id):
+        if abort is not None and abort.is_set():
+            raise JobTakenOver(job_id)
+        _validate_claims(session, tenant_id, job_id, claims, rules, rule_context, counts, paid_by_type)
+        if ingestion_id is not None:
+            values: Dict[str, Any] = {"processed_claims": func.coalesce(Ingestion.processed_claims, 0) + len(claims)}
+            if checkpoint:
+                values["checkpoint_claim_id"] = claims[-1].id
+            owned = [Ingestion.runner_id == runner_id] if runner_id else []
+            if runner_id:
+                values["heartbeat_at"] = datetime.utcnow()
+            # An increment rather than an assignment, since shards report concurrently
+            if not session.execute(update(Ingestion).where(Ingestion.id == ingestion_id, *owned).values(**values)).rowcount:
+                raise JobTakenOver(job_id)
+        session.commit()
+        rows += len(claims)
+    return rows
+
+
+def _stored_metrics(session, tenant_id: str, job_id: str) -> tuple[Dict[str, int], Dict[str, float]]:
+    counts, paid_by_type = _empty_metrics()
+    totals = session.exec(
+        select(RefinedClaim.error_type, func.count(), func.sum(RefinedClaim.paid_amount_aed))
+        .where(RefinedClaim.tenant_id == tenant_id, RefinedClaim.job_id == job_id)
+        .group_by(RefinedClaim.error_type)
+    ).all()
+    for error_type, count, paid in totals:
+        counts[error_type] = count
+        paid_by_type[error_type] = float(paid or 0.0)
+    return counts, paid_by_type
+
+
+def _delete_job_results(session, tenant_id: str, job_id: str) -> None:
+    session.execute(
+        delete(RefinedClaim).where(
+            RefinedClaim.tenant_id == tenant_id, RefinedClaim.job_id == job_id, RefinedClaim.carried_forward == False  # noqa: E712
+        )
+    )
+
+
+def _shard_bounds(session, tenant_id: str, job_id: str, total: int, shards: int) -> List[tuple[int, int | None]]:
+    """Inclusive id ranges holding roughly equal numbers of the job's ``total`` claims.
+
+    Only each shard's first id is read, one OFFSET query apiece, so the job's ids are never
+    loaded; the last range is open-ended.
+    """
+    size = -(-total // shards)
+    ids = select(MasterClaim.id).where(MasterClaim.tenant_id == tenant_id, MasterClaim.job_id == job_id).order_by(MasterClaim.id)
+    starts = [session.exec(ids.offset(offset).limit(1)).one() for offset in range(0, total, size)]
+    if not starts:
+        return []
+    return [(first, following - 1) for first, following in zip(starts, starts[1:])] + [(starts[-1], None)]
+
+
+def _validate_shard(
+    tenant_id: str,
+    job_id: str,
+    ingestion_id: int,
+    first_id: int,
+    last_id: int | None,
+    technical_rules: List[Dict],
+    medical_rules: List[Dict],
+    rule_context: Dict[str, Any],
+    runner_id: str | None = None,
+) -> tuple[int, Dict[str, int], Dict[str, float]]:
+    """Process pool entry point: validate one id range of a job in its own session."""
+    from ..core.db import get_session
+
+    counts, paid_by_type = _empty_metrics()
+    with get_session() as session:
+        rules = CompiledRules(technical_rules, medical_rules)
+        rows = _validate_stream(
+            session, tenant_id, job_id, rules, rule_context, counts, paid_by_type, first_id, last_id, ingestion_id=ingestion_id, runner_id=runner_id
+        )
+    return rows, counts, paid_by_type
+
+
+def _validate_sharded(
+    session,
+    tenant_id: str,
+    job_id: str,
+    ingestion_id: int,
+    bounds: List[tuple[int, int | None]],
+    workers: int,
+    technical_rules: List[Dict],
+    medical_rules: List[Dict],
+    rule_context: Dict[str, Any],
+    counts: Dict[str, int],
+    paid_by_type: Dict[str, float],
+    runner_id: str | None = None,
+) -> int:
+    # Shards commit on their own connections; publish the running status first and keep
+    # this session's transaction from holding locks while they write
+    session.commit()
+    rows = 0
+    try:
+        # Spawned, not forked: the API process is multi-threaded, and a forked child could
+        # inherit a lock another thread held at the time
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [
+                pool.submit(
+                    _validate_shard, tenant_id, job_id, ingestion_id, first_id, last_id, technical_rules, medical_rules, rule_context, runner_id
+                )
+                for first_id, last_id in bounds
+            ]
+            for future in futures:
+                shard_rows, shard_counts, shard_paid = future.result()
+                rows += shard_rows
+                for key, value in shard_counts.items():
+                    counts[key] = counts.get(key, 0) + value
+                for key, value in shard_paid.items():
+                    paid_by_type[key] = paid_by_type.get(key, 0.0) + value
+    except JobTakenOver:
+        # The committed batches are the new runner's to keep
+        session.rollback()
+        raise
+    except Exception:
+        # Drop whatever the finished shards committed so a rerun starts clean
+        session.rollback()
+        _delete_job_results(session, tenant_id, job_id)
+        session.commit()
+        raise
+    return rows
+
+
+def _iter_result_pairs(
+    session, tenant_id: str, job_id: str, batch_size: int, carried_only: bool = False
+) -> Iterator[List[tuple[RefinedClaim, MasterClaim | None]]]:
+    """Yield the job's stored results with their master claims in id order, ``batch_size`` at a time."""
+    # Carried rows point at the base job's MasterClaim, so join on master_claim_id rather than job
+    stmt = (
+        select(RefinedClaim, MasterClaim)
+        .join(MasterClaim, MasterClaim.id == RefinedClaim.master_claim_id, isouter=True)
+        .where(RefinedClaim.tenant_id == tenant_id, RefinedClaim.job_id == job_id)
+        .order_by(RefinedClaim.id)
+    )
+    if carried_only:
+        stmt = stmt.where(RefinedClaim.carried_forward == True)  # noqa: E712
+    # Keyset pages by id, like _iter_claim_batches; rows are updated in place, so ids stay put
+    after = 0
+    while True:
+        batch = session.exec(stmt.where(RefinedClaim.id > after).limit(batch_size)).all()
+        if not batch:
+            return
+        after = batch[-1][0].id
+        yield batch
+        for rc, mc in batch:
+            session.expunge(rc)
+            if mc is not None and mc in session:
+                session.expunge(mc)
+
+
+def _facility_rule_ids(rules: CompiledRules) -> set[str]:
+    return {str(rule.get("id")) for _, rule, _, _ in rules.plan.rules if rule.get("condition", {}).get("op") == "not_in_facility_map"}
+
+
+def _moved_facilities(stored_types: str | None, rule_context: Dict[str, Any]) -> set[str] | None:
+    """Facilities whose inferred type differs from the types results were stored with; None if unknown."""
+    if stored_types is None:
+        return None
+    before = json.loads(stored_types)
+    return {fid for fid, facility_type in rule_context["facility_type_map"].items() if fid in before and before[fid] != facility_type}
+
+
+def _changed_rule_ids(previous: Dict[str, Any] | None, rules: CompiledRules) -> set[str] | None:
+    """Rule ids whose results may differ from ``previous`` fingerprints; None means all of them."""
+    current = rules.fingerprints
+    if previous is None or current is None:
+        return None
+    before, after = previous.get("rules", {}), current["rules"]
+    changed = {rule_id for rule_id in set(before) | set(after) if before.get(rule_id) != after.get(rule_id)}
+    if previous.get("facility_rule_map") != current["facility_rule_map"]:
+        changed.update(_facility_rule_ids(rules))
+    return changed
+
+
+def _revalidate_rows(
+    session,
+    pairs: List[tuple[RefinedClaim, MasterClaim | None]],
+    changed: set[str] | None,
+    rules: CompiledRules,
+    rule_context: Dict[str, Any],
+    moved: set[str] | None = frozenset(),
+) -> List[tuple[str, str, float]]:
+    """Bring stored results in line with ``rules`` by evaluating only the rules that changed.
+
+    ``changed`` holds the rule ids whose content changed (None: unknown, so every rule runs).
+    Rows at facilities in ``moved`` (None: every facility) also re-run the facility rules,
+    because the facility's inferred type changed since the results were stored.
+
+    Rows with stored rule hits keep the hits of the rules not re-run; rows without them
+    (validated before hits were recorded) are evaluated in full. Rows whose hits changed, or
+    that hit a rule whose content changed (its description or recommendation may differ),
+    are rewritten in place with fresh explanations. Returns
+    ``(old error_type, new error_type, paid)`` per rewritten row.
+    """
+    positions = {str(entry.get("id")): (position, kind, entry) for position, (kind, _, entry, _) in enumerate(rules.plan.rules)}
+    facility_ids = _facility_rule_ids(rules)
+    full: List[tuple[RefinedClaim, MasterClaim]] = []
+    partial: Dict[frozenset, List[tuple[RefinedClaim, MasterClaim]]] = {}
+    for rc, mc in pairs:
+        if mc is None:
+            continue
+        if changed is None or rc.matched_rule_ids is None:
+            full.append((rc, mc))
+            continue
+        rerun = set(changed)
+        if facility_ids and (moved is None or str(rc.facility_id or "") in moved):
+            rerun |= facility_ids
+        if rerun:
+            partial.setdefault(frozenset(rerun), []).append((rc, mc))
+
+    new_ids: List[tuple[RefinedClaim, MasterClaim, List[str]]] = []
+    if full:
+        outcomes = _evaluate_claims([mc.dict() for _, mc in full], rules.plan, rule_context)
+        new_ids.extend((rc, mc, [str(rule.get("id")) for rule in matched]) for (rc, mc), (_, _, matched) in zip(full, outcomes))
+    for rerun, group in partial.items():
+        rerun_rules = [(kind, rule) for kind, rule, entry, _ in rules.plan.rules if str(entry.get("id")) in rerun]
+        sub_plan = compile_rules(
+            [rule for kind, rule in rerun_rules if kind == "technical"], [rule for kind, rule in rerun_rules if kind == "medical"]
+        )
+        if sub_plan.rules:
+            outcomes = _evaluate_claims([mc.dict() for _, mc in group], sub_plan, rule_context)
+        else:
+            outcomes = [("Validated", "no_error", [])] * len(group)
+        for (rc, mc), (_, _, matched) in zip(group, outcomes):
+            kept = {rule_id for rule_id in json.loads(rc.matched_rule_ids) if rule_id not in rerun and rule_id in positions}
+            hits = kept | {str(rule.get("id")) for rule in matched}
+            new_ids.append((rc, mc, sorted(hits, key=lambda rule_id: positions[rule_id][0])))
+
+    llm = get_llm_client()
+    changes: List[tuple[str, str, float]] = []
+    pending: List[Dict[str, Any]] = []
+    explain_items: List[tuple[Dict[str, Any], List[Dict[str, Any]]]] = []
+
+    def _flush() -> None:
+        texts = _explanation_texts(llm, explain_items)
+        for row, (explanation_text, recommendation_text) in zip(pending, texts):
+            row["error_explanation"] = explanation_text
+            row["recommended_action"] = recommendation_text
+        session.execute(update(RefinedClaim), pending)
+        pending.clear()
+        explain_items.clear()
+
+    for rc, mc, ids in new_ids:
+        matched_rule_ids = json.dumps(ids)
+        stale_text = bool(ids) and (changed is None or not changed.isdisjoint(ids))
+        if matched_rule_ids == rc.matched_rule_ids and not stale_text:
+            continue
+        matched = [dict(positions[rule_id][2]) for rule_id in ids]
+        kinds = {positions[rule_id][1] for rule_id in ids}
+        status, error_type, _ = _classify("technical" in kinds, "medical" in kinds, matched)
+        pending.append({
+            "id": rc.id,
+            "status": status,
+            "error_type": error_type,
+            "matched_rule_ids": matched_rule_ids,
+        })
+        explain_items.append((mc.dict(), matched))
+        changes.append((rc.error_type, error_type, float(rc.paid_amount_aed or 0.0)))
+        if len(pending) >= settings.BULK_INSERT_BATCH_SIZE:
+            _flush()
+    if pending:
+        _flush()
+    return changes
+
+
+def _apply_changes(counts: Dict[str, int], paid_by_type: Dict[str, float], changes: List[tuple[str, str, float]]) -> None:
+    for old_type, new_type, paid in changes:
+        counts[old_type] = counts.get(old_type, 0) - 1
+        counts[new_type] = counts.get(new_type, 0) + 1
+        paid_by_type[old_type] = paid_by_type.get(old_type, 0.0) - paid
+        paid_by_type[new_type] = paid_by_type.get(new_type, 0.0) + paid
+
+
+def heartbeat_expired(job: Ingestion) -> bool:
+    """Whether a running job's runner has stopped reporting, so the job may be taken over."""
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.VALIDATION_HEARTBEAT_TIMEOUT_SECONDS)
+    return job.heartbeat_at is None or job.heartbeat_at < cutoff
+
+
+def _take_job(session, ingestion: Ingestion, runner_id: str, require_stale: bool = True) -> bool:
+    """Make ``runner_id`` the job's runner and commit, unless another runner holds or took it.
+
+    A running job is only taken once its heartbeat is stale, unless ``require_stale`` is
+    off because the caller knows the previous runner lost its claim (its queue lease).
+    """
+    # Compare-and-set on the row as seen, like claim_next: of two runners that read the same
+    # row, only the first update matches
+    now = datetime.utcnow()
+    seen = [Ingestion.id == ingestion.id, Ingestion.status == ingestion.status]
+    for column, value in ((Ingestion.runner_id, ingestion.runner_id), (Ingestion.heartbeat_at, ingestion.heartbeat_at)):
+        seen.append(column.is_(None) if value is None else column == value)
+    if ingestion.status == "running" and require_stale:
+        cutoff = now - timedelta(seconds=settings.VALIDATION_HEARTBEAT_TIMEOUT_SECONDS)
+        seen.append(or_(Ingestion.heartbeat_at.is_(None), Ingestion.heartbeat_at < cutoff))
+    taken = session.execute(
+        update(Ingestion).where(*seen).values(status="running", runner_id=runner_id, heartbeat_at=now, progress_started_at=now)
+    ).rowcount
+    session.commit()
+    session.refresh(ingestion)
+    return bool(taken)
+
+
+def _keep_heartbeat(bind, ingestion_id: int, runner_id: str, done: threading.Event) -> None:
+    # Batches can run for minutes; report between them so the job does not look abandoned
+    while not done.wait(settings.VALIDATION_HEARTBEAT_SECONDS):
+        try:
+            with Session(bind) as session:
+                owned = session.execute(
+                    update(Ingestion)
+                    .where(Ingestion.id == ingestion_id, Ingestion.runner_id == runner_id)
+                    .values(heartbeat_at=datetime.utcnow())
+                ).rowcount
+                session.commit()
+        except Exception:
+            logger.warning("heartbeat for ingestion %s failed", ingestion_id, exc_info=True)
+            continue
+        if not owned:
+            return
+
+
+def run_validation_job(
+    session, tenant_id: str, job_id: str, interrupted: bool = False, lease: bool = False, abort: threading.Event | None = None
+) -> None:
+    """Validate a job's claims and store its results and metrics.
+
+    A job already running is left alone unless ``interrupted`` says its previous runner is
+    gone (a restarted process) and its heartbeat has gone stale; it then continues from its
+    checkpoint. With ``lease`` the caller holds the job's queue lease, which outranks any
+    earlier runner, so the job is taken whatever its heartbeat. Raises JobTakenOver if
+    another runner takes the job over meanwhile, or once ``abort`` is set.
+    """
+    ingestion = session.exec(
+        select(Ingestion).where(Ingestion.tenant_id == tenant_id, Ingestion.job_id == job_id)
+    ).first()
+    if not ingestion:
+        return
+    was_running = ingestion.status == "running"
+    if was_running and not (interrupted or lease):
+        return
+    runner_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    if not _take_job(session, ingestion, runner_id, require_stale=not lease):
+        return
+    done = threading.Event()
+    beat = threading.Thread(target=_keep_heartbeat, args=(session.get_bind(), ingestion.id, runner_id, done), daemon=True)
+    beat.start()
+    try:
+        _run_taken_job(session, ingestion, runner_id, was_running, abort)
+    finally:
+        done.set()
+        beat.join()
+
+
+def _run_taken_job(session, ingestion: Ingestion, runner_id: str, was_running: bool, abort: threading.Event | None) -> None:
+    tenant_id, job_id = ingestion.tenant_id, ingestion.job_id
+
+    rules = load_compiled_rules(session, tenant_id)
+    fingerprints = json.dumps(rules.fingerprints) if rules.fingerprints else None
+    # A job still marked running with a checkpoint was interrupted; it continues after the
+    # checkpoint unless the rules changed in the meantime
+    resume = (
+        was_running
+        and ingestion.checkpoint_claim_id is not None
+        and fingerprints is not None
+        and ingestion.rule_fingerprints == fingerprints
+    )
+    ingestion.error = None
+    ingestion.finished_at = None
+    session.execute(delete(Metrics).where(Metrics.tenant_id == tenant_id, Metrics.job_id == job_id))
+
+    # Results carried forward from a resubmission's base job count towards usage and metrics
+    carried_stmt = select(RefinedClaim.facility_id, RefinedClaim.service_code, RefinedClaim.error_type, RefinedClaim.paid_amount_aed).where(
+        RefinedClaim.tenant_id == tenant_id, RefinedClaim.job_id == job_id, RefinedClaim.carried_forward == True  # noqa: E712
+    )
+    if resume:
+        carried = session.exec(carried_stmt).all()
+        rule_context = _build_rule_context(session, tenant_id, job_id, rules, carried)
+        counts, paid_by_type = _stored_metrics(session, tenant_id, job_id)
+    else:
+        # A rerun replaces the job's results instead of appending a second set
+        _delete_job_results(session, tenant_id, job_id)
+        carried = session.exec(carried_stmt).all()
+        rule_context = _build_rule_context(session, tenant_id, job_id, rules, carried)
+
+        if carried and ingestion.base_job_id:
+            # Carried results reflect the rules and facility types the base job was validated with;
+            # the changed rows may have moved a facility to another inferred type
+            base = session.exec(
+                select(Ingestion).where(Ingestion.tenant_id == tenant_id, Ingestion.job_id == ingestion.base_job_id)
+            ).first()
+            previous = json.loads(base.rule_fingerprints) if base and base.rule_fingerprints else None
+            changed = _changed_rule_ids(previous, rules)
+            moved = _moved_facilities(base.facility_types_json if base else None, rule_context)
+            if changed is None or changed or ((moved is None or moved) and _facility_rule_ids(rules)):
+                changes = []
+                for pairs in _iter_result_pairs(session, tenant_id, job_id, settings.VALIDATION_BATCH_SIZE, carried_only=True):
+                    changes.extend(_revalidate_rows(session, pairs, changed, rules, rule_context, moved))
+                if changes:
+                    carried = session.exec(carried_stmt).all()
+
+        counts, paid_by_type = _empty_metrics()
+        for rc in carried:
+            counts[rc.error_type] = counts.get(rc.error_type, 0) + 1
+            paid_by_type[rc.error_type] = paid_by_type.get(rc.error_type, 0.0) + float(rc.paid_amount_aed or 0.0)
+
+        ingestion.checkpoint_claim_id = None
+        ingestion.processed_claims = 0
+        ingestion.total_claims = session.exec(
+            select(func.count()).select_from(MasterClaim).where(MasterClaim.tenant_id == tenant_id, MasterClaim.job_id == job_id)
+        ).one()
+        # Stored now so an interrupted run can tell whether its checkpoint is still valid
+        ingestion.rule_fingerprints = fingerprints
+    ingestion.progress_started_at = datetime.utcnow()
+    ingestion.progress_base_claims = ingestion.processed_claims
+    # Publish the running status and totals before the first batch
+    session.commit()
+
+    workers = settings.VALIDATION_WORKERS
+    # total_claims is the COUNT taken above for a fresh run; ids are only read to split a job that is sharded
+    if workers > 1 and not resume and (ingestion.total_claims or 0) >= settings.VALIDATION_SHARD_MIN_CLAIMS:
+        # Shards run side by side, so there is no single checkpoint; an interrupted run restarts
+        _validate_sharded(
+            session,
+            tenant_id,
+            job_id,
+            ingestion.id,
+            _shard_bounds(session, tenant_id, job_id, ingestion.total_claims, workers),
+            workers,
+            rules.technical_rules,
+            rules.medical_rules,
+            rule_context,
+            counts,
+            paid_by_type,
+            runner_id,
+        )
+    else:
+        first_id = ingestion.checkpoint_claim_id + 1 if resume else None
+        try:
+            _validate_stream(
+                session,
+                tenant_id,
+                job_id,
+                rules,
+                rule_context,
+                counts,
+                paid_by_type,
+                first_id,
+                ingestion_id=ingestion.id,
+                checkpoint=True,
+                runner_id=runner_id,
+                abort=abort,
+            )
+        except JobTakenOver:
+            # Everything committed so far is the new runner's checkpointed work
+            session.rollback()
+            raise
+        except Exception:
+            # Batches are committed as they finish; drop them so a rerun starts clean
+            session.rollback()
+            _delete_job_results(session, tenant_id, job_id)
+            ingestion.checkpoint_claim_id = None
+            ingestion.processed_claims = 0
+            session.commit()
+            raise
+    session.refresh(ingestion, with_for_update=True)
+    if ingestion.runner_id != runner_id or (abort is not None and abort.is_set()):
+        raise JobTakenOver(job_id)
+
     # Save metrics
     m = Metrics(
         tenant_id=tenant_id,
@@ -156,6 +761,128 @@ def run_validation_job(session, tenant_id: str, job_id: str) -> None:
     session.add(m)
 
     ingestion.status = "completed"
-    ingestion.counts_json = json.dumps({"rows": len(claims)})
+    ingestion.finished_at = datetime.utcnow()
+    ingestion.counts_json = json.dumps({"rows": (ingestion.processed_claims or 0) + len(carried)})
+    ingestion.rule_fingerprints = fingerprints
+    ingestion.facility_types_json = json.dumps(rule_context["facility_type_map"], sort_keys=True)
+    if ingestion.parent_job_id:
+        refresh_parent_job(session, tenant_id, ingestion.parent_job_id)
+
+
+def revalidate_job(session, tenant_id: str, job_id: str) -> Dict[str, Any] | None:
+    """Update a validated job's results in place after its tenant's rules changed.
+
+    Only rules whose id or content differ from the fingerprints stored with the job are
+    evaluated; rows whose rule hits or rule text change are rewritten and the job's Metrics
+    row is adjusted by the difference. Returns a summary, or None if the job does not exist.
+    """
+    ingestion = session.exec(
+        select(Ingestion).where(Ingestion.tenant_id == tenant_id, Ingestion.job_id == job_id)
+    ).first()
+    if not ingestion:
+        return None
 
+    rules = load_compiled_rules(session, tenant_id)
+    previous = json.loads(ingestion.rule_fingerprints) if ingestion.rule_fingerprints else None
+    carried = session.exec(
+        select(RefinedClaim.facility_id, RefinedClaim.service_code).where(
+            RefinedClaim.tenant_id == tenant_id, RefinedClaim.job_id == job_id, RefinedClaim.carried_forward == True  # noqa: E712
+        )
+    ).all()
+    rule_context = _build_rule_context(session, tenant_id, job_id, rules, carried)
+    changed = _changed_rule_ids(previous, rules)
+    moved = _moved_facilities(ingestion.facility_types_json, rule_context)
+    changes: List[tuple[str, str, float]] = []
+    if changed is None or changed or ((moved is None or moved) and _facility_rule_ids(rules)):
+        for pairs in _iter_result_pairs(session, tenant_id, job_id, settings.VALIDATION_BATCH_SIZE):
+            changes.extend(_revalidate_rows(session, pairs, changed, rules, rule_context, moved))
+
+    metrics = session.exec(select(Metrics).where(Metrics.tenant_id == tenant_id, Metrics.job_id == job_id)).first()
+    if metrics is None:
+        # Results are already updated in place, so the totals are read back as they now stand
+        counts, paid_by_type = _stored_metrics(session, tenant_id, job_id)
+        metrics = Metrics(tenant_id=tenant_id, job_id=job_id, claims_by_error_type="{}", paid_amount_by_error_type="{}")
+        session.add(metrics)
+    else:
+        counts = json.loads(metrics.claims_by_error_type)
+        paid_by_type = json.loads(metrics.paid_amount_by_error_type)
+        _apply_changes(counts, paid_by_type, changes)
+    metrics.claims_by_error_type = json.dumps(counts)
+    metrics.paid_amount_by_error_type = json.dumps(paid_by_type)
+    rows = session.exec(
+        select(func.count()).select_from(RefinedClaim).where(RefinedClaim.tenant_id == tenant_id, RefinedClaim.job_id == job_id)
+    ).one()
+
+    full = changed is None
+    summary = {"rows": rows, "changed_rules": len(rules.plan.rules) if full else len(changed), "full": full, "updated": len(changes)}
+    previous_counts = json.loads(ingestion.counts_json) if ingestion.counts_json else {}
+    ingestion.counts_json = json.dumps({**previous_counts, "revalidated": summary})
+    ingestion.rule_fingerprints = json.dumps(rules.fingerprints) if rules.fingerprints else None
+    ingestion.facility_types_json = json.dumps(rule_context["facility_type_map"], sort_keys=True)
+    if ingestion.parent_job_id:
+        refresh_parent_job(session, tenant_id, ingestion.parent_job_id)
+    return summary
+
+
+def fail_validation_job(session, tenant_id: str, job_id: str, error: str) -> None:
+    """Mark a job whose validation gave up as failed, so it is not left pending or running."""
+    job = session.exec(select(Ingestion).where(Ingestion.tenant_id == tenant_id, Ingestion.job_id == job_id)).first()
+    if not job:
+        return
+    job.status = "failed"
+    job.error = error
+    job.finished_at = datetime.utcnow()
+    if job.parent_job_id:
+        refresh_parent_job(session, tenant_id, job.parent_job_id)
+
+
+def refresh_parent_job(session, tenant_id: str, parent_job_id: str) -> None:
+    """Roll child job statuses of a batch upload up into the parent ingestion.
 
+    Once every child has finished, the children's metrics are summed into a Metrics row
+    for the parent job.
+    """
+    parent = session.exec(
+        select(Ingestion).where(Ingestion.tenant_id == tenant_id, Ingestion.job_id == parent_job_id).with_for_update()
+    ).first()
+    if not parent:
+        return
+    children = session.exec(
+        select(Ingestion).where(Ingestion.tenant_id == tenant_id, Ingestion.parent_job_id == parent_job_id)
+    ).all()
+    by_status: Dict[str, int] = {}
+    for child in children:
+        by_status[child.status] = by_status.get(child.status, 0) + 1
+    previous = json.loads(parent.counts_json) if parent.counts_json else {}
+    parent.counts_json = json.dumps({"children": len(children), "rows": previous.get("rows", 0), **by_status})
+
+    unfinished = by_status.get("pending", 0) + by_status.get("running", 0)
+    if unfinished:
+        parent.status = "running" if unfinished < len(children) or by_status.get("running") else "pending"
+        return
+    parent.status = "completed" if by_status.get("completed") else "failed"
+    parent.finished_at = datetime.utcnow()
+
+    child_ids = [child.job_id for child in children if child.status == "completed"]
+    if not child_ids:
+        return
+    counts: Dict[str, int] = {"no_error": 0, "medical_error": 0, "technical_error": 0, "both": 0}
+    paid_by_type: Dict[str, float] = {"no_error": 0.0, "medical_error": 0.0, "technical_error": 0.0, "both": 0.0}
+    for m in session.exec(select(Metrics).where(Metrics.tenant_id == tenant_id, Metrics.job_id.in_(child_ids))).all():
+        for key, value in json.loads(m.claims_by_error_type).items():
+            counts[key] = counts.get(key, 0) + value
+        for key, value in json.loads(m.paid_amount_by_error_type).items():
+            paid_by_type[key] = paid_by_type.get(key, 0.0) + value
+    existing = session.exec(select(Metrics).where(Metrics.tenant_id == tenant_id, Metrics.job_id == parent_job_id)).first()
+    if existing:
+        existing.claims_by_error_type = json.dumps(counts)
+        existing.paid_amount_by_error_type = json.dumps(paid_by_type)
+    else:
+        session.add(
+            Metrics(
+                tenant_id=tenant_id,
+                job_id=parent_job_id,
+                claims_by_error_type=json.dumps(counts),
+                paid_amount_by_error_type=json.dumps(paid_by_type),
+            )
+        )
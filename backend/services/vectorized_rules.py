@@ -0,0 +1,245 @@
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .rule_engine import RulePlan, _classify, _compile_facility_check
+
+Mask = Callable[["_Frame"], np.ndarray]
+
+
+class _Frame:
+    """Claims DataFrame plus per-evaluation caches of derived columns."""
+
+    def __init__(self, df: pd.DataFrame, context: Dict[str, Any]) -> None:
+        self.df = df
+        self.context = context
+        self.n = len(df)
+        self._text: Dict[Any, pd.Series] = {}
+        self._parts: Dict[str, Tuple[np.ndarray, pd.Series]] = {}
+
+    def column(self, field: Any, default: Any = None) -> pd.Series:
+        # Missing fields behave like claim.get(field, default)
+        if field in self.df.columns:
+            return self.df[field]
+        return pd.Series([default] * self.n, index=self.df.index, dtype=object)
+
+    def text(self, field: Any, default: Any = None) -> pd.Series:
+        # str(value) for every row, exactly as the row engine coerces
+        key = (field, default)
+        if key not in self._text:
+            self._text[key] = self.column(field, default).astype(str)
+        return self._text[key]
+
+    def parts(self, field: str, default: Any = None) -> Tuple[np.ndarray, pd.Series]:
+        """Row codes into the distinct values of ``field`` plus their exploded parts.
+
+        Parts are backtick-separated, stripped and non-empty; their index is the position
+        of the distinct value they came from. Diagnosis strings repeat a lot across a job,
+        so splitting each distinct string once is far cheaper than splitting every row.
+        """
+        if field not in self._parts:
+            codes, uniques = pd.factorize(self.text(field, default))
+            exploded = pd.Series(uniques, dtype=object).str.split("`").explode().str.strip()
+            self._parts[field] = (codes, exploded[exploded != ""])
+        return self._parts[field]
+
+    @staticmethod
+    def any_part(codes: np.ndarray, parts: pd.Series, hits: np.ndarray) -> np.ndarray:
+        # Collapse a per-part boolean to "any part matched" per distinct value, then per row
+        per_value = np.zeros(int(codes.max()) + 1 if len(codes) else 0, dtype=bool)
+        per_value[parts.index[hits]] = True
+        return per_value[codes]
+
+
+def _equals_mask(field: Any, value: Any) -> Mask:
+    if value is None:
+        return lambda f: np.zeros(f.n, dtype=bool)
+    expected = str(value).upper()
+
+    def _mask(f: _Frame) -> np.ndarray:
+        col = f.column(field)
+        return (col.to_numpy(dtype=object) != None) & (f.text(field).str.upper() == expected).to_numpy()  # noqa: E711
+
+    return _mask
+
+
+def _in_mask(field: Any, value: Any) -> Mask:
+    options = list({str(v) for v in value})
+    return lambda f: f.text(field).isin(options).to_numpy()
+
+
+def _simple_mask(field: Any, op: Any, value: Any) -> Mask | None:
+    if op == "equals":
+        return _equals_mask(field, value)
+    if op == "in":
+        return _in_mask(field, value)
+    return None
+
+
+def _as_float(col: pd.Series) -> np.ndarray:
+    try:
+        return col.astype("float64").to_numpy()
+    except (TypeError, ValueError):
+        def _to_float(value: Any) -> float:
+            try:
+                return float(value)
+            except Exception:
+                return np.nan
+
+        return np.array([_to_float(v) for v in col], dtype="float64")
+
+
+def _condition_mask(cond: Dict[str, Any]) -> Mask:
+    field = cond.get("field")
+    op = cond.get("op")
+    value = cond.get("value")
+
+    mask = _simple_mask(field, op, value)
+    if mask is not None:
+        return mask
+    if op == "contains_any":
+        options = list({str(v) for v in value})
+
+        def _contains_any(f: _Frame) -> np.ndarray:
+            codes, parts = f.parts(field)
+            return f.any_part(codes, parts, parts.isin(options).to_numpy())
+
+        return _contains_any
+    if op == ">":
+        try:
+            threshold = float(value)
+        except Exception:
+            return lambda f: np.zeros(f.n, dtype=bool)
+
+        def _numeric_gt(f: _Frame) -> np.ndarray:
+            with np.errstate(invalid="ignore"):
+                return _as_float(f.column(field)) > threshold
+
+        return _numeric_gt
+    if op == "regex_not_match":
+        return lambda f: ~f.text(field).str.match(value).to_numpy(dtype=bool)
+    if op == "requires_diagnosis":
+        mapping = value
+
+        def _requires_diagnosis(f: _Frame) -> np.ndarray:
+            codes = f.text("service_code")
+            lookup = {}
+            for code in codes.unique():
+                needed = mapping.get(code)
+                if needed:
+                    lookup[code] = needed
+            if not lookup:
+                return np.zeros(f.n, dtype=bool)
+            needed_col = codes.map(lookup).to_numpy(dtype=object)
+            has_needed = codes.isin(list(lookup)).to_numpy()
+            dx_codes, parts = f.parts("diagnosis_codes", "")
+            values = parts.to_numpy(dtype=object)
+            present = np.zeros(f.n, dtype=bool)
+            for needed in set(lookup.values()):
+                present |= (needed_col == needed) & f.any_part(dx_codes, parts, values == needed)
+            return has_needed & ~present
+
+        return _requires_diagnosis
+    if op == "not_in_facility_map":
+        check = _compile_facility_check(value)
+
+        def _not_in_facility_map(f: _Frame) -> np.ndarray:
+            facility = f.column("facility_id")
+            service = f.column("service_code")
+            fid = facility.where(facility.astype(bool), "").astype(str)
+            svc_truthy = service.astype(bool).to_numpy()
+            svc = f.text("service_code")
+            # Few distinct (facility, service) pairs: resolve each once with the row predicate
+            fid_codes, fid_values = pd.factorize(fid)
+            svc_codes, svc_values = pd.factorize(svc)
+            codes, pairs = pd.factorize(fid_codes * len(svc_values) + svc_codes)
+            outcomes = np.array(
+                [
+                    check({"facility_id": fid_values[pair // len(svc_values)], "service_code": svc_values[pair % len(svc_values)]}, f.context)
+                    for pair in pairs
+                ],
+                dtype=bool,
+            )
+            return svc_truthy & outcomes[codes]
+
+        return _not_in_facility_map
+    if op == "contains_conflicting_pairs":
+        pairs = tuple((a, b) for a, b in value)
+
+        def _conflicting(f: _Frame) -> np.ndarray:
+            codes, parts = f.parts("diagnosis_codes", "")
+            values = parts.to_numpy(dtype=object)
+            result = np.zeros(f.n, dtype=bool)
+            for a, b in pairs:
+                result |= f.any_part(codes, parts, values == a) & f.any_part(codes, parts, values == b)
+            return result
+
+        return _conflicting
+    return lambda f: np.zeros(f.n, dtype=bool)
+
+
+def _rule_mask(rule: Dict[str, Any]) -> Mask:
+    cond = rule.get("condition", {})
+    mask = _condition_mask(cond)
+    and_cond = cond.get("and")
+    if not and_cond:
+        return mask
+    and_mask = _simple_mask(and_cond.get("field"), and_cond.get("op"), and_cond.get("value"))
+    if and_mask is None:
+        return mask
+    return lambda f: mask(f) & and_mask(f)
+
+
+def claims_frame(claims: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Object-dtype DataFrame of claim dicts, so None and value types survive as in the dicts."""
+    fields = list(dict.fromkeys(key for claim in claims[:1] for key in claim))
+    return pd.DataFrame(
+        {field: pd.Series([claim.get(field) for claim in claims], dtype=object) for field in fields},
+        index=pd.RangeIndex(len(claims)),
+    )
+
+
+def _first_occurrences(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Codes per row into the distinct keys, plus the first row holding each key
+    codes, uniques = pd.factorize(keys)
+    first_rows = np.full(len(uniques), len(codes), dtype=np.int64)
+    np.minimum.at(first_rows, codes, np.arange(len(codes)))
+    return codes, first_rows
+
+
+def evaluate_frame(
+    df: pd.DataFrame, plan: RulePlan, context: Dict[str, Any] | None = None
+) -> List[Tuple[str, str, List[Dict[str, Any]]]]:
+    """Evaluate every claim row of ``df`` with one boolean mask per rule.
+
+    Returns the same ``(status, error_type, matched)`` tuples as ``evaluate_rules`` would
+    for each row, in row order. ``df`` should come from ``claims_frame``. Rows with the
+    same rule hits share one result tuple, so treat the ``matched`` lists as read-only.
+    """
+    frame = _Frame(df.reset_index(drop=True), context or {})
+    n = frame.n
+    # Only rules whose indexed codes occur somewhere in the batch need a mask
+    value_keys, part_keys = plan.index_keys
+    live = plan.candidates_among(
+        {key: frame.text(*key).unique().tolist() for key in value_keys},
+        {key: frame.parts(*key)[1].unique().tolist() for key in part_keys},
+    )
+    if not live or not n:
+        return [_classify(False, False, []) for _ in range(n)]
+    rules = [plan.rules[position] for position in live]
+    masks = np.column_stack([_rule_mask(rule)(frame) for _, rule, _, _ in rules])
+    is_technical = np.array([kind == "technical" for kind, _, _, _ in rules])
+    entries = [entry for _, _, entry, _ in rules]
+
+    # Classify each distinct hit pattern once; rows sharing a pattern share its result
+    if len(rules) <= 63:
+        keys = masks.astype(np.int64) @ (np.int64(1) << np.arange(len(rules), dtype=np.int64))
+    else:
+        keys = np.array([row.tobytes() for row in np.packbits(masks, axis=1)], dtype=object)
+    inverse, first_rows = _first_occurrences(keys)
+    outcomes = []
+    for pattern in masks[first_rows]:
+        matched = [dict(entries[k]) for k in np.flatnonzero(pattern)]
+        outcomes.append(_classify(bool(pattern[is_technical].any()), bool(pattern[~is_technical].any()), matched))
+    return [outcomes[i] for i in inverse.tolist()]
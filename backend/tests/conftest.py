@@ -0,0 +1,23 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel, create_engine
+
+from backend.core import db
+from backend.main import app
+from backend.routes.auth import get_current_user
+from backend.services.rule_cache import rule_cache
+
+
+@pytest.fixture
+def api(monkeypatch, tmp_path):
+    """TestClient for tenant "T" on a private SQLite database, with authentication stubbed out."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'api.db'}")
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(db, "engine", engine)
+    rule_cache.invalidate()
+    app.dependency_overrides[get_current_user] = lambda: None
+    try:
+        yield TestClient(app, headers={"X-Tenant-ID": "T"})
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+        engine.dispose()
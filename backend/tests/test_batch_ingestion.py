@@ -0,0 +1,114 @@
+import io
+import json
+import zipfile
+
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from backend.core import db
+from backend.models.claims import MasterClaim
+from backend.models.ingestions import Ingestion
+from backend.models.metrics import Metrics
+from backend.models.rules import RuleSet
+from backend.services import ingestion
+from backend.services.validation import refresh_parent_job
+
+HEADER = "Claim ID,Encounter Type,Service Date,National ID,Member ID,Facility ID,Unique ID,Diagnosis Codes,Service Code,Paid Amount (AED),Approval Number"
+
+
+def _claims_csv(amounts) -> bytes:
+    lines = [HEADER] + [f"C{i},Outpatient,2024-01-05,N{i},M{i},F1,U{i},E11.9,SRV1001,{amount}," for i, amount in enumerate(amounts)]
+    return "\n".join(lines).encode()
+
+
+def _zip(members) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    return buf.getvalue()
+
+
+def test_batch_zip_creates_child_jobs_and_rolls_up_metrics(api, monkeypatch):
+    monkeypatch.setattr(ingestion.settings, "INGEST_MAX_WORKERS", 2)
+    rule = {"id": "T1", "description": "Paid amount above 250", "condition": {"field": "paid_amount_aed", "op": ">", "value": 250}}
+    with Session(db.engine) as session:
+        session.add(RuleSet(tenant_id="T", name="technical_rules", kind="technical", rules_json=json.dumps({"rules": [rule]})))
+        session.commit()
+    data = _zip([
+        ("jan.csv", _claims_csv([100, 300, 400])),
+        ("nested/feb.csv", _claims_csv([500, 50])),
+        ("notes.txt", b"ignored"),
+        ("broken.csv", b"just,some\nrandom,text\n"),
+        ("__MACOSX/._jan.csv", b"ignored"),
+    ])
+    body = api.post("/api/upload/claims/batch", files={"file": ("batch.zip", data, "application/zip")}).json()
+    children = body["children"]
+    assert [(c["source"], c["rows"], c["status"]) for c in children] == [
+        ("jan.csv", 3, "pending"),
+        ("nested/feb.csv", 2, "pending"),
+        ("broken.csv", 0, "failed"),
+    ]
+    assert "header" in children[2]["error"]
+    assert body["rows"] == 5
+
+    # Inline background validation has run by now
+    parent = api.get(f"/api/jobs/{body['job_id']}").json()
+    assert parent["status"] == "completed"
+    metrics = api.get(f"/api/metrics/ingestion/{body['job_id']}").json()
+    assert metrics["claims_by_error_type"] == {"no_error": 2, "medical_error": 0, "technical_error": 3, "both": 0}
+    assert metrics["paid_amount_by_error_type"]["technical_error"] == 1200.0
+    with Session(db.engine) as session:
+        assert {mc.job_id for mc in session.exec(select(MasterClaim)).all()} == {children[0]["job_id"], children[1]["job_id"]}
+
+
+def test_batch_upload_rejects_oversized_archives_and_xls(api, monkeypatch):
+    monkeypatch.setattr(ingestion.settings, "INGEST_BATCH_MAX_BYTES", 1000)
+    # Highly compressible: tiny on the wire, over the limit once inflated
+    bomb = _zip([("a.csv", b"0" * 100_000)])
+    assert len(bomb) < 1000
+    r = api.post("/api/upload/claims/batch", files={"file": ("batch.zip", bomb, "application/zip")})
+    assert r.status_code == 400 and "limit" in r.json()["detail"]
+
+    monkeypatch.setattr(ingestion.settings, "INGEST_BATCH_MAX_FILES", 1)
+    r = api.post("/api/upload/claims/batch", files={"file": ("batch.zip", _zip([("a.csv", b"x"), ("b.csv", b"y")]), "application/zip")})
+    assert r.status_code == 400 and "more than 1" in r.json()["detail"]
+
+    for path in ("/api/upload/claims/batch", "/api/upload/claims"):
+        r = api.post(path, files={"file": ("old.xls", b"\xd0\xcf\x11\xe0", "application/vnd.ms-excel")})
+        assert r.status_code == 400 and ".xlsx" in r.json()["detail"]
+    with Session(db.engine) as session:
+        assert session.exec(select(Ingestion)).all() == []
+
+
+def test_refresh_parent_job_tracks_children_then_sums_metrics():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Ingestion(tenant_id="T", job_id="P", status="pending", counts_json=json.dumps({"children": 3, "rows": 9})))
+        for job_id, status in (("A", "running"), ("B", "pending"), ("C", "failed")):
+            session.add(Ingestion(tenant_id="T", job_id=job_id, status=status, parent_job_id="P"))
+        session.commit()
+
+        refresh_parent_job(session, "T", "P")
+        parent = session.exec(select(Ingestion).where(Ingestion.job_id == "P")).one()
+        assert parent.status == "running"
+        assert json.loads(parent.counts_json) == {"children": 3, "rows": 9, "running": 1, "pending": 1, "failed": 1}
+
+        for job_id, counts, paid in (("A", {"no_error": 2, "technical_error": 1}, {"no_error": 10.0, "technical_error": 300.0}), ("B", {"both": 4}, {"both": 40.0})):
+            session.exec(select(Ingestion).where(Ingestion.job_id == job_id)).one().status = "completed"
+            session.add(Metrics(tenant_id="T", job_id=job_id, claims_by_error_type=json.dumps(counts), paid_amount_by_error_type=json.dumps(paid)))
+        session.commit()
+        refresh_parent_job(session, "T", "P")
+        session.commit()
+        metrics = session.exec(select(Metrics).where(Metrics.job_id == "P")).one()
+        assert (parent.status, parent.finished_at is not None) == ("completed", True)
+        assert json.loads(metrics.claims_by_error_type) == {"no_error": 2, "medical_error": 0, "technical_error": 1, "both": 4}
+        assert json.loads(metrics.paid_amount_by_error_type)["both"] == 40.0
+
+        # Only failed children: the parent fails and gets no metrics
+        session.add(Ingestion(tenant_id="T", job_id="Q", status="pending"))
+        session.add(Ingestion(tenant_id="T", job_id="D", status="failed", parent_job_id="Q"))
+        session.commit()
+        refresh_parent_job(session, "T", "Q")
+        assert session.exec(select(Ingestion).where(Ingestion.job_id == "Q")).one().status == "failed"
+        assert session.exec(select(Metrics).where(Metrics.job_id == "Q")).first() is None
@@ -0,0 +1,58 @@
+from sqlalchemy import text
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from backend.core import db
+from backend.core.db import _add_missing_columns, _copy_csv_field, bulk_insert
+from backend.models.claims import MasterClaim
+
+
+def test_bulk_insert_executemany_fallback():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    rows = [
+        {
+            "tenant_id": "T",
+            "job_id": "J",
+            "claim_id": str(i),
+            "encounter_type": "Inpatient",
+            "service_date": "2024-01-05",
+            "national_id": "N",
+            "member_id": "M",
+            "facility_id": "F",
+            "unique_id": "U",
+            "diagnosis_codes": "E11.9",
+            "service_code": "SRV1001",
+            "paid_amount_aed": float(i),
+        }
+        for i in range(25)
+    ]
+    with Session(engine) as session:
+        assert bulk_insert(session, MasterClaim, rows, batch_size=10) == 25
+        session.commit()
+        stored = session.exec(select(MasterClaim).order_by(MasterClaim.id)).all()
+    assert [c.claim_id for c in stored] == [str(i) for i in range(25)]
+    assert stored[0].approval_number is None
+    assert stored[0].created_at is not None
+
+
+def test_copy_csv_field_quoting():
+    assert _copy_csv_field(None) == ""
+    assert _copy_csv_field("") == '""'
+    assert _copy_csv_field('a "b",c') == '"a ""b"",c"'
+    assert _copy_csv_field(True) == "t"
+
+
+def test_added_columns_take_model_defaults(monkeypatch, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    monkeypatch.setattr(db, "engine", engine)
+    with engine.begin() as conn:
+        # refined_claims as created before carried_forward existed, and as an earlier
+        # upgrade left job_queue: the column added without a default
+        conn.execute(text("CREATE TABLE refined_claims (id INTEGER PRIMARY KEY, tenant_id VARCHAR NOT NULL, job_id VARCHAR NOT NULL, claim_id VARCHAR NOT NULL, status VARCHAR NOT NULL, error_type VARCHAR NOT NULL)"))
+        conn.execute(text("INSERT INTO refined_claims (tenant_id, job_id, claim_id, status, error_type) VALUES ('T', 'J', 'C1', 'Validated', 'no_error')"))
+        conn.execute(text("CREATE TABLE job_queue (id INTEGER PRIMARY KEY, tenant_id VARCHAR NOT NULL, job_id VARCHAR NOT NULL, priority INTEGER)"))
+        conn.execute(text("INSERT INTO job_queue (tenant_id, job_id) VALUES ('T', 'J')"))
+    _add_missing_columns()
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT carried_forward FROM refined_claims")).scalar_one() == 0
+        assert conn.execute(text("SELECT priority, status, attempts FROM job_queue")).one() == (0, "queued", 0)
@@ -0,0 +1,99 @@
+import base64
+import csv
+import gzip
+import io
+import json
+
+import pytest
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from backend.core import db
+from backend.models.claims import RefinedClaim
+from backend.models.rules import RuleSet
+from backend.routes import claims
+from backend.routes.claims import CSV_DEFAULT_COLUMNS, _decode_cursor, _encode_cursor
+
+HEADER = "Claim ID,Encounter Type,Service Date,National ID,Member ID,Facility ID,Unique ID,Diagnosis Codes,Service Code,Paid Amount (AED),Approval Number"
+
+
+def _upload_job(api, n: int = 23) -> str:
+    rule = {"id": "T1", "description": "Paid amount above 250", "recommendation": "Check approval", "condition": {"field": "paid_amount_aed", "op": ">", "value": 250}}
+    with Session(db.engine) as session:
+        session.add(RuleSet(tenant_id="T", name="technical_rules", kind="technical", rules_json=json.dumps({"rules": [rule]})))
+        session.commit()
+    lines = [HEADER] + [f"C{i},Outpatient,2024-01-05,N{i},M{i},F1,U{i},E11.9,SRV1001,{100 + 50 * (i % 5)}," for i in range(n)]
+    body = api.post("/api/upload/claims", files={"file": ("claims.csv", "\n".join(lines).encode(), "text/csv")}).json()
+    return body["job_id"]
+
+
+def _walk(api, job_id: str, page_size: int, **params) -> list[dict]:
+    pages = []
+    cursor = None
+    while True:
+        page = api.get("/api/claims", params={"job_id": job_id, "page_size": page_size, **({"cursor": cursor} if cursor else {}), **params}).json()
+        pages.append(page)
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trips_and_rejects_malformed_values(api):
+    assert _decode_cursor(_encode_cursor(12345)) == 12345
+    job_id = _upload_job(api, 3)
+    for bad in ("not a cursor!", base64.urlsafe_b64encode(b"[1, 2]").decode(), base64.urlsafe_b64encode(b'{"after": "7"}').decode()):
+        r = api.get("/api/claims", params={"job_id": job_id, "cursor": bad})
+        assert r.status_code == 400 and r.json()["detail"] == "Invalid cursor"
+
+
+def test_cursor_pages_keep_id_order_and_match_offset_pages(api):
+    job_id = _upload_job(api)
+    pages = _walk(api, job_id, 5)
+    assert [len(page["items"]) for page in pages] == [5, 5, 5, 5, 3]
+    assert all(page["page"] is None for page in pages[1:])
+    walked = [item["claim_id"] for page in pages for item in page["items"]]
+    assert walked == [f"C{i}" for i in range(23)]
+    offset = [item["claim_id"] for n in range(1, 6) for item in api.get("/api/claims", params={"job_id": job_id, "page": n, "page_size": 5}).json()["items"]]
+    assert offset == walked
+
+
+@pytest.mark.parametrize(
+    "params",
+    [{}, {"status": "Validated"}, {"status": "Not Validated"}, {"error_type": "technical_error"}, {"error_type": "medical_error"}, {"status": "Validated", "error_type": "technical_error"}],
+)
+def test_listing_total_from_metrics_matches_count(api, params):
+    job_id = _upload_job(api)
+    # Completed with Metrics, so the total comes from them rather than a COUNT
+    assert api.get(f"/api/jobs/{job_id}").json()["status"] == "completed"
+    filters = [RefinedClaim.job_id == job_id] + [getattr(RefinedClaim, key) == value for key, value in params.items()]
+    with Session(db.engine) as session:
+        count = session.exec(select(func.count()).select_from(RefinedClaim).where(*filters)).one()
+    pages = _walk(api, job_id, 10, **params)
+    assert {page["total"] for page in pages} == {count}
+    assert sum(len(page["items"]) for page in pages) == count
+
+
+def test_gzip_export_decompresses_to_the_plain_csv(api, monkeypatch):
+    monkeypatch.setattr(claims.settings, "BULK_INSERT_BATCH_SIZE", 4)
+    job_id = _upload_job(api)
+    plain = api.get(f"/api/export/{job_id}.csv")
+    assert plain.status_code == 200 and "content-encoding" not in plain.headers
+    rows = list(csv.reader(io.StringIO(plain.text)))
+    assert rows[0] == CSV_DEFAULT_COLUMNS and [row[0] for row in rows[1:]] == [f"C{i}" for i in range(23)]
+
+    with api.stream("GET", f"/api/export/{job_id}.csv", params={"gzip": "true"}) as r:
+        assert r.headers["content-encoding"] == "gzip"
+        raw = b"".join(r.iter_raw())
+    assert gzip.decompress(raw) == plain.content
+
+
+def test_export_selects_columns_in_order_and_rejects_unknown_ones(api):
+    job_id = _upload_job(api, 5)
+    r = api.get(f"/api/export/{job_id}.csv", params={"columns": "error_type, claim_id,service_date"})
+    rows = list(csv.reader(io.StringIO(r.text)))
+    assert rows[0] == ["error_type", "claim_id", "service_date"]
+    assert rows[1:] == [["no_error", f"C{i}", "2024-01-05"] for i in range(4)] + [["technical_error", "C4", "2024-01-05"]]
+
+    r = api.get(f"/api/export/{job_id}.csv", params={"columns": "claim_id,national_id,secret"})
+    assert r.status_code == 400 and r.json()["detail"] == "Unknown export columns: national_id, secret"
+    assert api.get(f"/api/export/{job_id}.csv", params={"columns": " , "}).status_code == 400
@@ -0,0 +1,57 @@
+import json
+
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from backend.models.facilities import FacilityProfile
+from backend.services import facility_registry
+from backend.services.facility_registry import FacilityTypeInferer, sync_facility_types
+
+FACILITY_MAP = {"CARDIOLOGY_CENTER": ["SRV2001"], "GENERAL_HOSPITAL": ["SRV1001", "SRV2001", "SRV2007"]}
+
+
+def test_inferer_picks_smallest_matching_type():
+    inferer = FacilityTypeInferer(FACILITY_MAP)
+    assert inferer.infer("F1", {"SRV2001"}) == "CARDIOLOGY_CENTER"
+    assert inferer.infer("F1", {"SRV2001", "SRV1001"}) == "GENERAL_HOSPITAL"
+    assert inferer.infer("F1", {"SRV9999"}) == "GENERAL_HOSPITAL"
+    assert FacilityTypeInferer({"F1": ["SRV1"]}).infer("F1", {"SRV9"}) == "F1"
+
+
+def test_registry_accumulates_services_across_jobs():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        assert sync_facility_types(session, "T", {"F1": {"SRV2001"}}, FACILITY_MAP, "d1") == {"F1": "CARDIOLOGY_CENTER"}
+        session.commit()
+        assert sync_facility_types(session, "T", {"F1": {"SRV1001"}}, FACILITY_MAP, "d1") == {"F1": "GENERAL_HOSPITAL"}
+        # A later job billing only SRV2001 still sees the service F1 billed earlier
+        assert sync_facility_types(session, "T", {"F1": {"SRV2001"}}, FACILITY_MAP, "d1") == {"F1": "GENERAL_HOSPITAL"}
+        session.commit()
+        # New allow-lists re-infer from the stored services
+        assert sync_facility_types(session, "T", {"F1": {"SRV2001"}}, {"CLINIC": ["SRV1001", "SRV2001"]}, "d2") == {"F1": "CLINIC"}
+        session.commit()
+        profile = session.exec(select(FacilityProfile)).one()
+    assert json.loads(profile.services_json) == ["SRV1001", "SRV2001"]
+    assert profile.rule_map_digest == "d2"
+
+
+def test_registry_merges_into_concurrently_created_row(monkeypatch):
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(FacilityProfile(tenant_id="T", facility_id="F1", services_json='["SRV1001"]', rule_map_digest="d1"))
+        session.commit()
+        load = facility_registry._load_profiles
+        calls = []
+
+        def _stale_first_load(*args):
+            # The first lookup misses the row, as if another job inserted it just after
+            calls.append(args)
+            return {} if len(calls) == 1 else load(*args)
+
+        monkeypatch.setattr(facility_registry, "_load_profiles", _stale_first_load)
+        types = sync_facility_types(session, "T", {"F1": {"SRV2001"}, "F2": {"SRV2001"}}, FACILITY_MAP, "d1")
+        session.commit()
+        stored = {p.facility_id: json.loads(p.services_json) for p in session.exec(select(FacilityProfile)).all()}
+    assert types == {"F1": "GENERAL_HOSPITAL", "F2": "CARDIOLOGY_CENTER"}
+    assert stored == {"F1": ["SRV1001", "SRV2001"], "F2": ["SRV2001"]}
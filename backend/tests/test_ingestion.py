@@ -0,0 +1,253 @@
+import csv
+import datetime
+import hashlib
+import io
+import random
+
+import pandas as pd
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from backend.core import db
+from backend.models.claims import MasterClaim
+from backend.models.ingestions import Ingestion
+from backend.services import ingestion
+from backend.services.ingestion import (
+    HashingReader,
+    _iter_claims_chunks,
+    _iter_normalized_chunks,
+    _load_claims_dataframe,
+    _normalize_frame,
+    _normalize_row,
+    ingest_claims_file,
+)
+
+
+def _sample_frame(n: int = 400) -> pd.DataFrame:
+    rng = random.Random(7)
+    dates = ["2024-01-05", "2024-1-5", "01/05/2024", "13/05/2024", "05/13/24", "Jan 5 2024", "2024-01-05 10:30:00", "not a date", " 2024-01-05", ""]
+    diagnoses = ["E11.9;R07.9", "E11.9, R07.9 ,", "E11.9`R07.9", " E11.9 ` ` R07.9,Z34.0 ", "|;E11.9\n\nR07.9|", "   ", "", "E11.9\x1cR07.9"]
+    amounts = ["300", "300.25", "", "abc", " 12 ", "1_000", "nan", "485927.696562812664", "1e3"]
+    rows = []
+    for i in range(n):
+        rows.append({
+            "claim_id": f"C{i}",
+            "encounter_type": rng.choice(["Inpatient", "Outpatient", ""]),
+            "service_date": rng.choice(dates),
+            "national_id": rng.choice(["abc-1", "", "Ünï"]),
+            "member_id": rng.choice(["m1", ""]),
+            "facility_id": rng.choice(["fac1", "FAC2", ""]),
+            "unique_id": rng.choice(["abcd-1234-efgh", ""]),
+            "diagnosis_codes": rng.choice(diagnoses),
+            "service_code": rng.choice([" srv1001 ", "SRV2001", ""]),
+            "paid_amount_aed": rng.choice(amounts),
+            "approval_number": rng.choice(["", "AP-1"]),
+        })
+    return pd.DataFrame(rows)
+
+
+def _assert_matches_row_path(df: pd.DataFrame) -> None:
+    expected = [_normalize_row(dict(record)) for record in df.to_dict(orient="records")]
+    actual = _normalize_frame(df).to_dict(orient="records")
+    assert len(actual) == len(expected)
+    for got, want in zip(actual, expected):
+        assert got.keys() == want.keys()
+        for key, value in want.items():
+            if isinstance(value, float) and value != value:
+                assert got[key] != got[key]
+            else:
+                assert got[key] == value, (key, got[key], value)
+
+
+def test_normalize_frame_matches_row_normalizer():
+    _assert_matches_row_path(_sample_frame())
+
+
+def test_normalize_frame_with_dayfirst_leading_value():
+    # The first date decides the cached format; day-first formats must not be trusted
+    df = _sample_frame(50)
+    df.loc[0, "service_date"] = "13/01/2024"
+    df.loc[1, "service_date"] = "01/02/2024"
+    _assert_matches_row_path(df)
+
+
+HEADER = ["Claim ID", "Encounter Type", "Service Date", "National ID", "Member ID", "Facility ID", "Unique ID", "Diagnosis Codes", "Service Code", "Paid Amount (AED)", "Approval Number"]
+
+
+def _file_rows(n: int = 40) -> list:
+    # A title preamble and a blank line ahead of the header, like exported reports
+    frame = _sample_frame(n)
+    rows = [["Claims export"], [], HEADER]
+    rows.extend([str(v) if v != "" else None for v in record] for record in frame.itertuples(index=False))
+    return rows
+
+
+def _csv_bytes(rows: list) -> bytes:
+    buf = io.StringIO()
+    # The C parser needs every line as wide as the header, as spreadsheet exports write them
+    csv.writer(buf).writerows(row + [None] * (len(HEADER) - len(row)) for row in rows)
+    return buf.getvalue().encode()
+
+
+def _xlsx_bytes(rows: list) -> bytes:
+    import openpyxl
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for row in rows:
+        ws.append([ILLEGAL_CHARACTERS_RE.sub("", v) if v else v for v in row])
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def _assert_chunks_match_whole_file(data: bytes, filename: str) -> None:
+    whole = _load_claims_dataframe(data, filename).reset_index(drop=True)
+    for chunk_size in (1, 7, 16, 1000):
+        chunks = list(_iter_claims_chunks(data, filename, chunk_size))
+        if chunk_size < 16:
+            assert len(chunks) > 1
+        streamed = pd.concat(chunks, ignore_index=True)
+        assert list(streamed.columns) == list(whole.columns)
+        assert streamed.fillna("").astype(str).values.tolist() == whole.fillna("").astype(str).values.tolist()
+
+
+def test_chunked_csv_matches_whole_file_parse():
+    _assert_chunks_match_whole_file(_csv_bytes(_file_rows()), "claims.csv")
+
+
+def test_read_only_xlsx_chunks_match_whole_file_parse():
+    _assert_chunks_match_whole_file(_xlsx_bytes(_file_rows()), "claims.xlsx")
+
+
+def test_streaming_ingest_stores_same_rows_as_whole_file(monkeypatch):
+    # The header sits past the first chunk's nominal size; detection still sees it
+    monkeypatch.setattr(ingestion.settings, "INGEST_CHUNK_SIZE", 2)
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    fields = ["claim_id", "service_date", "national_id", "facility_id", "diagnosis_codes", "service_code", "paid_amount_aed", "approval_number"]
+    for filename, data in (("claims.csv", _csv_bytes(_file_rows())), ("claims.xlsx", _xlsx_bytes(_file_rows()))):
+        stored = {}
+        with Session(engine) as session:
+            for streaming in (True, False):
+                job_id, count = ingest_claims_file(session, "T", data, filename, streaming=streaming)
+                session.commit()
+                claims = session.exec(select(MasterClaim).where(MasterClaim.job_id == job_id).order_by(MasterClaim.id)).all()
+                assert count == len(claims) == 40
+                stored[streaming] = [[getattr(mc, field) for field in fields] for mc in claims]
+        assert stored[True] == stored[False], filename
+
+
+def test_hashing_reader_digests_whole_upload_in_parse_pass():
+    for filename, data in (("claims.csv", _csv_bytes(_file_rows())), ("claims.xlsx", _xlsx_bytes(_file_rows()))):
+        upload = HashingReader(io.BytesIO(data))
+        assert sum(len(df) for df in _iter_normalized_chunks(upload, filename)) == 40
+        if filename.endswith(".csv"):
+            # Sequential parsing already hashed everything
+            assert upload._hashed == len(data)
+        assert upload.hexdigest() == hashlib.sha256(data).hexdigest()
+
+
+def test_upload_of_identical_content_returns_existing_job(api, monkeypatch):
+    data = _csv_bytes(_file_rows())
+    first = api.post("/api/upload/claims", files={"file": ("a.csv", data, "text/csv")}).json()
+
+    # A duplicate is answered from the hash alone, before the file is parsed
+    def _no_parse(*args, **kwargs):
+        raise AssertionError("duplicate upload was parsed")
+
+    with monkeypatch.context() as patched:
+        patched.setattr(ingestion, "_iter_raw_chunks", _no_parse)
+        patched.setattr(ingestion, "_load_claims_dataframe", _no_parse)
+        again = api.post("/api/upload/claims", files={"file": ("renamed.csv", data, "text/csv")}).json()
+    assert again == {"status": "ok", "job_id": first["job_id"], "rows": 40, "deduplicated": True}
+    forced = api.post("/api/upload/claims", params={"dedupe": "false"}, files={"file": ("a.csv", data, "text/csv")}).json()
+    assert forced["job_id"] != first["job_id"] and "deduplicated" not in forced
+
+    with Session(db.engine) as session:
+        jobs = session.exec(select(Ingestion).order_by(Ingestion.id)).all()
+        claims = session.exec(select(MasterClaim)).all()
+    assert [job.job_id for job in jobs] == [first["job_id"], forced["job_id"]]
+    assert {job.content_sha256 for job in jobs} == {hashlib.sha256(data).hexdigest()}
+    assert len(claims) == 80
+
+
+def _typed_claims_table(n: int = 30):
+    import pyarrow as pa
+
+    return pa.table({
+        "Claim ID": [f"C{i}" for i in range(n)],
+        "Encounter Type": ["Inpatient" if i % 2 else "Outpatient" for i in range(n)],
+        "Service Date": pa.array([datetime.date(2024, 1, 1 + i % 28) if i % 7 else None for i in range(n)], pa.date32()),
+        "National ID": [f"n{i}" for i in range(n)],
+        "Member ID": [f"m{i}" for i in range(n)],
+        "Facility ID": ["fac1"] * n,
+        "Unique ID": [f"u{i}" for i in range(n)],
+        "Diagnosis Codes": ["E11.9;R07.9" if i % 3 else None for i in range(n)],
+        "Service Code": [" srv1001 "] * n,
+        "Paid Amount (AED)": pa.array([float(i) * 12.5 if i % 5 else None for i in range(n)], pa.float64()),
+        "Approval Number": pa.array([i if i % 4 else None for i in range(n)], pa.int64()),
+    })
+
+
+def _as_csv(table) -> bytes:
+    # The same claims as text, written the way a spreadsheet export would
+    frame = table.to_pandas()
+    frame["Service Date"] = frame["Service Date"].map(lambda d: d.isoformat() if d else "")
+    frame["Approval Number"] = frame["Approval Number"].map(lambda v: "" if pd.isna(v) else str(int(v)))
+    frame["Paid Amount (AED)"] = frame["Paid Amount (AED)"].map(lambda v: "" if pd.isna(v) else repr(v))
+    return frame.fillna("").to_csv(index=False).encode()
+
+
+def test_parquet_and_arrow_ingest_typed_columns_like_csv(monkeypatch):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    monkeypatch.setattr(ingestion.settings, "INGEST_CHUNK_SIZE", 4)
+    table = _typed_claims_table()
+    parquet = io.BytesIO()
+    pq.write_table(table, parquet, row_group_size=7)
+    arrow_file, arrow_stream = io.BytesIO(), io.BytesIO()
+    with pa.ipc.new_file(arrow_file, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=9):
+            writer.write_batch(batch)
+    with pa.ipc.new_stream(arrow_stream, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=11):
+            writer.write_batch(batch)
+
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    fields = ["claim_id", "service_date", "national_id", "diagnosis_codes", "service_code", "paid_amount_aed", "approval_number"]
+    stored = {}
+    with Session(engine) as session:
+        for filename, data in (("c.csv", _as_csv(table)), ("c.parquet", parquet.getvalue()), ("c.arrow", arrow_file.getvalue()), ("c.arrows", arrow_stream.getvalue())):
+            job_id, count = ingest_claims_file(session, "T", data, filename)
+            claims = session.exec(select(MasterClaim).where(MasterClaim.job_id == job_id).order_by(MasterClaim.id)).all()
+            assert count == len(claims) == 30
+            stored[filename] = [[getattr(mc, field) for field in fields] for mc in claims]
+    assert stored["c.csv"][1] == ["C1", "2024-01-02", "N1", "E11.9`R07.9", "SRV1001", 12.5, "1"]
+    assert stored["c.csv"][0][1] == "" and stored["c.csv"][0][5] == 0.0
+    for filename in ("c.parquet", "c.arrow", "c.arrows"):
+        assert stored[filename] == stored["c.csv"], filename
+
+
+def test_parquet_export_round_trips_results(api):
+    import pyarrow.parquet as pq
+
+    table = _typed_claims_table()
+    parquet = io.BytesIO()
+    pq.write_table(table, parquet)
+    job_id = api.post("/api/upload/claims", files={"file": ("c.parquet", parquet.getvalue(), "application/octet-stream")}).json()["job_id"]
+    r = api.get(f"/api/export/{job_id}.parquet")
+    assert r.headers["content-type"] == "application/vnd.apache.parquet"
+    exported = pq.read_table(io.BytesIO(r.content))
+    assert exported.schema.field("paid_amount_aed").type == "double"
+
+    listing = api.get("/api/claims", params={"job_id": job_id, "page_size": 200}).json()["items"]
+    rows = exported.to_pylist()
+    assert [row["claim_id"] for row in rows] == [item["claim_id"] for item in listing] == [f"C{i}" for i in range(30)]
+    for row, item in zip(rows, listing):
+        assert (row["error_type"], row["status"], row["paid_amount_aed"], row["error_explanation"]) == (
+            item["error_type"], item["status"], item["paid_amount_aed"], item["explanation"]
+        )
+    assert rows[1]["service_date"] == "2024-01-02"
@@ -0,0 +1,156 @@
+import contextlib
+import threading
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from backend import worker
+from backend.core import db
+from backend.models.claims import MasterClaim, RefinedClaim
+from backend.models.ingestions import Ingestion
+from backend.models.job_queue import JobQueueItem
+from backend.services import job_queue, validation
+from backend.services.rule_cache import rule_cache
+from backend.services.job_queue import claim_next, complete, enqueue, fail, heartbeat, queue_stats
+
+
+def _session() -> Session:
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    return Session(engine)
+
+
+def test_claims_follow_priority_and_duplicates_collapse():
+    with _session() as session:
+        enqueue(session, "T", "low")
+        enqueue(session, "T", "high", priority=5)
+        enqueue(session, "T", "low", priority=1)
+        session.commit()
+        assert len(session.exec(select(JobQueueItem)).all()) == 2
+
+        first = claim_next(session, "w1")
+        second = claim_next(session, "w2")
+        assert (first.job_id, second.job_id) == ("high", "low")
+        assert (first.locked_by, first.attempts) == ("w1", 1)
+        assert claim_next(session, "w3") is None
+        assert heartbeat(session, first.id, "w1")
+        assert not heartbeat(session, first.id, "w2")
+        complete(session, first.id, "w1")
+        session.commit()
+        assert session.get(JobQueueItem, first.id).status == "done"
+
+
+def test_failed_attempts_back_off_then_give_up(monkeypatch):
+    monkeypatch.setattr(job_queue.settings, "JOB_QUEUE_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(job_queue.settings, "JOB_QUEUE_BACKOFF_SECONDS", 60)
+    with _session() as session:
+        session.add(Ingestion(tenant_id="T", job_id="J", status="running"))
+        item = enqueue(session, "T", "J")
+        session.commit()
+
+        claim_next(session, "w1")
+        assert fail(session, item.id, "w1", "boom")
+        session.commit()
+        # Not runnable until the backoff has passed
+        assert claim_next(session, "w1") is None
+        assert item.run_after > datetime.utcnow() + timedelta(seconds=50)
+
+        item.run_after = datetime.utcnow()
+        session.commit()
+        assert claim_next(session, "w2").attempts == 2
+        assert not fail(session, item.id, "w2", "boom again")
+        session.commit()
+        job = session.exec(select(Ingestion)).one()
+        assert (item.status, job.status, job.error) == ("failed", "failed", "boom again")
+
+
+def test_expired_lease_is_claimed_again():
+    with _session() as session:
+        item = enqueue(session, "T", "J")
+        session.commit()
+        claim_next(session, "dead")
+        item.locked_until = datetime.utcnow() - timedelta(seconds=1)
+        session.commit()
+
+        reclaimed = claim_next(session, "w2")
+        assert (reclaimed.id, reclaimed.locked_by, reclaimed.attempts) == (item.id, "w2", 2)
+        # The dead worker's late report does not override the new lease
+        assert not fail(session, item.id, "dead", "late")
+        assert session.get(JobQueueItem, item.id).status == "running"
+
+
+def test_small_tenant_overtakes_backlog_within_caps(monkeypatch):
+    monkeypatch.setattr(job_queue.settings, "JOB_TENANT_MAX_CONCURRENT", 1)
+    monkeypatch.setattr(job_queue.settings, "JOB_MAX_CONCURRENT", 2)
+    with _session() as session:
+        for n in range(3):
+            enqueue(session, "BIG", f"big{n}", cost=1000)
+        session.commit()
+        big0 = claim_next(session, "w1")
+        assert big0.job_id == "big0"
+        # BIG is at its cap, so its backlog waits even with a worker free
+        assert claim_next(session, "w2") is None
+
+        small = [enqueue(session, "SMALL", f"small{n}", cost=10) for n in range(2)]
+        session.commit()
+        assert claim_next(session, "w2").job_id == "small0"
+        assert claim_next(session, "w3") is None  # global cap
+        complete(session, small[0].id, "w2")
+        session.commit()
+        # Both tenants have room after big0 finishes; SMALL's next job still finishes first in virtual time
+        complete(session, big0.id, "w1")
+        session.commit()
+        assert claim_next(session, "w2").job_id == "small1"
+        assert claim_next(session, "w1").job_id == "big1"
+
+        stats = queue_stats(session)
+        assert (stats["BIG"]["queued"], stats["BIG"]["running"], stats["BIG"]["dispatched"]) == (1, 1, 2)
+        assert stats["SMALL"]["dispatched"] == 2
+        assert queue_stats(session, "OTHER")["OTHER"]["queued"] == 0
+
+
+def test_worker_that_lost_its_lease_stops_and_the_new_lease_holder_finishes(monkeypatch, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'queue.db'}")
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(db, "engine", engine)
+    rule_cache.invalidate()
+    fields = dict(encounter_type="", service_date="", national_id="", member_id="", facility_id="F1", unique_id="", diagnosis_codes="", service_code="S1")
+    with Session(engine) as session:
+        session.add(Ingestion(tenant_id="T", job_id="J", status="pending"))
+        session.add_all(MasterClaim(tenant_id="T", job_id="J", claim_id=f"C{i}", paid_amount_aed=1.0, **fields) for i in range(10))
+        session.commit()
+
+    monkeypatch.setattr(validation.settings, "VALIDATION_BATCH_SIZE", 3)
+    original = validation._validate_claims
+    lost = threading.Event()
+
+    def _validate_claims(session, tenant_id, job_id, claims, *args):
+        if claims[-1].claim_id == "C2":
+            # The lease thread gives up on renewing while the first batch runs
+            lost.set()
+        return original(session, tenant_id, job_id, claims, *args)
+
+    monkeypatch.setattr(validation, "_validate_claims", _validate_claims)
+    job_queue.execute("validate", "T", "J", abort=lost)
+    with Session(engine) as session:
+        job = session.exec(select(Ingestion)).one()
+        # Stopped after the batch in hand, still heartbeating fresh as far as anyone can tell
+        assert (job.status, job.processed_claims) == ("running", 3)
+        assert job.heartbeat_at > datetime.utcnow() - timedelta(minutes=1)
+
+    # The worker holding the new lease takes over at once and resumes from the checkpoint
+    job_queue.execute("validate", "T", "J")
+    with Session(engine) as session:
+        job = session.exec(select(Ingestion)).one()
+        results = session.exec(select(RefinedClaim)).all()
+    assert (job.status, job.processed_claims) == ("completed", 10)
+    assert sorted(rc.claim_id for rc in results) == sorted(f"C{i}" for i in range(10))
+
+
+def test_lost_lease_signals_the_running_job(monkeypatch):
+    monkeypatch.setattr(worker, "get_session", contextlib.nullcontext)
+    monkeypatch.setattr(worker, "heartbeat", lambda session, item_id, worker_id: False)
+    monkeypatch.setattr(worker.settings, "JOB_QUEUE_VISIBILITY_TIMEOUT_SECONDS", 0)
+    done, lost = threading.Event(), threading.Event()
+    worker._keep_lease(1, "w1", done, lost)
+    assert lost.is_set()
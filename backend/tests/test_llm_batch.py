@@ -0,0 +1,72 @@
+import threading
+
+from backend.scripts.llm_stub_server import start_server
+from backend.services import llm_client
+from backend.services.llm_async import AsyncBatchLLMClient, TokenBucket
+from backend.services.llm_client import MockLLMClient, get_llm_client
+
+
+def _items(n: int):
+    return [
+        ({"claim_id": f"C{i}"}, [{"id": f"R{i}", "type": "technical", "description": f"Rule {i}", "recommendation": "Review"}])
+        for i in range(n)
+    ]
+
+
+def test_batches_preserve_order():
+    server = start_server(latency=0.01)
+    try:
+        client = AsyncBatchLLMClient(url=server.url, batch_size=4, max_concurrency=3, claim_fields=[])
+        items = _items(10)
+        results = client.explain_many(items)
+    finally:
+        server.shutdown()
+    assert results == [MockLLMClient().explain({}, matched) for _, matched in items]
+    assert server.requests == 3
+    assert server.items == 10
+
+
+def test_rate_limited_requests_are_retried():
+    server = start_server(fail_first=2)
+    try:
+        client = AsyncBatchLLMClient(url=server.url, batch_size=5, max_retries=3, backoff_seconds=0.01, claim_fields=[])
+        results = client.explain_many(_items(5))
+    finally:
+        server.shutdown()
+    assert len(results) == 5
+    assert client.stats["retries"] == 2
+    assert server.requests == 3
+
+
+def test_concurrency_limit_holds_across_calls_and_threads():
+    server = start_server(latency=0.05)
+    try:
+        client = AsyncBatchLLMClient(url=server.url, batch_size=1, max_concurrency=2, claim_fields=[])
+        # Each call would fit its own allowance of 2; together they must still share it
+        threads = [threading.Thread(target=client.explain_many, args=(_items(2),)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.shutdown()
+    assert server.requests == 8
+    assert server.max_in_flight == 2
+
+
+def test_token_budget_is_shared_by_successive_reservations():
+    bucket = TokenBucket(60)
+    assert bucket.reserve(60) == 0.0
+    # The budget refills at one token per second; later reservations queue behind earlier ones
+    assert 29 < bucket.reserve(30) <= 30
+    assert 59 < bucket.reserve(30) <= 60
+    assert TokenBucket(0).reserve(10**6) == 0.0
+
+
+def test_http_client_is_shared_without_the_cache(monkeypatch):
+    monkeypatch.setattr(llm_client.settings, "LLM_PROVIDER", "http")
+    monkeypatch.setattr(llm_client.settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(llm_client, "_remote_clients", {})
+    first = get_llm_client()
+    assert isinstance(first, AsyncBatchLLMClient)
+    assert get_llm_client() is first
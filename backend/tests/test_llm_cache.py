@@ -0,0 +1,86 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from backend.models.llm_cache import LLMExplanation
+from backend.services.llm_client import BaseLLMClient, CachedLLMClient, MockLLMClient
+
+
+class CountingClient(BaseLLMClient):
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def explain(self, claim, matched_rules):
+        self.calls += 1
+        return MockLLMClient().explain(claim, matched_rules)
+
+
+def _session_factory():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+
+    @contextmanager
+    def _session():
+        with Session(engine) as session:
+            yield session
+            session.commit()
+
+    return _session
+
+
+RULE = {"id": "T003", "type": "technical", "description": "Paid amount above 250", "recommendation": "Check approval"}
+
+
+def test_cache_hits_memory_then_database():
+    factory = _session_factory()
+    inner = CountingClient()
+    client = CachedLLMClient(inner, session_factory=factory, prompt_version="v1")
+    claim = {"tenant_id": "T", "claim_id": "C1"}
+    first = client.explain(claim, [RULE])
+    assert client.explain({"tenant_id": "T", "claim_id": "C2"}, [RULE]) == first
+    assert inner.calls == 1
+
+    # A new process starts with an empty LRU but finds the stored explanation
+    other = CachedLLMClient(inner, session_factory=factory, prompt_version="v1")
+    assert other.explain(claim, [RULE]) == first
+    assert inner.calls == 1
+    assert other.stats["db_hits"] == 1
+
+    # Rule text, prompt version and tenant are part of the key
+    client.explain(claim, [{**RULE, "description": "Paid amount above 300"}])
+    CachedLLMClient(inner, session_factory=factory, prompt_version="v2").explain(claim, [RULE])
+    client.explain({"tenant_id": "U"}, [RULE])
+    assert inner.calls == 4
+    assert client.stats == {"memory_hits": 1, "db_hits": 0, "misses": 3, "db_errors": 0}
+
+
+def test_expired_and_invalidated_entries_are_regenerated():
+    factory = _session_factory()
+    inner = CountingClient()
+    expiring = CachedLLMClient(inner, session_factory=factory, ttl_seconds=0)
+    expiring.explain({"tenant_id": "T"}, [RULE])
+    expiring.explain({"tenant_id": "T"}, [RULE])
+    assert inner.calls == 2
+
+    client = CachedLLMClient(inner, session_factory=factory)
+    client.explain({"tenant_id": "T"}, [RULE])
+    assert inner.calls == 2
+    client.invalidate(older_than=datetime.utcnow() + timedelta(seconds=1))
+    with factory() as session:
+        assert session.exec(select(LLMExplanation)).all() == []
+    client.explain({"tenant_id": "T"}, [RULE])
+    assert inner.calls == 3
+
+
+def test_expired_rows_are_purged_when_new_ones_are_written():
+    factory = _session_factory()
+    client = CachedLLMClient(CountingClient(), session_factory=factory, prompt_version="v1", ttl_seconds=60)
+    with factory() as session:
+        session.add(LLMExplanation(cache_key="old", prompt_version="v0", payload_json="{}", created_at=datetime.utcnow() - timedelta(minutes=5)))
+        session.add(LLMExplanation(cache_key="recent", prompt_version="v1", payload_json="{}", created_at=datetime.utcnow() - timedelta(seconds=30)))
+
+    client.explain({"tenant_id": "T"}, [RULE])
+    with factory() as session:
+        keys = {row.cache_key for row in session.exec(select(LLMExplanation)).all()}
+    assert "old" not in keys and "recent" in keys and len(keys) == 2
@@ -0,0 +1,86 @@
+import json
+
+from sqlalchemy import text
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from backend.core import db
+from backend.core.db import _add_missing_columns
+from backend.models.claims import MasterClaim, RefinedClaim
+from backend.models.ingestions import Ingestion
+from backend.models.rules import RuleSet
+from backend.services.validation import run_validation_job
+
+HEADER = "Claim ID,Encounter Type,Service Date,National ID,Member ID,Facility ID,Unique ID,Diagnosis Codes,Service Code,Paid Amount (AED),Approval Number"
+TECHNICAL = [{"id": "T1", "description": "Paid amount above 250", "condition": {"field": "paid_amount_aed", "op": ">", "value": 250}}]
+MEDICAL = [
+    {
+        "id": "M1",
+        "description": "Service not offered by facility type",
+        "condition": {"field": "facility_id", "op": "not_in_facility_map", "value": {"CLINIC": ["S1", "S3"], "GENERAL_HOSPITAL": ["S1", "S2"]}},
+    }
+]
+
+
+def _csv(rows) -> bytes:
+    lines = [HEADER] + [f"{cid},Outpatient,2024-01-05,N-{cid},M-{cid},{fid},U-{cid},E11.9,{svc},{paid}," for cid, fid, svc, paid in rows]
+    return "\n".join(lines).encode()
+
+
+def _upload(api, rows, **params):
+    return api.post("/api/upload/claims", params=params, files={"file": ("claims.csv", _csv(rows), "text/csv")}).json()
+
+
+def _results(job_id):
+    with Session(db.engine) as session:
+        rows = session.exec(select(RefinedClaim).where(RefinedClaim.job_id == job_id)).all()
+        return {rc.claim_id: (rc.error_type, rc.error_explanation, rc.matched_rule_ids) for rc in rows}, {rc.claim_id: rc.carried_forward for rc in rows}
+
+
+def test_resubmission_carries_unchanged_rows_and_matches_full_upload(api):
+    with Session(db.engine) as session:
+        session.add(RuleSet(tenant_id="T", name="technical_rules", kind="technical", rules_json=json.dumps({"rules": TECHNICAL})))
+        session.add(RuleSet(tenant_id="T", name="medical_rules", kind="medical", rules_json=json.dumps({"rules": MEDICAL})))
+        session.commit()
+    # F1 bills S1 and S3, so it is inferred as a CLINIC and both pass M1
+    base_rows = [("C0", "F1", "S1", 100), ("C1", "F1", "S3", 100), ("C2", "F2", "S1", 300), ("C3", "F2", "S1", 50)]
+    base = _upload(api, base_rows)
+    base_results, _ = _results(base["job_id"])
+    assert base_results["C1"][0] == "no_error" and base_results["C2"][0] == "technical_error"
+
+    # C0 now bills S2: F1 no longer fits CLINIC and falls back to GENERAL_HOSPITAL, where the
+    # unchanged C1 (S3) is not allowed. C3's amount changes and C4 is new.
+    corrected = [("C0", "F1", "S2", 100), ("C1", "F1", "S3", 100), ("C2", "F2", "S1", 300), ("C3", "F2", "S1", 400), ("C4", "F2", "S1", 10)]
+    delta = _upload(api, corrected, base_job_id=base["job_id"])
+    assert (delta["rows"], delta["changed"], delta["carried_forward"]) == (5, 3, 2)
+    resubmitted, carried = _results(delta["job_id"])
+    assert carried == {"C0": False, "C1": True, "C2": True, "C3": False, "C4": False}
+    assert resubmitted["C1"][0] == "medical_error"
+    assert resubmitted["C3"][0] == "technical_error"
+
+    full = _upload(api, corrected, dedupe="false")
+    full_results, _ = _results(full["job_id"])
+    assert resubmitted == full_results
+    metrics = [api.get(f"/api/metrics/ingestion/{job}").json() for job in (delta["job_id"], full["job_id"])]
+    assert metrics[0] == metrics[1]
+
+
+def test_rerun_of_job_validated_before_upgrade_replaces_results(monkeypatch, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    monkeypatch.setattr(db, "engine", engine)
+    SQLModel.metadata.create_all(engine, tables=[t for t in SQLModel.metadata.sorted_tables if t.name != "refined_claims"])
+    fields = dict(encounter_type="", service_date="", national_id="", member_id="", facility_id="F1", unique_id="", diagnosis_codes="", service_code="S1", paid_amount_aed=1.0)
+    with engine.begin() as conn:
+        # refined_claims as the original schema created it, holding five results
+        conn.execute(text("CREATE TABLE refined_claims (id INTEGER PRIMARY KEY, tenant_id VARCHAR NOT NULL, job_id VARCHAR NOT NULL, claim_id VARCHAR NOT NULL, status VARCHAR NOT NULL, error_type VARCHAR NOT NULL, error_explanation VARCHAR, recommended_action VARCHAR)"))
+        for i in range(5):
+            conn.execute(text(f"INSERT INTO refined_claims (tenant_id, job_id, claim_id, status, error_type) VALUES ('T', 'J', 'C{i}', 'Validated', 'no_error')"))
+    with Session(engine) as session:
+        session.add(Ingestion(tenant_id="T", job_id="J", status="completed"))
+        session.add_all(MasterClaim(tenant_id="T", job_id="J", claim_id=f"C{i}", **fields) for i in range(5))
+        session.commit()
+
+    _add_missing_columns()
+    with Session(engine) as session:
+        run_validation_job(session, "T", "J")
+        session.commit()
+        assert len(session.exec(select(RefinedClaim)).all()) == 5
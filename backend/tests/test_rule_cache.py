@@ -0,0 +1,41 @@
+import json
+
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from backend.models.rules import RuleSet
+from backend.services.rule_cache import CompiledRules, RuleCache, load_compiled_rules, rule_cache
+
+
+def _rules(rule_id: str) -> str:
+    return json.dumps({"rules": [{"id": rule_id, "condition": {"field": "paid_amount_aed", "op": ">", "value": 250}}]})
+
+
+def test_cached_rules_reload_after_version_bump():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    rule_cache.invalidate()
+    with Session(engine) as session:
+        session.add(RuleSet(tenant_id="T", name="technical_rules", kind="technical", rules_json=_rules("T1")))
+        session.commit()
+        first = load_compiled_rules(session, "T")
+        assert load_compiled_rules(session, "T") is first
+
+        # Another process updating the row only bumps the version; no in-process invalidation
+        rs = session.exec(select(RuleSet)).one()
+        rs.rules_json = _rules("T2")
+        rs.version += 1
+        session.commit()
+        second = load_compiled_rules(session, "T")
+    assert second is not first
+    assert [r["id"] for r in second.technical_rules] == ["T2"]
+
+
+def test_rule_cache_evicts_least_recently_used():
+    cache = RuleCache(maxsize=2)
+    entries = {tenant: CompiledRules([], []) for tenant in "ABC"}
+    cache.put(("A", (), ()), entries["A"])
+    cache.put(("B", (), ()), entries["B"])
+    assert cache.get(("A", (), ())) is entries["A"]
+    cache.put(("C", (), ()), entries["C"])
+    assert cache.get(("B", (), ())) is None
+    assert cache.get(("A", (), ())) is entries["A"]
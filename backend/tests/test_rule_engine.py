@@ -1,4 +1,8 @@
-from backend.services.rule_engine import evaluate_rules
+import itertools
+
+from backend.services.eval_memo import SignatureMemo
+from backend.services.rule_engine import compile_rules, evaluate_rules
+from backend.services.vectorized_rules import claims_frame, evaluate_frame
 
 
 def test_evaluate_rules_basic():
@@ -30,3 +34,110 @@ def test_evaluate_rules_basic():
     assert matched and matched[0]["id"] == "T003"
 
 
+
+
+def _sample_rules():
+    technical = [
+        {"id": "T001", "condition": {"field": "service_code", "op": "in", "value": ["SRV1001", "SRV1002"]}},
+        {"id": "T002", "condition": {"field": "diagnosis_codes", "op": "contains_any", "value": ["E11.9"]}},
+        {"id": "T004", "condition": {"field": "unique_id", "op": "regex_not_match", "value": "^[A-Z0-9]{4}-[A-Z0-9]{4}-[A-Z0-9]{4}$"}},
+    ]
+    medical = [
+        {
+            "id": "M001",
+            "condition": {"field": "service_code", "op": "in", "value": ["SRV1001"], "and": {"field": "encounter_type", "op": "equals", "value": "Outpatient"}},
+        },
+        {"id": "M003", "condition": {"field": "facility_id", "op": "not_in_facility_map", "value": {"CARDIOLOGY_CENTER": ["SRV2001"]}}},
+        {"id": "M004", "condition": {"field": "service_code", "op": "requires_diagnosis", "value": {"SRV1001": "R07.9"}}},
+        {"id": "M005", "condition": {"field": "diagnosis_codes", "op": "contains_conflicting_pairs", "value": [["R73.03", "E11.9"]]}},
+    ]
+    return technical, medical
+
+
+def test_compiled_plan_matches_rule_by_rule():
+    technical, medical = _sample_rules()
+    context = {"facility_type_map": {"F1": "CARDIOLOGY_CENTER"}}
+    plan = compile_rules(technical, medical)
+
+    claim = {
+        "service_code": "SRV1001",
+        "diagnosis_codes": " E11.9 `R73.03",
+        "unique_id": "abcd-1234-efgh",
+        "encounter_type": "OUTPATIENT",
+        "facility_id": "F1",
+    }
+    status, error_type, matched = evaluate_rules(claim, technical, medical, context, plan=plan)
+    assert error_type == "both"
+    assert [m["id"] for m in matched] == ["T001", "T002", "T004", "M001", "M003", "M004", "M005"]
+    assert (status, error_type, matched) == evaluate_rules(claim, technical, medical, context)
+
+    clean = {"service_code": "SRV2001", "diagnosis_codes": "R07.9", "unique_id": "ABCD-1234-EFGH", "encounter_type": "Inpatient", "facility_id": "F1"}
+    assert plan.evaluate(clean, context) == ("Validated", "no_error", [])
+
+
+def test_vectorized_evaluation_matches_row_engine():
+    technical, medical = _sample_rules()
+    context = {"facility_type_map": {"F1": "CARDIOLOGY_CENTER", "F2": None}}
+    plan = compile_rules(technical, medical)
+    claims = [
+        {"service_code": svc, "diagnosis_codes": dx, "unique_id": uid, "encounter_type": enc, "facility_id": fac}
+        for svc, dx, uid, enc, fac in itertools.product(
+            ["SRV1001", "SRV2001", "", None],
+            [" E11.9 `R73.03", "R07.9", "``", None],
+            ["ABCD-1234-EFGH", "bad"],
+            ["Outpatient", None],
+            ["F1", "F2", None],
+        )
+    ]
+    expected = [evaluate_rules(claim, technical, medical, context) for claim in claims]
+    assert evaluate_frame(claims_frame(claims), plan, context) == expected
+
+
+def test_rule_index_keeps_order_and_unindexed_rules():
+    technical = [
+        {"id": "T1", "condition": {"field": "service_code", "op": "in", "value": ["SRV9"]}},
+        {"id": "T2", "condition": {"field": "paid_amount_aed", "op": ">", "value": 100}},
+        {"id": "T3", "condition": {"field": "service_code", "op": "in", "value": ["SRV1001"]}},
+    ]
+    medical = [
+        {"id": "M1", "condition": {"field": "diagnosis_codes", "op": "contains_any", "value": ["Z00"]}},
+        {"id": "M2", "condition": {"field": "service_code", "op": "requires_diagnosis", "value": {"SRV1001": "R07.9", "SRV2": ""}}},
+        {"id": "M3", "condition": {"field": "diagnosis_codes", "op": "contains_conflicting_pairs", "value": [["R73.03", "E11.9"]]}},
+        {"id": "M4", "condition": {"field": "diagnosis_codes", "op": "contains_any", "value": ["E11.9"]}},
+    ]
+    plan = compile_rules(technical, medical)
+    claim = {"service_code": "SRV1001", "diagnosis_codes": "E11.9 ` R73.03", "paid_amount_aed": 300}
+
+    assert [plan.rules[p][1]["id"] for p in plan.candidates(claim)] == ["T2", "T3", "M2", "M3", "M4"]
+    _, error_type, matched = plan.evaluate(claim)
+    assert error_type == "both"
+    assert [m["id"] for m in matched] == ["T2", "T3", "M2", "M3", "M4"]
+    assert plan.evaluate({"service_code": "SRV2", "diagnosis_codes": None}) == ("Validated", "no_error", [])
+
+
+def test_signature_memo_groups_claims_with_equal_outcomes():
+    technical, medical = _sample_rules()
+    technical = technical + [{"id": "T003", "condition": {"field": "paid_amount_aed", "op": ">", "value": 250}}]
+    context = {"facility_type_map": {"F1": "CARDIOLOGY_CENTER", "F2": "CARDIOLOGY_CENTER"}}
+    plan = compile_rules(technical, medical)
+    claims = [
+        {"service_code": "SRV2001", "diagnosis_codes": "E11.9`R07.9", "unique_id": "ABCD-1234-EFGH", "encounter_type": "Inpatient", "facility_id": "F1", "paid_amount_aed": 300},
+        # Same rule-relevant features: other part order, amount and facility of the same type
+        {"service_code": "SRV2001", "diagnosis_codes": " R07.9 `E11.9", "unique_id": "WXYZ-0000-AAAA", "encounter_type": "Inpatient", "facility_id": "F2", "paid_amount_aed": 400},
+        {"service_code": "SRV2001", "diagnosis_codes": "E11.9`R07.9", "unique_id": "ABCD-1234-EFGH", "encounter_type": "Inpatient", "facility_id": "F1", "paid_amount_aed": 200},
+    ]
+    memo = SignatureMemo(plan, maxsize=1)
+    codes, keys, first_rows = memo.signatures(claims_frame(claims), context)
+    assert codes.tolist() == [0, 0, 1]
+    assert first_rows.tolist() == [0, 2]
+    assert plan.evaluate(claims[0], context) == plan.evaluate(claims[1], context)
+    # Fields an explanation reads split otherwise equal signatures
+    text_codes, text_keys, _ = memo.signatures(claims_frame(claims), context, ["facility_id"])
+    assert text_codes.tolist() == [0, 1, 2]
+    assert not set(text_keys) & set(keys)
+
+    memo.put(keys[0], ("Not Validated", "technical_error", [], "", "-"))
+    assert memo.get(keys[0]) is not None
+    memo.put(keys[1], ("Validated", "no_error", [], "", "-"))
+    assert memo.get(keys[0]) is None
+    assert (memo.hits, memo.misses) == (1, 1)
@@ -0,0 +1,301 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from backend.core import db
+from backend.models.claims import MasterClaim, RefinedClaim
+from backend.models.ingestions import Ingestion
+from backend.models.metrics import Metrics
+from backend.models.rules import RuleSet
+from backend.routes.jobs import resume_interrupted_jobs
+from backend.services.rule_cache import CompiledRules, rule_cache
+from backend.services import validation
+from backend.services.validation import (
+    JobTakenOver,
+    _changed_rule_ids,
+    _iter_claim_batches,
+    _shard_bounds,
+    _take_job,
+    fill_explanations,
+    revalidate_job,
+    run_validation_job,
+)
+
+
+def test_shard_bounds_cover_ids_with_gaps():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    fields = dict(encounter_type="", service_date="", national_id="", member_id="", facility_id="", unique_id="", diagnosis_codes="", service_code="", paid_amount_aed=0.0)
+    ids = [1, 2, 3, 7, 8, 20, 21, 22, 40, 41]
+    with Session(engine) as session:
+        # Ids in between belong to another job
+        session.add_all(MasterClaim(id=i, tenant_id="T", job_id="J" if i in ids else "K", claim_id=f"C{i}", **fields) for i in range(1, 45))
+        session.commit()
+        bounds = _shard_bounds(session, "T", "J", len(ids), 4)
+    assert bounds == [(1, 6), (7, 20), (21, 40), (41, None)]
+    assert sorted(i for lo, hi in bounds for i in ids if lo <= i and (hi is None or i <= hi)) == ids
+
+
+def test_job_below_shard_size_is_not_split(monkeypatch):
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    rule_cache.invalidate()
+    fields = dict(encounter_type="", service_date="", national_id="", member_id="", facility_id="F1", unique_id="", diagnosis_codes="", service_code="S1", paid_amount_aed=1.0)
+    with Session(engine) as session:
+        session.add(Ingestion(tenant_id="T", job_id="J", status="pending"))
+        session.add_all(MasterClaim(tenant_id="T", job_id="J", claim_id=f"C{i}", **fields) for i in range(5))
+        session.commit()
+        monkeypatch.setattr(validation.settings, "VALIDATION_WORKERS", 4)
+        monkeypatch.setattr(validation.settings, "VALIDATION_SHARD_MIN_CLAIMS", 6)
+
+        def _no_split(*args):
+            raise AssertionError("job ids were read for sharding")
+
+        monkeypatch.setattr(validation, "_shard_bounds", _no_split)
+        run_validation_job(session, "T", "J")
+        session.commit()
+        assert session.exec(select(Ingestion)).one().status == "completed"
+
+
+def test_claim_batches_stream_in_id_order_across_commits():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    fields = dict(encounter_type="", service_date="", national_id="", member_id="", facility_id="", unique_id="", diagnosis_codes="", service_code="", paid_amount_aed=0.0)
+    with Session(engine) as session:
+        session.add_all(MasterClaim(tenant_id="T", job_id="J" if i % 3 else "K", claim_id=f"C{i}", **fields) for i in range(20))
+        session.commit()
+        seen = []
+        for batch in _iter_claim_batches(session, "T", "J", 4):
+            assert len(batch) <= 4
+            seen.extend(mc.claim_id for mc in batch)
+            session.commit()
+        assert seen == [f"C{i}" for i in range(20) if i % 3]
+        # Streamed claims do not accumulate in the session
+        assert len(session.identity_map) == 0
+
+
+class _Crash(BaseException):
+    pass
+
+
+def test_interrupted_job_resumes_after_checkpoint(monkeypatch):
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    rule_cache.invalidate()
+    rule = {"id": "T1", "description": "Paid amount above 250", "condition": {"field": "paid_amount_aed", "op": ">", "value": 250}}
+    fields = dict(encounter_type="", service_date="", national_id="", member_id="", facility_id="F1", unique_id="", diagnosis_codes="", service_code="S1")
+    with Session(engine) as session:
+        session.add(RuleSet(tenant_id="T", name="technical_rules", kind="technical", rules_json=json.dumps({"rules": [rule]})))
+        session.add(Ingestion(tenant_id="T", job_id="J", status="pending"))
+        session.add_all(MasterClaim(tenant_id="T", job_id="J", claim_id=f"C{i}", paid_amount_aed=100.0 * i, **fields) for i in range(10))
+        session.commit()
+
+    monkeypatch.setattr(validation.settings, "VALIDATION_BATCH_SIZE", 3)
+    original = validation._validate_claims
+    batches = []
+    crash_at = [2]
+
+    def _validate_claims(session, tenant_id, job_id, claims, *args):
+        batches.append([mc.claim_id for mc in claims])
+        if len(batches) == crash_at[0]:
+            raise _Crash()
+        return original(session, tenant_id, job_id, claims, *args)
+
+    monkeypatch.setattr(validation, "_validate_claims", _validate_claims)
+    try:
+        with Session(engine) as session:
+            run_validation_job(session, "T", "J")
+    except _Crash:
+        pass
+    with Session(engine) as session:
+        job = session.exec(select(Ingestion)).one()
+        assert (job.status, job.processed_claims, job.total_claims) == ("running", 3, 10)
+
+    batches.clear()
+    crash_at[0] = None
+    with Session(engine) as session:
+        # Without being told the runner is gone, a running job is left to it, and so is one
+        # whose runner still heartbeats
+        run_validation_job(session, "T", "J")
+        run_validation_job(session, "T", "J", interrupted=True)
+        assert batches == []
+        session.exec(select(Ingestion)).one().heartbeat_at = datetime.utcnow() - timedelta(hours=1)
+        session.commit()
+        run_validation_job(session, "T", "J", interrupted=True)
+        session.commit()
+        job = session.exec(select(Ingestion)).one()
+        results = session.exec(select(RefinedClaim).order_by(RefinedClaim.id)).all()
+    assert batches == [["C3", "C4", "C5"], ["C6", "C7", "C8"], ["C9"]]
+    assert (job.status, job.processed_claims) == ("completed", 10)
+    assert [rc.claim_id for rc in results] == [f"C{i}" for i in range(10)]
+    assert [rc.error_type for rc in results] == ["no_error"] * 3 + ["technical_error"] * 7
+
+
+def test_changed_rule_ids_diffs_by_id_and_content():
+    technical = [
+        {"id": "T1", "condition": {"field": "paid_amount_aed", "op": ">", "value": 250}},
+        {"id": "T2", "condition": {"field": "service_code", "op": "in", "value": ["SRV1"]}},
+    ]
+    medical = [{"id": "M3", "condition": {"field": "facility_id", "op": "not_in_facility_map", "value": {"GENERAL_HOSPITAL": ["SRV1"]}}}]
+    before = CompiledRules(technical, medical)
+
+    edited = [{**technical[0], "condition": {"field": "paid_amount_aed", "op": ">", "value": 100}}]
+    added = [{"id": "M4", "condition": {"field": "diagnosis_codes", "op": "contains_any", "value": ["E11.9"]}}]
+    after = CompiledRules(edited, medical + added)
+    assert _changed_rule_ids(before.fingerprints, after) == {"T1", "T2", "M4"}
+
+    # Changing the facility allow-lists affects every facility rule
+    moved = CompiledRules(technical, [{**medical[0], "condition": {**medical[0]["condition"], "value": {"GENERAL_HOSPITAL": ["SRV2"]}}}])
+    assert _changed_rule_ids(before.fingerprints, moved) == {"M3"}
+    assert _changed_rule_ids(None, after) is None
+    assert CompiledRules(technical + technical, []).fingerprints is None
+
+
+def test_fill_explanations_generates_deferred_text_once():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    rule_cache.invalidate()
+    rule = {"id": "T1", "description": "Paid amount above 250", "recommendation": "Check approval", "condition": {"field": "paid_amount_aed", "op": ">", "value": 250}}
+    with Session(engine) as session:
+        session.add(RuleSet(tenant_id="T", name="technical_rules", kind="technical", rules_json=json.dumps({"rules": [rule]})))
+        common = {"tenant_id": "T", "job_id": "J", "status": "Not Validated", "error_type": "technical_error"}
+        session.add(RefinedClaim(claim_id="C1", matched_rule_ids=json.dumps(["T1"]), **common))
+        session.add(RefinedClaim(claim_id="C2", matched_rule_ids=json.dumps(["T9"]), **common))
+        session.add(RefinedClaim(claim_id="C3", error_explanation="kept", recommended_action="-", matched_rule_ids=json.dumps(["T1"]), **common))
+        session.commit()
+
+        rows = session.exec(select(RefinedClaim).order_by(RefinedClaim.id)).all()
+        fill_explanations(session, "T", rows)
+        session.commit()
+        stored = {rc.claim_id: (rc.error_explanation, rc.recommended_action) for rc in session.exec(select(RefinedClaim)).all()}
+    assert stored["C1"] == ("T1: Paid amount above 250", "Check approval")
+    # A rule removed since validation is still named
+    assert stored["C2"] == ("T9: Rule no longer defined", "-")
+    assert stored["C3"] == ("kept", "-")
+
+
+def test_revalidate_streams_results_and_refreshes_text_of_edited_rules(monkeypatch):
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    rule_cache.invalidate()
+    rule = {"id": "T1", "description": "Paid amount above 250", "recommendation": "Check approval", "condition": {"field": "paid_amount_aed", "op": ">", "value": 250}}
+    fields = dict(encounter_type="", service_date="", national_id="", member_id="", facility_id="F1", unique_id="", diagnosis_codes="", service_code="S1")
+    with Session(engine) as session:
+        session.add(RuleSet(tenant_id="T", name="technical_rules", kind="technical", rules_json=json.dumps({"rules": [rule]})))
+        session.add(Ingestion(tenant_id="T", job_id="J", status="pending"))
+        session.add_all(MasterClaim(tenant_id="T", job_id="J", claim_id=f"C{i}", paid_amount_aed=100.0 * i, **fields) for i in range(10))
+        session.commit()
+        run_validation_job(session, "T", "J")
+        session.commit()
+
+        # Same condition, so the hits stay the same; only the rule text changes
+        reworded = {**rule, "description": "Paid amount over the limit", "recommendation": "Attach approval"}
+        session.exec(select(RuleSet)).one().rules_json = json.dumps({"rules": [reworded]})
+        session.delete(session.exec(select(Metrics)).one())
+        session.commit()
+        rule_cache.invalidate()
+
+        monkeypatch.setattr(validation.settings, "VALIDATION_BATCH_SIZE", 3)
+        original = validation._revalidate_rows
+        batches = []
+
+        def _revalidate_rows(session, pairs, *args):
+            batches.append(len(pairs))
+            return original(session, pairs, *args)
+
+        monkeypatch.setattr(validation, "_revalidate_rows", _revalidate_rows)
+        summary = revalidate_job(session, "T", "J")
+        session.commit()
+        results = session.exec(select(RefinedClaim).order_by(RefinedClaim.id)).all()
+        metrics = session.exec(select(Metrics)).one()
+
+    assert batches == [3, 3, 3, 1]
+    assert summary == {"rows": 10, "changed_rules": 1, "full": False, "updated": 7}
+    assert [rc.error_explanation for rc in results] == ["All rules satisfied"] * 3 + ["T1: Paid amount over the limit"] * 7
+    assert {rc.recommended_action for rc in results[3:]} == {"Attach approval"}
+    assert json.loads(metrics.claims_by_error_type) == {"no_error": 3, "medical_error": 0, "technical_error": 7, "both": 0}
+
+
+def test_only_one_runner_takes_an_interrupted_job(api):
+    with Session(db.engine) as session:
+        session.add(Ingestion(tenant_id="T", job_id="J", status="running", checkpoint_claim_id=3))
+        session.commit()
+    # Startup resume and a resume request both read the job before either takes it
+    with Session(db.engine) as first, Session(db.engine) as second:
+        seen = [s.exec(select(Ingestion)).one() for s in (first, second)]
+        assert _take_job(first, seen[0], "A") is True
+        assert _take_job(second, seen[1], "B") is False
+        # A live runner keeps heartbeating, so its job is not taken over even when read afresh
+        second.refresh(seen[1])
+        assert _take_job(second, seen[1], "B") is False
+        assert seen[1].runner_id == "A"
+
+    assert api.post("/api/jobs/J/run").status_code == 409
+    assert api.post("/api/jobs/J/run", params={"resume": "true"}).status_code == 409
+    assert resume_interrupted_jobs() == []
+
+    with Session(db.engine) as session:
+        session.exec(select(Ingestion)).one().heartbeat_at = datetime.utcnow() - timedelta(hours=1)
+        session.commit()
+    assert api.post("/api/jobs/J/run", params={"resume": "true"}).status_code == 200
+    assert api.get("/api/jobs/J").json()["status"] == "completed"
+
+
+def test_runner_stops_committing_once_its_job_is_taken_over(monkeypatch):
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    rule_cache.invalidate()
+    fields = dict(encounter_type="", service_date="", national_id="", member_id="", facility_id="F1", unique_id="", diagnosis_codes="", service_code="S1")
+    with Session(engine) as session:
+        session.add(Ingestion(tenant_id="T", job_id="J", status="pending"))
+        session.add_all(MasterClaim(tenant_id="T", job_id="J", claim_id=f"C{i}", paid_amount_aed=1.0, **fields) for i in range(10))
+        session.commit()
+
+    monkeypatch.setattr(validation.settings, "VALIDATION_BATCH_SIZE", 3)
+    original = validation._validate_claims
+
+    def _validate_claims(session, tenant_id, job_id, claims, *args):
+        if claims[0].claim_id == "C3":
+            # Another process decides this runner is gone and takes the job
+            session.execute(update(Ingestion).values(runner_id="other"))
+        return original(session, tenant_id, job_id, claims, *args)
+
+    monkeypatch.setattr(validation, "_validate_claims", _validate_claims)
+    with Session(engine) as session:
+        with pytest.raises(JobTakenOver):
+            run_validation_job(session, "T", "J")
+    with Session(engine) as session:
+        job = session.exec(select(Ingestion)).one()
+        # The first batch stays as the new runner's checkpointed work; the second was not committed
+        assert (job.status, job.processed_claims) == ("running", 3)
+        assert len(session.exec(select(RefinedClaim)).all()) == 3
+
+
+class _FacilityLLM:
+    claim_fields = ["facility_id"]
+
+    def explain_many(self, items):
+        return [{"explanations": [{"text": f"{claim['facility_id']}: {matched[0]['id']}"}]} if matched else {} for claim, matched in items]
+
+
+def test_memoized_explanations_respect_the_llm_claim_fields(monkeypatch):
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    rule_cache.invalidate()
+    rule = {"id": "T1", "description": "Paid amount above 250", "condition": {"field": "paid_amount_aed", "op": ">", "value": 250}}
+    fields = dict(encounter_type="", service_date="", national_id="", member_id="", unique_id="", diagnosis_codes="", service_code="S1", paid_amount_aed=300.0)
+    with Session(engine) as session:
+        session.add(RuleSet(tenant_id="T", name="technical_rules", kind="technical", rules_json=json.dumps({"rules": [rule]})))
+        session.add(Ingestion(tenant_id="T", job_id="J", status="pending"))
+        session.add_all(MasterClaim(tenant_id="T", job_id="J", claim_id=f"C{i}", facility_id=f"F{i % 2}", **fields) for i in range(4))
+        session.commit()
+        monkeypatch.setattr(validation.settings, "LLM_DEFER_EXPLANATIONS", False)
+        monkeypatch.setattr(validation, "get_llm_client", _FacilityLLM)
+        run_validation_job(session, "T", "J")
+        session.commit()
+        results = session.exec(select(RefinedClaim).order_by(RefinedClaim.id)).all()
+    # Same rule signature, but the prompt differs per facility, so the text does too
+    assert [rc.error_explanation for rc in results] == ["F0: T1", "F1: T1", "F0: T1", "F1: T1"]
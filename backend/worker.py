@@ -0,0 +1,117 @@
+"""Validation worker: claims queued jobs and runs them outside the API process.
+
+    python -m backend.worker --processes 4
+
+Start as many processes (or containers) as validation needs; they coordinate through
+the job_queue table. Used when JOB_BACKEND=queue.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+
+from .core.config import settings
+from .core.db import get_session, init_db
+from .services.job_queue import claim_next, complete, execute, fail, heartbeat
+
+logger = logging.getLogger("backend.worker")
+
+
+def _keep_lease(item_id: int, worker_id: str, done: threading.Event, lost: threading.Event) -> None:
+    # Renew well before expiry so a long job is not handed to a second worker
+    interval = max(settings.JOB_QUEUE_VISIBILITY_TIMEOUT_SECONDS / 3, 1)
+    while not done.wait(interval):
+        with get_session() as session:
+            renewed = heartbeat(session, item_id, worker_id)
+        if not renewed:
+            # Another worker may own the item now; stop the job before it writes again
+            logger.warning("lost lease on queue item %s; aborting", item_id)
+            lost.set()
+            return
+
+
+def run_once(worker_id: str) -> bool:
+    """Claim and run one queued item; False if nothing was runnable."""
+    with get_session() as session:
+        item = claim_next(session, worker_id)
+        if item is None:
+            return False
+        item_id, kind, tenant_id, job_id, attempt = item.id, item.kind, item.tenant_id, item.job_id, item.attempts
+
+    logger.info("%s %s job %s (attempt %s)", worker_id, kind, job_id, attempt)
+    done = threading.Event()
+    lost = threading.Event()
+    lease = threading.Thread(target=_keep_lease, args=(item_id, worker_id, done, lost), daemon=True)
+    lease.start()
+    try:
+        execute(kind, tenant_id, job_id, abort=lost)
+    except Exception as exc:
+        logger.exception("%s %s job %s failed", worker_id, kind, job_id)
+        with get_session() as session:
+            fail(session, item_id, worker_id, str(exc))
+    else:
+        with get_session() as session:
+            complete(session, item_id, worker_id)
+    finally:
+        done.set()
+        lease.join()
+    return True
+
+
+def run_worker(drain: bool = False) -> None:
+    """Process queue items until SIGTERM/SIGINT, or until the queue is empty with ``drain``."""
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    stopping = threading.Event()
+
+    def _stop(signum, frame) -> None:
+        # Finish the current job; an unfinished one would only be resumed after its lease expires
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    while not stopping.is_set():
+        if not run_once(worker_id):
+            if drain:
+                return
+            stopping.wait(settings.JOB_QUEUE_POLL_SECONDS)
+
+
+def _child(drain: bool) -> None:
+    # Forked children must not reuse the parent's pooled connections
+    from .core.db import engine
+
+    engine.dispose(close=False)
+    run_worker(drain)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run validation workers for the database job queue")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes to start")
+    parser.add_argument("--drain", action="store_true", help="Exit once the queue is empty")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    init_db()
+    if args.processes <= 1:
+        run_worker(args.drain)
+        return
+    children = [multiprocessing.Process(target=_child, args=(args.drain,)) for _ in range(args.processes)]
+    for child in children:
+        child.start()
+
+    def _forward(signum, frame) -> None:
+        for child in children:
+            if child.is_alive():
+                os.kill(child.pid, signum)
+
+    signal.signal(signal.SIGTERM, _forward)
+    signal.signal(signal.SIGINT, _forward)
+    for child in children:
+        child.join()
+
+
+if __name__ == "__main__":
+    main()